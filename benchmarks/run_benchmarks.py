@@ -0,0 +1,275 @@
+"""
+Benchmarks the overhead added by code-first pipelines on top of the steps themselves, using synthetic pipelines of
+varying width, depth and artifact size. Runs offline, with no dependencies besides the ones of the project.
+
+Usage:
+
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --widths 10 50 --depths 10 --sizes 1000 1000000 --output results.json
+    python -m benchmarks.run_benchmarks --max-import-time 0.5
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from ploomber import DAG
+
+from cf_pipelines import Pipeline
+from cf_pipelines.base.serializers import codecs, measure_artifact_file
+
+
+def make_steps_source(width: int, depth: int) -> str:
+    """
+    Generates the source code of the steps of a pipeline with `depth` layers of `width` steps. The steps in the first
+    layer generate an artifact of `size` bytes, and every other step needs the artifacts of two steps of the previous
+    layer and passes the first one on.
+
+    :param width:
+    :param depth:
+    :return:
+    """
+    functions = []
+    for layer in range(depth):
+        for position in range(width):
+            name = f"step_{layer}_{position}"
+            if layer == 0:
+                arguments = "size"
+                body = f'return {{"artifact_{layer}_{position}.pkl": bytes(int(size))}}'
+            else:
+                first = f"artifact_{layer - 1}_{position}"
+                second = f"artifact_{layer - 1}_{(position + 1) % width}"
+                arguments = ", ".join(sorted({first, second}))
+                body = f'return {{"artifact_{layer}_{position}.pkl": {first}}}'
+            functions.append(f"def {name}(*, {arguments}):\n    {body}\n")
+    return "\n\n".join(functions)
+
+
+def write_steps_module(directory: Path, width: int, depth: int) -> Callable[[], List[Callable]]:
+    """
+    Writes the steps generated by `make_steps_source` to a module, so their source code can be read by
+    `Pipeline.step`
+
+    :return: A function that loads a fresh copy of the steps, in the order they were generated. A function can only be
+    registered in a single pipeline, since registering it changes its signature
+    """
+    path = directory / f"synthetic_steps_{width}_{depth}.py"
+    path.write_text(make_steps_source(width, depth))
+
+    def load_steps() -> List[Callable]:
+        spec = importlib.util.spec_from_file_location(path.stem, path)
+        if spec is None or spec.loader is None:
+            raise ImportError(f"Can't load the steps in {path}")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return [getattr(module, f"step_{layer}_{position}") for layer in range(depth) for position in range(width)]
+
+    return load_steps
+
+
+def register_steps(pipeline: Pipeline, steps: List[Callable]) -> Pipeline:
+    for step in steps:
+        pipeline.step(step.__name__.rsplit("_", 1)[0])(step)
+    return pipeline
+
+
+def measure(function: Callable[..., Any], repeat: int, setup: Callable[[], Any] = lambda: None) -> float:
+    """
+    Calls `function` `repeat` times
+
+    :param function: The function to time, it receives the value returned by `setup` if it takes any argument
+    :param repeat:
+    :param setup: A function called before each call to `function`, which is not timed
+    :return: The median time taken, in seconds
+    """
+    timings = []
+    for _ in range(repeat):
+        prepared = setup()
+        start = time.perf_counter()
+        function() if prepared is None else function(prepared)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def benchmark_pipeline(
+    location: Path, load_steps: Callable[[], List[Callable]], size: int, repeat: int
+) -> Dict[str, float]:
+    """
+    Measures the time taken to register the steps, solve their dependencies, build the Ploomber DAG and run the
+    pipeline serially, the overhead of the wrapper around each step and the time taken by a call to the pipeline
+    compiled into an in-process function, see `Pipeline.as_function`
+
+    :param location: Where the pipeline stores its artifacts
+    :param load_steps: Loads the steps of the pipeline
+    :param size: The size of the artifacts, in bytes
+    :param repeat: The number of times each measurement is repeated
+    :return:
+    """
+
+    def make_pipeline(track_all: bool = False) -> Pipeline:
+        return Pipeline("Benchmark", location=location, extra_args={"size": size}, track_all=track_all)
+
+    steps = load_steps()
+    step_count = len(steps)
+    first_step = steps[0]
+    pipeline = register_steps(make_pipeline(), load_steps())
+
+    # The wrapper is called the way Ploomber calls it, with the products it needs already read. The step generates an
+    # empty artifact, so the time spent by the step itself doesn't hide the wrapper's
+    wrapper_pipeline = register_steps(Pipeline("Wrapper", location=location, extra_args={"size": 0}), load_steps())
+    wrapper = wrapper_pipeline.function_details[first_step.__name__].python_function
+    wrapper_calls = 1000
+    wrapper_time = measure(lambda: [wrapper(upstream={}, kwargs=None) for _ in range(wrapper_calls)], repeat)
+    step_time = measure(lambda: [first_step(size=0) for _ in range(wrapper_calls)], repeat)
+    serve = wrapper_pipeline.as_function(inputs=[], outputs=list(wrapper_pipeline.product_lineages))
+    serve_calls = 100
+    serve_time = measure(lambda: [serve() for _ in range(serve_calls)], repeat)
+
+    # Every run is tracked in its own folder, so Ploomber never skips the steps for being up to date
+    run_time = measure(register_steps(make_pipeline(track_all=True), load_steps()).run, repeat)
+
+    return {
+        "registration_time": measure(lambda steps: register_steps(make_pipeline(), steps), repeat, setup=load_steps),
+        "solve_dependencies_time": measure(pipeline.solve_dependencies, repeat),
+        "create_callables_time": measure(lambda: pipeline.create_ploomber_callables(DAG()), repeat),
+        "make_dag_time": measure(pipeline.make_dag, repeat),
+        "wrapper_overhead_per_call": (wrapper_time - step_time) / wrapper_calls,
+        "as_function_time_per_call": serve_time / serve_calls,
+        "run_time": run_time,
+        "run_time_per_step": run_time / step_count,
+    }
+
+
+def benchmark_serialization(location: Path, size: int, repeat: int) -> Dict[str, float]:
+    """
+    Measures the throughput of writing and reading back an artifact through the pipeline's serializers, for a pickled
+    bytes object and, if numpy is installed, a .npy array
+
+    :param location: Where the artifacts are written
+    :param size: The size of the artifacts, in bytes
+    :param repeat: The number of times each measurement is repeated
+    :return: The throughputs, in megabytes per second
+    """
+    pipeline = Pipeline("Serialization", location=location)
+    artifacts: Dict[str, Any] = {"pickle": (".pkl", bytes(size))}
+    try:
+        import numpy
+
+        artifacts["npy"] = (".npy", numpy.zeros(size, dtype=numpy.uint8))
+    except ImportError:
+        pass
+
+    results = {}
+    megabytes = size / 1e6
+    for format_name, (extension, value) in artifacts.items():
+        pipeline.add_product_lineages("produce", [f"{format_name}{extension}"], "serialization")
+        pipeline.add_function_details(lambda: None, set(), "produce", [f"{format_name}{extension}"], "serialization")
+        write_time = measure(lambda: pipeline.write_artifact(format_name, value), repeat)
+        read_time = measure(lambda: pipeline.read_artifact(format_name), repeat)
+        results[f"{format_name}_write_mb_per_second"] = megabytes / write_time if write_time else float("inf")
+        results[f"{format_name}_read_mb_per_second"] = megabytes / read_time if read_time else float("inf")
+    return results
+
+
+def benchmark_compression(location: Path, size: int, repeat: int) -> Dict[str, float]:
+    """
+    Measures the size/time tradeoff of each compression codec whose package is installed, by writing and reading back
+    a pickled artifact, half random and half zeros, with the codec's default level
+
+    :param location: Where the artifacts are written
+    :param size: The size of the artifacts, in bytes
+    :param repeat: The number of times each measurement is repeated
+    :return: The throughputs, in megabytes per second, and the compression ratios
+    """
+    value = os.urandom(size // 2) + bytes(size - size // 2)
+    results = {}
+    megabytes = size / 1e6
+    for codec_name in codecs:
+        pipeline = Pipeline("Compression", location=location, compression=codec_name)
+        pipeline.add_product_lineages("produce", [f"{codec_name}.pkl"], "compression")
+        pipeline.add_function_details(lambda: None, set(), "produce", [f"{codec_name}.pkl"], "compression")
+        try:
+            write_time = measure(lambda: pipeline.write_artifact(codec_name, value), repeat)
+        except ImportError:
+            continue
+        read_time = measure(lambda: pipeline.read_artifact(codec_name), repeat)
+        measurements = measure_artifact_file(pipeline.get_local_artifact_path(codec_name))
+        results[f"{codec_name}_write_mb_per_second"] = megabytes / write_time if write_time else float("inf")
+        results[f"{codec_name}_read_mb_per_second"] = megabytes / read_time if read_time else float("inf")
+        results[f"{codec_name}_ratio"] = measurements["uncompressed_size"] / measurements["size"]
+    return results
+
+
+def benchmark_import(repeat: int) -> Dict[str, float]:
+    """
+    Measures the time taken by a fresh interpreter to import `cf_pipelines` and, for reference, Ploomber, which
+    `cf_pipelines` only imports once a DAG is built or a product is read or written. The time taken by the interpreter
+    to start is not included
+
+    :param repeat: The number of times each measurement is repeated
+    :return: The times, in seconds
+    """
+
+    def run_python(code: str) -> Callable[[], Any]:
+        return lambda: subprocess.run([sys.executable, "-c", code], check=True)
+
+    startup_time = measure(run_python("pass"), repeat)
+    return {
+        "import_time": measure(run_python("import cf_pipelines"), repeat) - startup_time,
+        "ploomber_import_time": measure(run_python("import ploomber"), repeat) - startup_time,
+    }
+
+
+def main(arguments: List[str] = None) -> List[Dict[str, Any]]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--widths", type=int, nargs="+", default=[1, 10, 50], help="Steps in each layer")
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 10], help="Layers of steps")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000_000], help="Artifact sizes, in bytes")
+    parser.add_argument("--repeat", type=int, default=3, help="Times each measurement is repeated")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file")
+    parser.add_argument(
+        "--max-import-time", type=float, help="Fail when importing cf_pipelines takes longer than this, in seconds"
+    )
+    parsed = parser.parse_args(arguments)
+
+    import_result = benchmark_import(parsed.repeat)
+    results: List[Dict[str, Any]] = [import_result]
+    print(", ".join(f"{key}={format_value(value)}" for key, value in import_result.items()), flush=True)
+    with tempfile.TemporaryDirectory() as directory:
+        for width in parsed.widths:
+            for depth in parsed.depths:
+                load_steps = write_steps_module(Path(directory), width, depth)
+                for size in parsed.sizes:
+                    location = Path(directory, f"pipelines_{width}_{depth}_{size}")
+                    result: Dict[str, Any] = {"width": width, "depth": depth, "steps": width * depth, "size": size}
+                    result.update(benchmark_pipeline(location, load_steps, size, parsed.repeat))
+                    results.append(result)
+                    print(", ".join(f"{key}={format_value(value)}" for key, value in result.items()), flush=True)
+
+        for size in parsed.sizes:
+            result = {"size": size}
+            result.update(benchmark_serialization(Path(directory, "serialization"), size, parsed.repeat))
+            result.update(benchmark_compression(Path(directory, "compression"), size, parsed.repeat))
+            results.append(result)
+            print(", ".join(f"{key}={format_value(value)}" for key, value in result.items()), flush=True)
+
+    if parsed.output:
+        parsed.output.write_text(json.dumps(results, indent=2))
+    if parsed.max_import_time is not None and import_result["import_time"] > parsed.max_import_time:
+        parser.exit(1, f"Importing cf_pipelines took {import_result['import_time']:.3f}s\n")
+    return results
+
+
+def format_value(value: Any) -> str:
+    return f"{value:.6g}" if isinstance(value, float) else str(value)
+
+
+if __name__ == "__main__":
+    main()
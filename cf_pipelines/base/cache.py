@@ -0,0 +1,175 @@
+import hashlib
+import os
+import pickle
+import shutil
+import uuid
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from cf_pipelines.base.memory import InMemoryArtifacts
+from cf_pipelines.base.retention import CACHE_FOLDER_NAME
+from cf_pipelines.base.serializers import as_product
+from cf_pipelines.base.utils import hash_file, hash_source, link_or_copy
+
+if TYPE_CHECKING:
+    from cf_pipelines.base.pipeline import Pipeline
+
+
+class StepCache:
+    """
+    A cache shared across runs that allows skipping steps whose inputs have not changed. Each step is identified by a
+    key computed from its source code, the fingerprints of the products it needs and the values of any extra
+    arguments or environment variables it uses. The products of every step are stored in a folder named after that key.
+
+    Attributes
+    ---------
+    pipeline: Pipeline
+        The pipeline whose steps are cached
+    location: Path
+        Where the cached products are stored, defaults to a `.cache` folder inside the pipeline's `location`
+    """
+
+    def __init__(self, pipeline: "Pipeline", location: Optional[Path] = None):
+        self.pipeline = pipeline
+        self.location = Path(location or Path(pipeline.location, CACHE_FOLDER_NAME))
+        self.lock = Lock()
+        self.source_hashes: Dict[str, str] = {}
+        self.file_hashes: Dict[Tuple[str, int, int], str] = {}
+        self.product_keys: Dict[str, str] = {}
+
+    def source_hash(self, function_name: str) -> str:
+        if function_name not in self.source_hashes:
+            python_function = self.pipeline.function_details[function_name].python_function
+            self.source_hashes[function_name] = hash_source(python_function)
+        return self.source_hashes[function_name]
+
+    def fingerprint(self, product_name: str) -> str:
+        """
+        Gets the fingerprint of a product: the hash of its contents, or the key of the step that produced it when the
+        pipeline runs in memory and the step ran (or was restored) in the current run.
+
+        :param product_name:
+        :return:
+        """
+        if self.pipeline.in_memory and product_name in self.product_keys:
+            return self.product_keys[product_name]
+
+        path = self.pipeline.get_local_artifact_path(product_name)
+        if self.pipeline.product_lineages[product_name].partitioned:
+            # The folder holds a file per partition and the list of the partitions
+            digest = hashlib.sha256()
+            for partition_path in sorted(path.iterdir()):
+                digest.update(partition_path.name.encode())
+                digest.update(hash_file(partition_path).encode())
+            return digest.hexdigest()
+
+        stat = path.stat()
+        file_id = (str(path), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if file_id not in self.file_hashes:
+                self.file_hashes[file_id] = hash_file(path)
+            return self.file_hashes[file_id]
+
+    def key(self, function_name: str) -> str:
+        """
+        Computes the cache key of a step, all the products it needs must have been generated already
+
+        :param function_name:
+        :return: The key, a hexadecimal string
+        """
+        function_details = self.pipeline.function_details[function_name]
+        key = hashlib.sha256(self.source_hash(function_name).encode())
+        for needed_artifact in sorted(function_details.needs):
+            key.update(needed_artifact.encode())
+            if needed_artifact in self.pipeline.product_lineages:
+                key.update(self.fingerprint(needed_artifact).encode())
+            else:
+                key.update(hash_value(self.pipeline.get_argument_value(needed_artifact)).encode())
+        for product_name in sorted(function_details.produces):
+            key.update(self.pipeline.product_lineages[product_name].file_name.encode())
+
+        hex_key = key.hexdigest()
+        for product_name in function_details.produces:
+            self.product_keys[product_name] = f"{hex_key}/{product_name}"
+        return hex_key
+
+    def restore(self, function_name: str, key: str, artifacts: Optional[InMemoryArtifacts] = None) -> bool:
+        """
+        Links or copies the cached products of a step into the current run folder, and backs them up like the
+        products written by the step would be
+
+        :param function_name: The name of the step
+        :param key: The key of the step, as returned by `key`
+        :param artifacts: When running in memory, the cached products are loaded into it
+        :return: Whether the step was found in the cache
+        """
+        entry = Path(self.location, key)
+        if not entry.is_dir():
+            return False
+        # The least recently used entries are evicted first to meet the pipeline's retention policy
+        os.utime(entry)
+
+        cached_products = {
+            product_name: Path(entry, self.pipeline.product_lineages[product_name].file_name)
+            for product_name in self.pipeline.function_details[function_name].produces
+        }
+        if artifacts and not self.pipeline.function_details[function_name].streams:
+            # Loading the products into memory also persists them when needed
+            artifacts.put(
+                function_name,
+                {
+                    product_name: self.pipeline.unserializer(as_product(path))
+                    for product_name, path in cached_products.items()
+                },
+            )
+        else:
+            for product_name, cached_path in cached_products.items():
+                path = self.pipeline.get_local_artifact_path(product_name)
+                link_or_copy(cached_path, path)
+                self.pipeline.upload_artifact(path)
+            if artifacts:
+                artifacts.put(
+                    function_name,
+                    {product_name: self.pipeline.read_artifact(product_name) for product_name in cached_products},
+                )
+        return True
+
+    def store(self, function_name: str, key: str, artifacts: Optional[InMemoryArtifacts] = None) -> None:
+        """
+        Saves the products of a step that just ran into the cache
+
+        :param function_name: The name of the step
+        :param key: The key of the step, as returned by `key`
+        :param artifacts: When running in memory, the products are taken from it
+        """
+        entry = Path(self.location, key)
+        temporary_entry = Path(self.location, f"{key}.{uuid.uuid4().hex}.tmp")
+        temporary_entry.mkdir(parents=True)
+
+        for product_name in self.pipeline.function_details[function_name].produces:
+            cached_path = Path(temporary_entry, self.pipeline.product_lineages[product_name].file_name)
+            if artifacts and not self.pipeline.function_details[function_name].streams:
+                self.pipeline.serializer(artifacts.get(product_name), as_product(cached_path))
+            else:
+                link_or_copy(self.pipeline.get_local_artifact_path(product_name), cached_path)
+
+        try:
+            temporary_entry.rename(entry)
+        except OSError:
+            # Another run stored the same step in the meantime
+            shutil.rmtree(temporary_entry)
+
+
+def hash_value(value: Any) -> str:
+    """
+    Hashes a python object, using its pickled representation when possible
+
+    :param value:
+    :return:
+    """
+    try:
+        serialized = pickle.dumps(value)
+    except Exception:
+        serialized = repr(value).encode()
+    return hashlib.sha256(serialized).hexdigest()
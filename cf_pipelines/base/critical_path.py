@@ -0,0 +1,200 @@
+import heapq
+import statistics
+from html import escape
+from typing import Dict, Iterable, List, Mapping, Set, Tuple
+
+from cf_pipelines.base.helper_classes import CriticalPathReport
+from cf_pipelines.base.metrics import RunMetrics
+from cf_pipelines.base.plan import ExecutionPlan, get_remaining_path_lengths
+
+
+def estimate_durations(history: Iterable[RunMetrics]) -> Dict[str, float]:
+    """
+    Estimates how long each step takes from the metrics of past runs: the median of the time between the step started
+    and ended. The runs where the step was restored from the cache are only used when it never ran
+
+    :param history: The metrics of the past runs
+    :return: The names of the steps with recorded timings mapped to their expected duration
+    """
+    ran: Dict[str, List[float]] = {}
+    restored: Dict[str, List[float]] = {}
+    for run_metrics in history:
+        for function_name, step_metrics in run_metrics.steps.items():
+            if step_metrics.started_at is None or step_metrics.ended_at is None:
+                continue
+            timings = restored if step_metrics.cache_hit else ran
+            timings.setdefault(function_name, []).append(step_metrics.ended_at - step_metrics.started_at)
+    return {
+        function_name: statistics.median(ran.get(function_name) or restored[function_name])
+        for function_name in ran.keys() | restored.keys()
+    }
+
+
+def simulate_run(plan: ExecutionPlan, durations: Mapping[str, float], workers: int) -> float:
+    """
+    Predicts how long running a pipeline takes with a number of workers, starting the ready steps in the same order
+    as the `StepScheduler`: the ones with the longest chain of steps left after them first
+
+    :param plan:
+    :param durations: How long each step takes
+    :param workers: The number of steps that run at the same time
+    :return: The predicted run time
+    """
+    if workers < 1:
+        raise ValueError(f"At least one worker is needed, got {workers}")
+    remaining_path_lengths = get_remaining_path_lengths(plan, durations)
+    positions = {function_name: position for position, function_name in enumerate(plan.order)}
+    waiting_on: Dict[str, Set[str]] = {name: set(plan.dependencies[name]) for name in plan.order}
+    dependants: Dict[str, List[str]] = {name: [] for name in plan.order}
+    for function_name in plan.order:
+        for dependency in plan.dependencies[function_name]:
+            dependants[dependency].append(function_name)
+
+    clock = 0.0
+    ready = [function_name for function_name, waiting_for in waiting_on.items() if not waiting_for]
+    running: List[Tuple[float, int, str]] = []
+    while ready or running:
+        ready.sort(key=lambda name: (-remaining_path_lengths[name], positions[name]))
+        while ready and len(running) < workers:
+            function_name = ready.pop(0)
+            heapq.heappush(running, (clock + durations[function_name], positions[function_name], function_name))
+
+        clock = running[0][0]
+        # Every step that ends at the same time frees its worker before the next steps are picked
+        while running and running[0][0] == clock:
+            _, _, function_name = heapq.heappop(running)
+            for dependant in dependants[function_name]:
+                waiting_on[dependant].discard(function_name)
+                if not waiting_on[dependant]:
+                    ready.append(dependant)
+    return clock
+
+
+def analyse_critical_path(
+    plan: ExecutionPlan, durations: Mapping[str, float], workers: Iterable[int] = ()
+) -> CriticalPathReport:
+    """
+    Finds the steps that bound the run time of a pipeline, how much every other step can be delayed without delaying
+    the run, and predicts how long the run takes
+
+    :param plan: The compiled plan of the pipeline, see `Pipeline.compile`
+    :param durations: How long each step takes, see `estimate_durations`. The steps left out are assumed to take no time
+    :param workers: The numbers of workers the run time is predicted for, on top of one step at a time and as many
+    workers as needed
+    :return:
+    """
+    unmeasured = [function_name for function_name in plan.order if function_name not in durations]
+    durations = {function_name: float(durations.get(function_name, 0.0)) for function_name in plan.order}
+    remaining_path_lengths = get_remaining_path_lengths(plan, durations)
+
+    earliest_starts: Dict[str, float] = {}
+    for function_name in plan.order:
+        earliest_starts[function_name] = max(
+            (earliest_starts[dependency] + durations[dependency] for dependency in plan.dependencies[function_name]),
+            default=0.0,
+        )
+    critical_path_time = max(remaining_path_lengths.values(), default=0.0)
+    latest_starts = {
+        function_name: critical_path_time - remaining_path_lengths[function_name] for function_name in plan.order
+    }
+    slack = {
+        function_name: max(latest_starts[function_name] - earliest_starts[function_name], 0.0)
+        for function_name in plan.order
+    }
+
+    dependants: Dict[str, List[str]] = {name: [] for name in plan.order}
+    for function_name in plan.order:
+        for dependency in plan.dependencies[function_name]:
+            dependants[dependency].append(function_name)
+    critical_path: List[str] = []
+    candidates = [function_name for function_name in plan.order if not plan.dependencies[function_name]]
+    while candidates:
+        # The next step on the critical path is the one whose chain of steps left is the longest
+        function_name = max(candidates, key=lambda name: remaining_path_lengths[name])
+        critical_path.append(function_name)
+        candidates = dependants[function_name]
+
+    return CriticalPathReport(
+        durations=durations,
+        earliest_starts=earliest_starts,
+        latest_starts=latest_starts,
+        slack=slack,
+        critical_path=critical_path,
+        serial_time=sum(durations.values()),
+        critical_path_time=critical_path_time,
+        parallel_times={worker_count: simulate_run(plan, durations, worker_count) for worker_count in workers},
+        unmeasured=unmeasured,
+    )
+
+
+def get_predictions(report: CriticalPathReport) -> List[Tuple[str, float]]:
+    predictions = [("serial", report.serial_time)]
+    predictions.extend((f"{worker_count} workers", time) for worker_count, time in report.parallel_times.items())
+    predictions.append(("unlimited workers", report.critical_path_time))
+    return predictions
+
+
+def format_report(report: CriticalPathReport, title: str = "Critical path") -> str:
+    """
+    Summarises a critical path analysis as plain text: the predicted run times, the critical path and a table of the
+    duration, earliest and latest start and slack of every step, where the steps on the critical path are marked with
+    an asterisk
+
+    :param report:
+    :param title: The first line of the summary
+    :return:
+    """
+    lines = [f"{title} (from {report.run_count} runs)"]
+    lines.append("Predicted run time: " + ", ".join(f"{name} {time:.2f}s" for name, time in get_predictions(report)))
+    lines.append("Critical path: " + " -> ".join(report.critical_path))
+    if report.unmeasured:
+        lines.append("No timings recorded for: " + ", ".join(report.unmeasured))
+    lines.append("")
+
+    width = max([len("step"), *(len(function_name) + 2 for function_name in report.durations)])
+    lines.append(f"{'step':<{width}} {'duration':>10} {'earliest':>10} {'latest':>10} {'slack':>10}")
+    critical = set(report.critical_path)
+    for function_name, duration in report.durations.items():
+        name = f"{function_name} *" if function_name in critical else function_name
+        lines.append(
+            f"{name:<{width}} {duration:>9.2f}s {report.earliest_starts[function_name]:>9.2f}s "
+            f"{report.latest_starts[function_name]:>9.2f}s {report.slack[function_name]:>9.2f}s"
+        )
+    return "\n".join(lines)
+
+
+def format_report_html(report: CriticalPathReport, title: str = "Critical path") -> str:
+    """
+    Summarises a critical path analysis as an HTML fragment with the same content as `format_report`, where the rows
+    of the steps on the critical path have the "critical" class
+
+    :param report:
+    :param title: The heading of the summary
+    :return:
+    """
+    predictions = "".join(f"<li>{escape(name)}: {time:.2f}s</li>" for name, time in get_predictions(report))
+    parts = [
+        f"<h2>{escape(title)}</h2>",
+        f"<p>From {report.run_count} runs</p>",
+        f"<ul>{predictions}</ul>",
+        f"<p>Critical path: {escape(' → '.join(report.critical_path))}</p>",
+    ]
+    if report.unmeasured:
+        parts.append(f"<p>No timings recorded for: {escape(', '.join(report.unmeasured))}</p>")
+
+    rows = []
+    critical = set(report.critical_path)
+    for function_name, duration in report.durations.items():
+        row_class = ' class="critical"' if function_name in critical else ""
+        cells = [duration, report.earliest_starts[function_name], report.latest_starts[function_name]]
+        cells.append(report.slack[function_name])
+        rows.append(
+            f"<tr{row_class}><td>{escape(function_name)}</td>"
+            + "".join(f"<td>{cell:.2f}</td>" for cell in cells)
+            + "</tr>"
+        )
+    parts.append(
+        "<table><thead><tr><th>Step</th><th>Duration (s)</th><th>Earliest start (s)</th><th>Latest start (s)</th>"
+        f"<th>Slack (s)</th></tr></thead><tbody>{''.join(rows)}</tbody></table>"
+    )
+    return "\n".join(parts)
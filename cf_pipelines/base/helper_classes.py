@@ -1,27 +1,188 @@
-from dataclasses import dataclass
-from typing import Callable, Set
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Set, Tuple
+
+
+@dataclass(frozen=True)
+class PartitionSpec:
+    """
+    A class to hold how a mapped step is applied: the name of the artifact whose partitions it is applied to, the
+    column the artifact is split by (when it is a data frame rather than a mapping of partitions) and the maximum
+    number of partitions processed at the same time.
+    """
+
+    over: str
+    partition_by: Optional[str] = None
+    max_workers: Optional[int] = None
 
 
 @dataclass
 class FunctionDetails:
     """
-    A class to hold details about a function: its reference, what artifacts it produces, which ones it generates
-    and the group it belongs to.
+    A class to hold details about a function: its reference, what artifacts it produces, which ones it generates,
+    the group it belongs to, whether its artifacts are persisted when the pipeline runs in memory, whether it
+    receives lazy proxies instead of the artifacts it needs, whether it streams its artifacts in chunks, whether it
+    was defined with `async def`, for mapped steps, the partitions it is applied to and the number of cpus and bytes of
+    memory it takes up while it runs.
     """
 
     python_function: Callable
     produces: Set[str]
     needs: Set[str]
     group: str
+    persist: bool = False
+    lazy: bool = False
+    streams: bool = False
+    asynchronous: bool = False
+    partitions: Optional[PartitionSpec] = None
+    cpus: float = 1.0
+    memory: int = 0
+
+    @property
+    def writes_own_products(self) -> bool:
+        """
+        Whether the function's products are written to disk while it runs, instead of being returned to the pipeline
+        """
+        return self.streams or self.partitions is not None
 
 
 @dataclass
 class ProductLineage:
     """
     A class to hold information about a given product (or artifact): the group it belongs to, the actual filename
-    stored on disk and the name of the function that produces it.
+    stored on disk, the name of the function that produces it and whether it is made of partitions, stored in a
+    folder named after the file name.
     """
 
     group: str
     file_name: str
     produced_by: str
+    partitioned: bool = False
+
+
+@dataclass
+class ArtifactFormat:
+    """
+    A class to hold how artifacts with a given file extension are stored: the functions that write and read them,
+    which objects can be stored this way, the bytes the files in this format start with and, optionally, a function
+    that memory-maps a file instead of reading it.
+    """
+
+    dump: Callable[[Any, BinaryIO], None]
+    load: Callable[[BinaryIO], Any]
+    accepts: Optional[Callable[[Any], bool]] = None
+    magic: Optional[bytes] = None
+    load_mapped: Optional[Callable[[Path], Any]] = None
+
+
+@dataclass
+class Codec:
+    """
+    A class to hold how a compression codec is used: the file extension of the artifacts it compresses, the functions
+    that wrap a binary file to compress what is written to it or decompress what is read from it, the default
+    compression level and the bytes every compressed file starts with.
+    """
+
+    extension: str
+    open_writer: Callable[[BinaryIO, int], BinaryIO]
+    open_reader: Callable[[BinaryIO], BinaryIO]
+    default_level: int
+    magic: bytes
+
+
+@dataclass
+class StepMetrics:
+    """
+    A class to hold the metrics recorded for a step during a run: when it was queued, started and ended (in seconds,
+    from a monotonic clock), how long it waited to start, how long it spent reading its inputs, computing and writing
+    its products, the size in bytes of the products on disk, whether it was restored from the cache and, for lazy
+    steps, the inputs it never used. The values that could not be measured are left as `None`.
+    """
+
+    function_name: str
+    queued_at: Optional[float] = None
+    started_at: Optional[float] = None
+    ended_at: Optional[float] = None
+    queue_wait: Optional[float] = None
+    unserialize_time: Optional[float] = None
+    compute_time: Optional[float] = None
+    serialize_time: Optional[float] = None
+    product_sizes: Dict[str, int] = field(default_factory=dict)
+    cache_hit: Optional[bool] = None
+    untouched_inputs: Optional[List[str]] = None
+
+
+@dataclass(frozen=True)
+class InputBinding:
+    """
+    A class to hold where a function gets one of its inputs from: either the product of another function, named by
+    `produced_by`, or an argument read from the environment variable `environment_variable` or, when it is not set,
+    from the extra arguments passed on to the pipeline.
+    """
+
+    name: str
+    produced_by: Optional[str] = None
+    environment_variable: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    A class to hold which of the runs tracked with `track_all` are kept: at most the `keep_last` most recent runs,
+    only the runs younger than `max_age` and, removing the oldest runs first, as many runs as fit in `max_size` bytes.
+    The step cache counts towards `max_size` too, and its least recently used entries no run links to are removed
+    before any run. Any limit left as `None` is not applied.
+    """
+
+    keep_last: Optional[int] = None
+    max_age: Optional[timedelta] = None
+    max_size: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class ResourceBudget:
+    """
+    A class to hold the resources of the machine shared by the steps running at the same time: the number of cpus,
+    which defaults to the number of cpus of the machine, and the memory in bytes, which is unlimited when left as `None`.
+    """
+
+    cpus: Optional[float] = None
+    memory: Optional[int] = None
+
+
+@dataclass
+class CriticalPathReport:
+    """
+    A class to hold the critical path analysis of a pipeline, built from the timings recorded in past runs: how long
+    each step is expected to take, the earliest and latest time (since the run started) each step can start without
+    delaying the run, how much each step can be delayed (its slack), the steps that bound the run time in the order
+    they run, the predicted run time when running one step at a time, with as many workers as needed and with a given
+    number of workers, the steps that have no recorded timings, assumed to take no time, and how many runs the timings
+    come from. All the times are in seconds.
+    """
+
+    durations: Dict[str, float]
+    earliest_starts: Dict[str, float]
+    latest_starts: Dict[str, float]
+    slack: Dict[str, float]
+    critical_path: List[str]
+    serial_time: float
+    critical_path_time: float
+    parallel_times: Dict[int, float] = field(default_factory=dict)
+    unmeasured: List[str] = field(default_factory=list)
+    run_count: int = 0
+
+
+@dataclass(frozen=True)
+class CompiledStep:
+    """
+    A class to hold how a step is called by a pipeline compiled into an in-process function: the original function,
+    without the wrapper that runs it for Ploomber, the names of the values it is called with and the names of its
+    products keyed by the file names it returns them under.
+    """
+
+    name: str
+    python_function: Callable
+    arguments: Tuple[str, ...]
+    products: Dict[str, str]
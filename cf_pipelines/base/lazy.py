@@ -0,0 +1,148 @@
+import operator
+from threading import Lock
+from typing import Any, Callable, List, Tuple
+
+_NOT_LOADED = object()
+
+
+class LazyArtifact:
+    """
+    A stand-in for a product that is only read when first used: accessing any of its attributes, or using it with
+    any operator, loads the product and forwards the operation to it. The proxy itself has no public attributes, so
+    they never hide the product's, use `unwrap_artifact` and `is_loaded` to inspect it.
+    """
+
+    __slots__ = ("__name", "__loader", "__value", "__lock")
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        object.__setattr__(self, "_LazyArtifact__name", name)
+        object.__setattr__(self, "_LazyArtifact__loader", loader)
+        object.__setattr__(self, "_LazyArtifact__value", _NOT_LOADED)
+        object.__setattr__(self, "_LazyArtifact__lock", Lock())
+
+    def __load(self) -> Any:
+        with self.__lock:
+            if self.__value is _NOT_LOADED:
+                object.__setattr__(self, "_LazyArtifact__value", self.__loader())
+        return self.__value
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self.__load(), attribute)
+
+    def __setattr__(self, attribute: str, value: Any) -> None:
+        setattr(self.__load(), attribute, value)
+
+    def __delattr__(self, attribute: str) -> None:
+        delattr(self.__load(), attribute)
+
+    def __array__(self, *args, **kwargs) -> Any:
+        import numpy
+
+        return numpy.asarray(self.__load(), *args, **kwargs)
+
+    def __repr__(self) -> str:
+        if self.__value is _NOT_LOADED:
+            return f"<LazyArtifact {self.__name} (not loaded)>"
+        return repr(self.__value)
+
+
+def _forward(method_name: str) -> Callable:
+    def forwarded(self, *args, **kwargs):
+        return getattr(unwrap_artifact(self), method_name)(*args, **kwargs)
+
+    forwarded.__name__ = method_name
+    return forwarded
+
+
+def _forward_function(method_name: str, function: Callable) -> Callable:
+    def forwarded(self, *args):
+        return function(unwrap_artifact(self), *args)
+
+    forwarded.__name__ = method_name
+    return forwarded
+
+
+# Python looks special methods up in the class, so they have to be defined explicitly to reach the loaded product
+for _method_name in [
+    "__str__",
+    "__bytes__",
+    "__format__",
+    "__len__",
+    "__iter__",
+    "__reversed__",
+    "__contains__",
+    "__getitem__",
+    "__setitem__",
+    "__delitem__",
+    "__call__",
+    "__enter__",
+    "__exit__",
+]:
+    setattr(LazyArtifact, _method_name, _forward(_method_name))
+
+_forwarded_functions: List[Tuple[str, Callable[..., Any]]] = [
+    ("__bool__", bool),
+    ("__hash__", hash),
+    ("__int__", int),
+    ("__float__", float),
+    ("__index__", operator.index),
+    ("__neg__", operator.neg),
+    ("__pos__", operator.pos),
+    ("__abs__", abs),
+    ("__invert__", operator.invert),
+    ("__eq__", operator.eq),
+    ("__ne__", operator.ne),
+    ("__lt__", operator.lt),
+    ("__le__", operator.le),
+    ("__gt__", operator.gt),
+    ("__ge__", operator.ge),
+    ("__add__", operator.add),
+    ("__sub__", operator.sub),
+    ("__mul__", operator.mul),
+    ("__matmul__", operator.matmul),
+    ("__truediv__", operator.truediv),
+    ("__floordiv__", operator.floordiv),
+    ("__mod__", operator.mod),
+    ("__pow__", operator.pow),
+    ("__and__", operator.and_),
+    ("__or__", operator.or_),
+    ("__xor__", operator.xor),
+    ("__lshift__", operator.lshift),
+    ("__rshift__", operator.rshift),
+    ("__radd__", lambda value, other: other + value),
+    ("__rsub__", lambda value, other: other - value),
+    ("__rmul__", lambda value, other: other * value),
+    ("__rmatmul__", lambda value, other: other @ value),
+    ("__rtruediv__", lambda value, other: other / value),
+    ("__rfloordiv__", lambda value, other: other // value),
+    ("__rmod__", lambda value, other: other % value),
+    ("__rpow__", lambda value, other: other**value),
+    ("__rand__", lambda value, other: other & value),
+    ("__ror__", lambda value, other: other | value),
+    ("__rxor__", lambda value, other: other ^ value),
+]
+for _method_name, _function in _forwarded_functions:
+    setattr(LazyArtifact, _method_name, _forward_function(_method_name, _function))
+
+
+def unwrap_artifact(value: Any) -> Any:
+    """
+    Gets the actual product behind a `LazyArtifact`, loading it if needed. Any other value is returned as it is.
+    Useful to pass a product on to libraries that check its type.
+
+    :param value:
+    :return:
+    """
+    if isinstance(value, LazyArtifact):
+        return object.__getattribute__(value, "_LazyArtifact__load")()
+    return value
+
+
+def is_loaded(value: LazyArtifact) -> bool:
+    """
+    Checks whether the product behind a `LazyArtifact` has been read already
+
+    :param value:
+    :return:
+    """
+    return object.__getattribute__(value, "_LazyArtifact__value") is not _NOT_LOADED
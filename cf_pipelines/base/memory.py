@@ -0,0 +1,196 @@
+import sys
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set
+
+if TYPE_CHECKING:
+    from cf_pipelines.base.pipeline import Pipeline
+
+
+class InMemoryArtifacts:
+    """
+    Holds the products generated during a run in memory, so they can be handed straight to the steps that need them
+    instead of being serialized to disk and read back.
+
+    Each product is released as soon as the last step that needs it is done, see `count_consumers` and `release`, so
+    the memory used by a run is bounded by the products still waiting to be used rather than by all of them.
+
+    The steps are handed the products themselves, not copies: every step that needs a product gets the same object,
+    even the steps running at the same time on other threads, so the steps must not modify the products they need.
+
+    Attributes
+    ---------
+    pipeline: Pipeline
+        The pipeline being run
+    background_persist: bool
+        When true, every product is also written to disk by a background thread, so the step that generated it and
+        the steps that don't need it don't wait for it. The steps that need it wait until it is written, as they may
+        modify it while it is being serialized otherwise. When false, only the products of the steps registered with `persist=True` are written to disk, right
+        after the step finishes
+    memory_budget: int
+        When set, the oldest products held in memory are spilled to disk, and read back from there by the steps that
+        need them, whenever the estimated size of the products held in memory goes over this many bytes
+    on_disk: set
+        The products read from disk instead of from memory: the ones spilled to disk and the ones generated by an
+        earlier run that the steps about to run need
+    persisted_functions: set
+        The steps whose products are written to disk, on top of the ones registered with `persist=True`
+    """
+
+    def __init__(self, pipeline: "Pipeline", background_persist: bool = False, memory_budget: Optional[int] = None):
+        self.pipeline = pipeline
+        self.background_persist = background_persist
+        self.memory_budget = memory_budget
+        self.values: Dict[str, Any] = {}
+        self.sizes: Dict[str, int] = {}
+        self.consumers: Dict[str, int] = {}
+        self.spilling: Set[str] = set()
+        self.on_disk: Set[str] = set()
+        self.persisted_functions: Set[str] = set()
+        self.lock = Lock()
+        self.writer: Optional[ThreadPoolExecutor] = None
+        self.pending_writes: Dict[str, Future] = {}
+        if background_persist:
+            self.writer = ThreadPoolExecutor(1, thread_name_prefix=f"{pipeline.name} writer")
+
+    def get(self, product_name: str) -> Any:
+        pending_write = self.pending_writes.get(product_name)
+        if pending_write:
+            # The product is only handed over once written, any error is raised by `close`
+            wait([pending_write])
+        with self.lock:
+            if product_name not in self.on_disk:
+                return self.values[product_name]
+        return self.pipeline.read_artifact(product_name)
+
+    def is_persisted(self, function_name: str) -> bool:
+        function_details = self.pipeline.function_details[function_name]
+        # Streamed and partitioned products are written to disk by the step itself
+        persisted = self.background_persist or function_details.persist or function_name in self.persisted_functions
+        return persisted and not function_details.writes_own_products
+
+    def put(self, function_name: str, returns: Dict[str, Any]) -> None:
+        """
+        Stores the products returned by a step and persists them if needed
+
+        :param function_name: The name of the step that generated the products
+        :param returns: A mapping of product names (with no extension) to their values
+        """
+        with self.lock:
+            self.values.update(returns)
+            if self.memory_budget is not None:
+                self.sizes.update({product_name: estimate_size(value) for product_name, value in returns.items()})
+
+        if self.is_persisted(function_name):
+            for product_name, value in returns.items():
+                if self.writer:
+                    self.pending_writes[product_name] = self.writer.submit(
+                        self.pipeline.write_artifact, product_name, value
+                    )
+                else:
+                    self.pipeline.write_artifact(product_name, value)
+
+        if self.memory_budget is not None:
+            self.spill()
+
+    def count_consumers(self, function_names: Iterable[str]) -> None:
+        """
+        Counts how many of the steps about to run need each product, so the products can be released once they are
+        no longer needed
+
+        :param function_names: The steps about to run
+        """
+        inputs = self.pipeline.compile().inputs
+        self.consumers = Counter(
+            binding.name
+            for function_name in function_names
+            for binding in inputs[function_name]
+            if binding.produced_by is not None
+        )
+
+    def release(self, function_name: str) -> List[str]:
+        """
+        Records that a step is done, discarding the products it needed, or generated, that no other step will need
+
+        :param function_name: The name of the step
+        :return: The names of the discarded products
+        """
+        needed = [binding.name for binding in self.pipeline.compile().inputs[function_name] if binding.produced_by]
+        with self.lock:
+            for product_name in needed:
+                self.consumers[product_name] -= 1
+            candidates = needed + list(self.pipeline.function_details[function_name].produces)
+            released = [product_name for product_name in candidates if not self.consumers.get(product_name)]
+        for product_name in released:
+            self.discard(product_name)
+        return released
+
+    def discard(self, product_name: str) -> None:
+        with self.lock:
+            self.values.pop(product_name, None)
+            self.sizes.pop(product_name, None)
+
+    def spill(self) -> None:
+        """
+        Writes the oldest products held in memory to disk until the ones left fit in the memory budget
+        """
+        if self.memory_budget is None:
+            return
+        with self.lock:
+            resident_size = sum(size for product_name, size in self.sizes.items() if product_name not in self.spilling)
+            spilled = []
+            # The products are kept in the order they were generated
+            for product_name in self.values:
+                if resident_size <= self.memory_budget:
+                    break
+                if product_name not in self.spilling:
+                    self.spilling.add(product_name)
+                    spilled.append((product_name, self.values[product_name]))
+                    resident_size -= self.sizes[product_name]
+
+        for product_name, value in spilled:
+            # The product stays in memory while it is being written, so it can still be read by other steps
+            function_name = self.pipeline.product_lineages[product_name].produced_by
+            if product_name in self.pending_writes:
+                self.pending_writes[product_name].result()
+            elif not (
+                self.is_persisted(function_name) or self.pipeline.function_details[function_name].writes_own_products
+            ):
+                self.pipeline.write_artifact(product_name, value)
+            with self.lock:
+                self.spilling.discard(product_name)
+                if product_name in self.values:
+                    self.on_disk.add(product_name)
+                    del self.values[product_name], self.sizes[product_name]
+            self.pipeline.meta_logger.info(f"Spilled {product_name} to disk to stay within the memory budget")
+
+    def close(self) -> None:
+        """
+        Waits for the background writes to finish, raising the first error found while writing
+        """
+        if self.writer:
+            self.writer.shutdown(wait=True)
+            for pending_write in self.pending_writes.values():
+                pending_write.result()
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Estimates the memory taken up by a product: the size of the buffers of arrays (such as numpy arrays or pyarrow
+    tables), the deep memory usage of pandas objects and the shallow size of any other object
+
+    :param value:
+    :return: The size in bytes
+    """
+    memory_usage = getattr(value, "memory_usage", None)
+    if callable(memory_usage):
+        try:
+            usage = memory_usage(deep=True)
+            return int(usage.sum() if hasattr(usage, "sum") else usage)
+        except TypeError:
+            pass
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(value)
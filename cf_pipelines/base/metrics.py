@@ -0,0 +1,115 @@
+import json
+from dataclasses import asdict
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Optional, Union
+
+from cf_pipelines.base.helper_classes import StepMetrics
+
+METRICS_FILE_NAME = "metrics.json"
+
+COMPARED_METRICS = ["wall_time", "queue_wait", "unserialize_time", "compute_time", "serialize_time", "product_bytes"]
+
+
+class RunMetrics:
+    """
+    A class to collect the metrics of every step during a run, stored as `metrics.json` in the run folder
+
+    Attributes
+    ---------
+    pipeline_name: str
+        The name of the pipeline that ran
+    run_id: str
+        The identifier of the run
+    steps: dict
+        The metrics of each step, keyed by the step's name
+    """
+
+    def __init__(self, pipeline_name: str, run_id: str, steps: Optional[Dict[str, StepMetrics]] = None):
+        self.pipeline_name = pipeline_name
+        self.run_id = run_id
+        self.steps: Dict[str, StepMetrics] = steps or {}
+        self.lock = Lock()
+
+    def record(self, step_metrics: StepMetrics) -> None:
+        """
+        Adds the metrics of a step, replacing any metrics previously recorded for it
+
+        :param step_metrics:
+        """
+        with self.lock:
+            self.steps[step_metrics.function_name] = step_metrics
+
+    def save(self, location: Union[str, Path]) -> Path:
+        """
+        Writes the metrics to the run folder inside `location`
+
+        :param location: The location of the pipeline
+        :return: The path of the written file
+        """
+        path = Path(location, self.run_id, METRICS_FILE_NAME)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            steps = [asdict(step_metrics) for step_metrics in self.steps.values()]
+        content = {"pipeline_name": self.pipeline_name, "run_id": self.run_id, "steps": steps}
+        path.write_text(json.dumps(content, indent=2))
+        return path
+
+    @classmethod
+    def load(cls, location: Union[str, Path], run_id: str) -> "RunMetrics":
+        """
+        Reads the metrics recorded for a run
+
+        :param location: The location of the pipeline
+        :param run_id: The identifier of the run
+        :return:
+        """
+        content = json.loads(Path(location, run_id, METRICS_FILE_NAME).read_text())
+        steps = {step["function_name"]: StepMetrics(**step) for step in content["steps"]}
+        return cls(content["pipeline_name"], content["run_id"], steps)
+
+    def summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Summarises the metrics of each step into the values compared by `compare_runs`
+
+        :return: A dictionary keyed by step name, whose values map each metric in `COMPARED_METRICS` to its value
+        """
+        summary = {}
+        for function_name, step_metrics in self.steps.items():
+            wall_time = None
+            if step_metrics.started_at is not None and step_metrics.ended_at is not None:
+                wall_time = step_metrics.ended_at - step_metrics.started_at
+            summary[function_name] = {
+                "wall_time": wall_time,
+                "queue_wait": step_metrics.queue_wait,
+                "unserialize_time": step_metrics.unserialize_time,
+                "compute_time": step_metrics.compute_time,
+                "serialize_time": step_metrics.serialize_time,
+                "product_bytes": float(sum(step_metrics.product_sizes.values())),
+            }
+        return summary
+
+
+def compare_runs(baseline: RunMetrics, other: RunMetrics) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    Compares the metrics of two runs, step by step
+
+    :param baseline: The metrics of the run to compare against
+    :param other: The metrics of the run being compared
+    :return: A dictionary keyed by the names of the steps present in both runs, whose values map each metric in
+    `COMPARED_METRICS` to its difference (the value in `other` minus the value in `baseline`), or `None` when it was
+    not measured in either run
+    """
+    baseline_summary = baseline.summary()
+    other_summary = other.summary()
+    differences: Dict[str, Dict[str, Optional[float]]] = {}
+    for function_name in baseline_summary.keys() & other_summary.keys():
+        differences[function_name] = {}
+        for metric in COMPARED_METRICS:
+            baseline_value = baseline_summary[function_name][metric]
+            other_value = other_summary[function_name][metric]
+            if baseline_value is None or other_value is None:
+                differences[function_name][metric] = None
+            else:
+                differences[function_name][metric] = other_value - baseline_value
+    return differences
@@ -0,0 +1,233 @@
+import hashlib
+import os
+import pickle
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, Mapping, Optional, Set, cast
+from urllib.parse import quote
+
+from cf_pipelines.base.cache import hash_value
+from cf_pipelines.base.helper_classes import PartitionSpec
+from cf_pipelines.base.retention import CACHE_FOLDER_NAME
+from cf_pipelines.base.serializers import as_product, unserialize_artifact
+from cf_pipelines.base.utils import hash_file, hash_source, link_or_copy, remove_extension
+
+if TYPE_CHECKING:
+    from cf_pipelines.base.pipeline import Pipeline
+
+PARTITIONS_FILE_NAME = ".partitions"
+
+
+class PartitionedArtifact(Mapping):
+    """
+    A product generated by a mapped step, made of one value per partition of the artifact the step was applied to.
+    Each partition is stored in its own file inside the product's folder, and is only read when accessed, so it
+    behaves as a read-only mapping of the partition keys to their values that never needs to be held in memory at once.
+
+    Attributes
+    ---------
+    path: Path
+        The folder the partitions are stored in
+    unserializer: Callable
+        The Ploomber unserializer used to read each partition
+    """
+
+    def __init__(self, path: Path, unserializer: Callable = unserialize_artifact):
+        self.path = Path(path)
+        self.unserializer = unserializer
+        self._file_names: Optional[Dict[Any, str]] = None
+
+    @property
+    def file_names(self) -> Dict[Any, str]:
+        """
+        The names of the files each partition is stored in, keyed by the partitions' keys
+        """
+        if self._file_names is None:
+            with open(Path(self.path, PARTITIONS_FILE_NAME), "rb") as rb:
+                self._file_names = cast(Dict[Any, str], pickle.load(rb))
+        return self._file_names
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.unserializer(as_product(Path(self.path, self.file_names[key])))
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.file_names)
+
+    def __len__(self) -> int:
+        return len(self.file_names)
+
+    def fingerprint(self, key: Any) -> str:
+        return hash_file(Path(self.path, self.file_names[key]))
+
+    def __repr__(self) -> str:
+        return f"PartitionedArtifact({str(self.path)!r})"
+
+
+def get_partition_spec(pipeline: "Pipeline", function_name: str) -> PartitionSpec:
+    spec = pipeline.function_details[function_name].partitions
+    if spec is None:
+        raise ValueError(f"The step {function_name} is not a mapped step")
+    return spec
+
+
+def split_partitions(value: Any, partition_by: Optional[str] = None) -> Mapping:
+    """
+    Splits an artifact into its partitions
+
+    :param value: Either a mapping of partition keys to partitions, such as a `PartitionedArtifact`, or a data frame
+    :param partition_by: The column a data frame is split by
+    :return: A mapping of the partition keys to the partitions
+    """
+    if partition_by is not None:
+        return {key: partition for key, partition in value.groupby(partition_by, sort=True)}
+    if not isinstance(value, Mapping):
+        raise TypeError(f"Only mappings can be partitioned without a `partition_by` column, got {type(value)}")
+    return value
+
+
+def map_partitions(
+    pipeline: "Pipeline", function_name: str, python_function: Callable, kwargs: Dict[str, Any]
+) -> Dict[str, PartitionedArtifact]:
+    """
+    Applies a mapped step to every partition of the artifact it is mapped over, in parallel, writing the products
+    generated for each partition to their own file, which is backed up if there is a `File` client in the pipeline's
+    `dag_clients`. When the pipeline's `cache` is set, the products of each partition are cached by the step's source
+    code, the partition's contents and the values of the other arguments, so only the partitions that changed are
+    computed again in later runs.
+
+    :param pipeline: The pipeline the step belongs to
+    :param function_name: The name of the step
+    :param python_function: The function applied to each partition
+    :param kwargs: The arguments of the step, the one the step is mapped over holds every partition
+    :return: A mapping of the file names of the step's products to their `PartitionedArtifact`
+    """
+    function_details = pipeline.function_details[function_name]
+    spec = get_partition_spec(pipeline, function_name)
+    partitions = split_partitions(kwargs[spec.over], spec.partition_by)
+
+    file_names = {
+        product_name: pipeline.product_lineages[product_name].file_name for product_name in function_details.produces
+    }
+    folders = {product_name: pipeline.get_local_artifact_path(product_name) for product_name in file_names}
+    for folder in folders.values():
+        if folder.is_dir():
+            # The partitions may be hard linked from the cache, they are never modified in place
+            shutil.rmtree(folder)
+        elif folder.exists():
+            folder.unlink()
+        folder.mkdir(parents=True)
+
+    partition_file_stems: Dict[Any, str] = {}
+    used_stems: Set[str] = set()
+    for key in partitions:
+        stem = quote(str(key), safe="")
+        # Different keys may have the same representation, such as 1 and "1"
+        if stem in used_stems:
+            stem = f"{stem}-{uuid.uuid4().hex[:8]}"
+        partition_file_stems[key] = stem
+        used_stems.add(stem)
+
+    arguments_key = hashlib.sha256(hash_source(python_function).encode())
+    for name in sorted(kwargs):
+        if name != spec.over:
+            arguments_key.update(name.encode())
+            arguments_key.update(hash_value(kwargs[name]).encode())
+    cache_location = Path(pipeline.location, CACHE_FOLDER_NAME)
+
+    def write_partition(key: Any, paths: Dict[str, Path]) -> None:
+        returns = python_function(**{**kwargs, spec.over: partitions[key]})
+        returns = {remove_extension(file_name): value for file_name, value in returns.items()}
+        if set(returns) != set(paths):
+            raise ValueError(f"{function_name} returned {sorted(returns)} instead of {sorted(paths)} for {key!r}")
+        for product_name, value in returns.items():
+            pipeline.serializer(value, as_product(paths[product_name]))
+
+    def build_partition(key: Any) -> bool:
+        paths = {
+            product_name: Path(folders[product_name], partition_file_stems[key] + get_extension(file_name))
+            for product_name, file_name in file_names.items()
+        }
+        if not pipeline.cache:
+            write_partition(key, paths)
+            return False
+
+        partitions_key = arguments_key.copy()
+        partitions_key.update(repr(key).encode())
+        if isinstance(partitions, PartitionedArtifact):
+            partitions_key.update(partitions.fingerprint(key).encode())
+        else:
+            partitions_key.update(hash_value(partitions[key]).encode())
+        entry = Path(cache_location, partitions_key.hexdigest())
+
+        if entry.is_dir():
+            os.utime(entry)
+            for product_name, path in paths.items():
+                link_or_copy(Path(entry, file_names[product_name]), path)
+            return True
+
+        write_partition(key, paths)
+
+        temporary_entry = Path(cache_location, f"{entry.name}.{uuid.uuid4().hex}.tmp")
+        temporary_entry.mkdir(parents=True)
+        for product_name, path in paths.items():
+            link_or_copy(path, Path(temporary_entry, file_names[product_name]))
+        try:
+            temporary_entry.rename(entry)
+        except OSError:
+            # Another run stored the same partition in the meantime
+            shutil.rmtree(temporary_entry)
+        return False
+
+    with ThreadPoolExecutor(spec.max_workers or pipeline.max_workers) as pool:
+        cache_hits = sum(pool.map(build_partition, partitions))
+    if cache_hits:
+        pipeline.meta_logger.info(f"Restored {cache_hits} of the {len(partitions)} partitions of {function_name}")
+
+    for product_name, folder in folders.items():
+        partition_file_names = {
+            key: stem + get_extension(file_names[product_name]) for key, stem in partition_file_stems.items()
+        }
+        with open(Path(folder, PARTITIONS_FILE_NAME), "wb") as wb:
+            pickle.dump(partition_file_names, wb)
+        # Backed up like the products written by `Pipeline.write_artifact`, the list of the partitions goes last
+        for partition_file_name in partition_file_names.values():
+            pipeline.upload_artifact(Path(folder, partition_file_name))
+        pipeline.upload_artifact(Path(folder, PARTITIONS_FILE_NAME))
+    return {
+        file_name: PartitionedArtifact(folders[product_name], pipeline.unserializer)
+        for product_name, file_name in file_names.items()
+    }
+
+
+def apply_to_partitions(
+    pipeline: "Pipeline", function_name: str, python_function: Callable, kwargs: Dict[str, Any]
+) -> Dict[str, Dict[Any, Any]]:
+    """
+    Applies a mapped step to every partition of the artifact it is mapped over, one after the other, keeping the
+    products in memory. Used when the step is called directly, outside of a run, so nothing is written to disk
+
+    :param pipeline: The pipeline the step belongs to
+    :param function_name: The name of the step
+    :param python_function: The function applied to each partition
+    :param kwargs: The arguments of the step, the one the step is mapped over holds every partition
+    :return: A mapping of the file names of the step's products to dictionaries of the partition keys to the values
+    generated for them
+    """
+    function_details = pipeline.function_details[function_name]
+    spec = get_partition_spec(pipeline, function_name)
+    file_names = {pipeline.product_lineages[product_name].file_name for product_name in function_details.produces}
+    products: Dict[str, Dict[Any, Any]] = {file_name: {} for file_name in file_names}
+    for key, partition in split_partitions(kwargs[spec.over], spec.partition_by).items():
+        returns = python_function(**{**kwargs, spec.over: partition})
+        if set(returns) != file_names:
+            raise ValueError(f"{function_name} returned {sorted(returns)} instead of {sorted(file_names)} for {key!r}")
+        for file_name, value in returns.items():
+            products[file_name][key] = value
+    return products
+
+
+def get_extension(file_name: str) -> str:
+    extensions = file_name.partition(".")[2]
+    return f".{extensions}" if extensions else ""
@@ -1,20 +1,69 @@
 import inspect
 import logging
+import multiprocessing
 import os
+import shutil
 import time
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Set, Union
+from typing import (
+    TYPE_CHECKING,
+    AbstractSet,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Union,
+)
 
-from ploomber import DAG
-from ploomber.executors import Serial
-from ploomber.io import serializer_pickle, unserializer_pickle
-from ploomber.products import File
-from ploomber.tasks import PythonCallable
+from cf_pipelines.base import sweeps
+from cf_pipelines.base.critical_path import analyse_critical_path, estimate_durations, format_report, format_report_html
+from cf_pipelines.base.helper_classes import (
+    CriticalPathReport,
+    FunctionDetails,
+    PartitionSpec,
+    ProductLineage,
+    ResourceBudget,
+    RetentionPolicy,
+    StepMetrics,
+)
+from cf_pipelines.base.metrics import METRICS_FILE_NAME, RunMetrics
+from cf_pipelines.base.partitions import PartitionedArtifact, apply_to_partitions, map_partitions
+from cf_pipelines.base.plan import ExecutionPlan, compile_plan, get_dependent_functions
+from cf_pipelines.base.retention import PIN_FILE_NAME, RUN_ID_FORMAT, collect_garbage, list_runs
+from cf_pipelines.base.scheduler import CONCURRENT_EXECUTORS, StepScheduler
+from cf_pipelines.base.serializers import (
+    as_product,
+    compressed_serializer,
+    get_codec,
+    get_format,
+    import_ploomber,
+    serialize_artifact,
+    unserialize_artifact,
+    unserialize_memory_mapped,
+)
+from cf_pipelines.base.serving import CompiledFunction, compile_function
+from cf_pipelines.base.store import BlobStore
+from cf_pipelines.base.streaming import ChunkedArtifact
+from cf_pipelines.base.uploads import BackgroundUploader
+from cf_pipelines.base.utils import (
+    get_return_keys_from_function,
+    link_or_copy,
+    remove_extension,
+    wrap_preserving_signature,
+)
 
-from cf_pipelines.base.helper_classes import FunctionDetails, ProductLineage
-from cf_pipelines.base.utils import get_return_keys_from_function, remove_extension, wrap_preserving_signature
+if TYPE_CHECKING:
+    # Ploomber takes seconds to import, it is only imported once a DAG is built or a product is read or written
+    from ploomber import DAG
+    from ploomber.tasks import PythonCallable
 
 
 class Pipeline:
@@ -31,18 +80,75 @@ class Pipeline:
         Any extra arguments that should be passed to the functions upon request
     dag_clients: dict
         Any Ploomber clients, used to back up the data produced by the pipeline.
-        See https://docs.ploomber.io/en/latest/user-guide/faq_index.html#why-do-products-have-clients for more info
+        See https://docs.ploomber.io/en/latest/user-guide/faq_index.html#why-do-products-have-clients for more info.
+        Wrap a client in a `cf_pipelines.base.uploads.BackgroundUploader` to upload the products in the background
     serializer: Callable
-        The method used to serialise data generated by the pipelines.
+        The method used to serialise data generated by the pipelines. By default, the format of each artifact is picked
+        from its file extension, see `cf_pipelines.base.serializers.register_format`.
         See https://docs.ploomber.io/en/latest/user-guide/serialization.html#Serialization for more info
     unserializer: Callable
         The method used to unserializer data generated by the pipelines.
         See https://docs.ploomber.io/en/latest/user-guide/serialization.html#Serialization for more info
+    memory_map: bool
+        When no `unserializer` is given, memory-map the artifacts stored as .npy or .arrow files and hand the steps
+        read-only, zero-copy views of them instead of reading them into memory
+    compression: str
+        When no `serializer` is given, compress every artifact with this codec: "gzip", "zstd" (needs the zstandard
+        package) or "lz4" (needs the lz4 package). A single artifact is compressed by ending its file name with the
+        codec's extension instead, e.g. "features.parquet.zst". Compressed artifacts are decompressed transparently
+        when read, see `cf_pipelines.base.serializers.register_codec`
+    compression_level: int
+        The compression level used with `compression`, defaults to the codec's default level
     track_all: bool
         A flag that specifies whether each run should be tracked independently. When set to false, all the artifacts
         are saved to a "default" folder. If true, each run is saved to a unique folder identified by the time it ran
+    retention: RetentionPolicy
+        When runs are tracked with `track_all`, the old runs are removed after every run to meet this policy, see
+        `collect_garbage`. The runs pinned with `pin_run` are always kept
+    deduplicate: bool
+        A flag that specifies whether the artifacts are stored only once across runs. After every run, each product is
+        stored in a `.blobs` folder inside `location` named after the hash of its contents, and replaced by a hard link
+        to it, so the byte-identical products written by every run take up disk space only once. The products are
+        still found at the paths returned by `get_local_artifact_path`, see `cf_pipelines.base.store.BlobStore`
     current_run_id: str
         A unique identifier for a given run, this value changes depending on the value of `track_all`.
+    untouched_inputs: dict
+        For the functions registered with `lazy=True`, the products they needed but never used in their last run
+    plan: ExecutionPlan
+        The plan the pipeline runs against, compiled by `compile` and discarded whenever a function is registered
+    run_metrics: RunMetrics
+        The metrics of each step in the last run, also saved as `metrics.json` in the run folder, see
+        `cf_pipelines.base.metrics`
+    executor: str
+        How the steps are run: "serial" (the default) builds a Ploomber DAG and runs one step at a time, while
+        "threads" and "processes" run every step as soon as the steps it depends upon are done
+    max_workers: int
+        The maximum number of steps that run at the same time when `executor` is "threads" or "processes"
+    in_memory: bool
+        A flag that specifies whether the products are handed straight from one step to the next in memory, instead
+        of being written to disk and read back. Only the products of the steps registered with `persist=True` are
+        written to disk, unless `background_persist` is set. With the "processes" executor, the products are handed
+        from one worker process to the next through shared memory, see `cf_pipelines.base.shared.SharedArtifacts`.
+        Each product is released as soon as the last step that needs it is done. The steps that need a product share
+        the same object, even when they run at the same time on threads, so they must not modify it
+    background_persist: bool
+        When running `in_memory`, write every product to disk in a background thread. Only the steps that need the
+        product wait for it to be written
+    memory_budget: int
+        When running `in_memory` with threads, the maximum estimated size, in bytes, of the products held in memory.
+        Past it, the oldest products are spilled to disk and read back from there by the steps that need them
+    cache: bool
+        A flag that specifies whether the products of each step are cached across runs. A step is skipped, and its
+        cached products are linked into the current run folder, when its source code, the products it needs and the
+        extra arguments or environment variables it uses have not changed. The partitions of mapped steps are cached one
+        by one, see `map_step`
+    async_concurrency: int
+        The maximum number of functions defined with `async def` awaited at the same time, unlimited by default. These
+        functions are awaited concurrently on a single event loop, without taking up any of the `max_workers`
+    resources: ResourceBudget
+        The cpus and memory of the machine shared by the steps that run at the same time. A step only starts when the
+        resources it declares, see `step`, are free, so the memory-hungry steps are not started together. When set on a
+        "serial" pipeline, the steps are run using threads
     """
 
     def __init__(
@@ -54,17 +160,50 @@ class Pipeline:
         serializer: Callable = None,
         unserializer: Callable = None,
         track_all: bool = False,
+        memory_map: bool = False,
+        executor: str = "serial",
+        max_workers: Optional[int] = None,
+        in_memory: bool = False,
+        background_persist: bool = False,
+        cache: bool = False,
+        async_concurrency: Optional[int] = None,
+        compression: Optional[str] = None,
+        compression_level: Optional[int] = None,
+        retention: Optional[RetentionPolicy] = None,
+        deduplicate: bool = False,
+        memory_budget: Optional[int] = None,
+        resources: Optional[ResourceBudget] = None,
     ):
+        if executor != "serial" and executor not in CONCURRENT_EXECUTORS:
+            raise ValueError(
+                f"Unknown executor {executor}, it must be one of {['serial'] + sorted(CONCURRENT_EXECUTORS)}"
+            )
+
         self.name = name
         self.location = Path(location)
         self.product_lineages: Dict[str, ProductLineage] = {}
         self.function_details: Dict[str, FunctionDetails] = {}
         self.extra_arguments = extra_args or dict()
         self.dag_clients = dag_clients or dict()
-        self.serializer = serializer or serializer_pickle
-        self.unserializer = unserializer or unserializer_pickle
+        if serializer is None and compression is not None:
+            serializer = compressed_serializer(compression, compression_level)
+        self.serializer = serializer or serialize_artifact
+        self.unserializer = unserializer or (unserialize_memory_mapped if memory_map else unserialize_artifact)
         self.track_all = track_all
+        self.retention = retention
+        self.blob_store = BlobStore(Path(self.location, ".blobs")) if deduplicate else None
         self.current_run_id = "default"
+        self.untouched_inputs: Dict[str, Set[str]] = {}
+        self.run_metrics: Optional[RunMetrics] = None
+        self.plan: Optional[ExecutionPlan] = None
+        self.executor = executor
+        self.max_workers = max_workers
+        self.in_memory = in_memory
+        self.background_persist = background_persist
+        self.memory_budget = memory_budget
+        self.cache = cache
+        self.async_concurrency = async_concurrency
+        self.resources = resources
         self.before_function: Optional[Callable[[str], None]] = None
         self.after_function: Optional[Callable[[str, Dict[str, Any], float], None]] = None
         self.exception_handler: Optional[Callable[[str, Exception, float], None]] = None
@@ -87,108 +226,312 @@ class Pipeline:
         function_details = self.function_details.pop(function_name)
         for product in function_details.produces:
             self.product_lineages.pop(product)
+        self.plan = None
 
-    def step(self, group: str) -> Callable:
+    def step(
+        self,
+        group: str,
+        persist: bool = False,
+        lazy: bool = False,
+        produces: Optional[List[str]] = None,
+        cpus: float = 1.0,
+        memory: int = 0,
+    ) -> Callable:
         """
         A decorator that registers the decorated function into a Ploomber pipeline
 
+        A function that yields its products instead of returning them streams them: each chunk is appended to its
+        product's file as it arrives, as an uncompressed pickle whatever the pipeline's `serializer` and
+        `compression`. Its products can't end with the extension of a registered format or codec, e.g. ".parquet"
+
+        :param group: The group the pipeline belongs to
+        :param persist: Whether the products of the function are written to disk when the pipeline runs `in_memory`
+        :param lazy: Whether the function receives `LazyArtifact` proxies that only read each product it needs when
+        first used. The products that were never used are recorded in `untouched_inputs`
+        :param produces: The file names of the products the function returns, e.g. `["model.pkl"]`. When set, the
+        source code of the function is not parsed to find them
+        :param cpus: The number of cpus the function takes up while it runs, counted against the pipeline's `resources`
+        :param memory: The memory, in bytes, the function takes up while it runs, counted against the pipeline's
+        `resources`
+        :return:
+        """
+        return lambda original_fn: self.register_step(
+            original_fn, group, persist, lazy, produces, cpus=cpus, memory=memory
+        )
+
+    def map_step(
+        self,
+        group: str,
+        over: str,
+        partition_by: Optional[str] = None,
+        persist: bool = False,
+        max_workers: Optional[int] = None,
+        produces: Optional[List[str]] = None,
+        cpus: float = 1.0,
+        memory: int = 0,
+    ) -> Callable:
+        """
+        A decorator that registers the decorated function as a mapped step: a step applied to each partition of the
+        artifact `over`, instead of to the whole artifact. The partitions are processed in parallel, and the products
+        generated for each one are stored in their own file. When the pipeline's `cache` is set, they are also cached,
+        so only the partitions that changed since a previous run (of any run id) are computed again.
+
+        Each product of a mapped step is a `PartitionedArtifact`, a read-only mapping of the partition keys to the
+        values generated for them, stored in a folder named after the product's file name. A mapped step can be
+        mapped over the products of another mapped step, and any regular step that needs them reduces the partitions.
+        When called directly, outside of a run, a mapped step returns a dictionary of the partition keys to the values
+        generated for them for each of its products, and writes nothing to disk.
+
         :param group: The group the pipeline belongs to
+        :param over: The name of the artifact whose partitions the function receives, either a mapping of partition
+        keys to partitions or, when `partition_by` is set, a data frame
+        :param partition_by: The column a data frame is split by, each partition is keyed by the column's value
+        :param persist: Whether the products of the function are written to disk when the pipeline runs `in_memory`.
+        The partitions are always written to disk
+        :param max_workers: The maximum number of partitions processed at the same time, defaults to the pipeline's
+        `max_workers`
+        :param produces: The file names of the products the function returns for each partition. When set, the source
+        code of the function is not parsed to find them
+        :param cpus: The number of cpus the function takes up while it processes all the partitions, see `step`
+        :param memory: The memory, in bytes, the function takes up while it processes all the partitions, see `step`
         :return:
         """
+        partitions = PartitionSpec(over, partition_by, max_workers)
+        return lambda original_fn: self.register_step(
+            original_fn, group, persist, False, produces, partitions, cpus, memory
+        )
+
+    def register_step(
+        self,
+        original_fn: Callable,
+        group: str,
+        persist: bool = False,
+        lazy: bool = False,
+        produces: Optional[List[str]] = None,
+        partitions: Optional[PartitionSpec] = None,
+        cpus: float = 1.0,
+        memory: int = 0,
+    ) -> Callable:
+        """
+        Registers a function into the pipeline, see `step` and `map_step`
 
-        def _wrapper(original_fn: Callable):
-            original_name = original_fn.__name__
+        :return: The function wrapped so it can be run by Ploomber or by the pipeline's scheduler
+        """
+        original_name = original_fn.__name__
+
+        if original_name in self.function_details:
+            self.meta_logger.warning(f"The function {original_name} was already in {self.name}, replacing it")
+            self.clear_function_data(original_name)
+
+        def decorated_function_replacement(upstream=None, **kwargs):
+            # Work is done here to understand from where the function was called.
+            # `upstream` is set when the function is called by Plomber, but when the user executes the function
+            # directly, its value is none and `kwargs` contains the arguments to the function.
 
-            if original_name in self.function_details:
-                self.meta_logger.warning(f"The function {original_name} was already in {self.name}, replacing it")
-                self.clear_function_data(original_name)
+            # When `upstream` is equals to `{"kwargs": None}` means that the function has been by Ploomber otherwise,
+            if kwargs == {"kwargs": None}:
+                called_from_ploomber = True
+                kwargs.pop("kwargs")
+            else:
+                called_from_ploomber = False
+
+            if called_from_ploomber:
+                # Thanks to the serialisers Upstream now contains the read data in a nested dictionary where
+                # the first level contains the name of the function that produced the product, second level contains
+                # the name of the product and the value is the data for that product.
+                # However the scientist's function expects the data at the first level, this bit of code flattens the
+                # dictionary. Where each product comes from was already resolved by `compile`
+                kwargs = {}
+                for binding in self.compile().inputs[original_name]:
+                    if binding.produced_by is not None:
+                        kwargs[binding.name] = upstream[binding.produced_by][binding.name]
+                    elif binding.environment_variable in os.environ:
+                        kwargs[binding.name] = os.environ[binding.environment_variable]
+                    elif binding.name in self.extra_arguments:
+                        kwargs[binding.name] = self.extra_arguments[binding.name]
+                    else:
+                        raise KeyError(
+                            f"The product {binding.name} requested by {original_name} is "
+                            "not generated by another step, "
+                            "nor does it exist as an environment variable,"
+                            "nor is it passed as an extra argument to the pipeline."
+                        )
 
-            def decorated_function_replacement(upstream=None, **kwargs):
-                # Work is done here to understand from where the function was called.
-                # `upstream` is set when the function is called by Plomber, but when the user executes the function
-                # directly, its value is none and `kwargs` contains the arguments to the function.
+                # When called from Ploomber it is also necessary to call the `after_function`
+                if self.before_function:
+                    self.before_function(original_name)
 
-                # When `upstream` is equals to `{"kwargs": None}` means that the function has been by Ploomber otherwise,
-                if kwargs == {"kwargs": None}:
-                    called_from_ploomber = True
-                    kwargs.pop("kwargs")
+            start_time = time.time()
+            started_at = time.monotonic()
+            # Execution of the actual function
+            try:
+                if partitions and called_from_ploomber:
+                    returns = map_partitions(self, original_name, original_fn, kwargs)
+                elif partitions:
+                    # Called directly, outside of a run, so nothing is written to the run folder or the cache
+                    returns = apply_to_partitions(self, original_name, original_fn, kwargs)
                 else:
-                    called_from_ploomber = False
-
-                if called_from_ploomber:
-                    # Thanks to the serialisers Upstream now contains the read data in a nested dictionary where
-                    # the first level contains the name of the function that produced the product, second level contains
-                    # the name of the product and the value is the data for that product.
-                    # However the scientist's function expects the data at the first level, this bit of code flattens the
-                    # dictionary
-                    kwargs = {}
-                    current_details = self.function_details[original_name]
-                    for needed_artifact in current_details.needs:
-                        try:
-                            lineage = self.product_lineages[needed_artifact]
-                            kwargs[needed_artifact] = upstream[lineage.produced_by][needed_artifact]
-                        except KeyError:
-                            # The required artifact was not available from any other source, try getting it from the
-                            # extra_arguments passed on to the pipeline
-
-                            environment_variable = f"CF_{needed_artifact.upper()}"
-                            if environment_variable in os.environ:
-                                kwargs[needed_artifact] = os.environ[environment_variable]
-                            elif needed_artifact in self.extra_arguments:
-                                kwargs[needed_artifact] = self.extra_arguments[needed_artifact]
-                            else:
-                                raise KeyError(
-                                    f"The product {needed_artifact} requested by {original_name} is "
-                                    "not generated by another step, "
-                                    "nor does it exist as an environment variable,"
-                                    "nor is it passed as an extra argument to the pipeline."
-                                )
-
-                    # When called from Ploomber it is also necessary to call the `after_function`
-                    if self.before_function:
-                        self.before_function(original_name)
-
-                start_time = time.time()
-                # Execution of the actual function
-                try:
                     returns = original_fn(**kwargs)
-                except Exception as exception:
-                    end_time = time.time()
-                    if self.exception_handler:
-                        self.exception_handler(original_name, exception, end_time - start_time)
-                    raise exception
-
+            except Exception as exception:
                 end_time = time.time()
+                if self.exception_handler:
+                    self.exception_handler(original_name, exception, end_time - start_time)
+                raise exception
 
-                # Results contains a mapping "filename.extension": value, we must remove the file extension
-                returns = {remove_extension(filename): value for filename, value in returns.items()}
+            if inspect.isgenerator(returns):
+                # The function streams its products, the rest of the work is done as the chunks are consumed
+                return self.stream_chunks(original_name, returns, start_time, called_from_ploomber)
+            if inspect.iscoroutine(returns):
+                # The function is asynchronous, the rest of the work is done once it is awaited
+                return self.await_returns(original_name, returns, start_time, started_at, called_from_ploomber)
 
-                if called_from_ploomber:
-                    if self.after_function:
-                        self.after_function(original_name, returns, end_time - start_time)
+            return self.finish_call(original_name, returns, start_time, started_at, called_from_ploomber)
 
-                return returns
+        if cpus < 0 or memory < 0:
+            raise ValueError(f"The function {original_name} can't take up a negative amount of cpus or memory")
+        if inspect.isasyncgenfunction(original_fn):
+            raise ValueError(f"The function {original_name} is an asynchronous generator, which is not supported")
+        if partitions and (inspect.isgeneratorfunction(original_fn) or inspect.iscoroutinefunction(original_fn)):
+            raise ValueError(f"The mapped function {original_name} must return its products, not stream or await them")
 
-            # Get information about what the original function generates and what it needs
-            returnable_products = get_return_keys_from_function(original_fn)
-            function_args = set(inspect.getfullargspec(original_fn).kwonlyargs)
+        # Get information about what the original function generates and what it needs
+        returnable_products = list(produces) if produces is not None else get_return_keys_from_function(original_fn)
+        function_args = set(inspect.getfullargspec(original_fn).kwonlyargs)
+        if partitions and partitions.over not in function_args:
+            raise ValueError(f"The mapped function {original_name} does not need {partitions.over}")
+        if inspect.isgeneratorfunction(original_fn):
+            for product_filename in returnable_products:
+                if get_format(Path(product_filename)) or get_codec(Path(product_filename)):
+                    raise ValueError(
+                        f"The streaming function {original_name} can't produce {product_filename}, the chunks it "
+                        "yields are always stored as uncompressed pickles"
+                    )
 
-            wrap_preserving_signature(decorated_function_replacement, original_fn)
+        wrap_preserving_signature(decorated_function_replacement, original_fn)
 
-            # Fill in the metadata of the pipeline
-            self.add_product_lineages(original_name, returnable_products, group)
-            self.add_function_details(
-                decorated_function_replacement, function_args, original_name, returnable_products, group
-            )
+        # Fill in the metadata of the pipeline
+        self.add_product_lineages(original_name, returnable_products, group, partitions is not None)
+        self.add_function_details(
+            decorated_function_replacement,
+            function_args,
+            original_name,
+            returnable_products,
+            group,
+            persist,
+            lazy,
+            inspect.isgeneratorfunction(original_fn),
+            inspect.iscoroutinefunction(original_fn),
+            partitions,
+            cpus,
+            memory,
+        )
+
+        return decorated_function_replacement
+
+    def finish_call(
+        self,
+        function_name: str,
+        returns: Dict[str, Any],
+        start_time: float,
+        started_at: float,
+        called_from_ploomber: bool,
+    ) -> Dict[str, Any]:
+        """
+        Removes the file extension from the keys of the products returned by a function and, when called from
+        Ploomber, records its metrics and calls the `after_function`
+
+        :param function_name: The name of the function
+        :param returns: The products returned by the function
+        :param start_time: When the function was called, as given by `time.time`
+        :param started_at: When the function was called, as given by `time.monotonic`
+        :param called_from_ploomber: Whether the `after_function` should be called
+        :return: The products
+        """
+        end_time = time.time()
+
+        # Results contains a mapping "filename.extension": value, we must remove the file extension
+        returns = {remove_extension(filename): value for filename, value in returns.items()}
+
+        if called_from_ploomber:
+            if self.run_metrics:
+                # Ploomber reads and writes the products itself, so only the time spent computing is known
+                ended_at = time.monotonic()
+                self.run_metrics.record(
+                    StepMetrics(
+                        function_name, started_at=started_at, ended_at=ended_at, compute_time=ended_at - started_at
+                    )
+                )
+            if self.after_function:
+                self.after_function(function_name, returns, end_time - start_time)
+
+        return returns
 
-            return decorated_function_replacement
+    async def await_returns(
+        self,
+        function_name: str,
+        returns: Awaitable[Dict[str, Any]],
+        start_time: float,
+        started_at: float,
+        called_from_ploomber: bool,
+    ) -> Dict[str, Any]:
+        """
+        Awaits the coroutine returned by a function defined with `async def`, and then finishes the call like
+        `finish_call` does. The exception handler is called if the coroutine fails.
+
+        :param function_name: The name of the function
+        :param returns: The coroutine returned by the function
+        :param start_time: When the function was called, as given by `time.time`
+        :param started_at: When the function was called, as given by `time.monotonic`
+        :param called_from_ploomber: Whether the `after_function` should be called
+        :return: The products
+        """
+        try:
+            products = await returns
+        except Exception as exception:
+            end_time = time.time()
+            if self.exception_handler:
+                self.exception_handler(function_name, exception, end_time - start_time)
+            raise exception
+        return self.finish_call(function_name, products, start_time, started_at, called_from_ploomber)
+
+    def stream_chunks(
+        self, function_name: str, chunks: Iterator[Dict[str, Any]], start_time: float, called_from_ploomber: bool
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Passes on the chunks yielded by a streaming function, removing the file extension from their keys. The
+        exception handler and the `after_function` are called once the function is done, the latter receives the
+        function's `ChunkedArtifact` products.
 
-        return _wrapper
+        :param function_name: The name of the function
+        :param chunks: The generator returned by the function
+        :param start_time: When the function was called
+        :param called_from_ploomber: Whether the `after_function` should be called
+        :return:
+        """
+        try:
+            for chunk in chunks:
+                yield {remove_extension(filename): value for filename, value in chunk.items()}
+        except Exception as exception:
+            end_time = time.time()
+            if self.exception_handler:
+                self.exception_handler(function_name, exception, end_time - start_time)
+            raise exception
+
+        end_time = time.time()
+        if called_from_ploomber and self.after_function:
+            returns = {
+                product_name: ChunkedArtifact(self.get_local_artifact_path(product_name))
+                for product_name in self.function_details[function_name].produces
+            }
+            self.after_function(function_name, returns, end_time - start_time)
 
-    def add_product_lineages(self, original_name: str, returnable_products: List[str], group: str) -> None:
+    def add_product_lineages(
+        self, original_name: str, returnable_products: List[str], group: str, partitioned: bool = False
+    ) -> None:
+        self.plan = None
         for product_filename in returnable_products:
             self.product_lineages[remove_extension(product_filename)] = ProductLineage(
-                group, product_filename, original_name
+                group, product_filename, original_name, partitioned
             )
 
     def add_function_details(
@@ -198,12 +541,30 @@ class Pipeline:
         original_name: str,
         returnable_products: List[str],
         group: str,
+        persist: bool = False,
+        lazy: bool = False,
+        streams: bool = False,
+        asynchronous: bool = False,
+        partitions: Optional[PartitionSpec] = None,
+        cpus: float = 1.0,
+        memory: int = 0,
     ):
         returnable_arguments = {remove_extension(product) for product in returnable_products}
         function_details = FunctionDetails(
-            replacement_fn, produces=returnable_arguments, needs=function_args, group=group
+            replacement_fn,
+            produces=returnable_arguments,
+            needs=function_args,
+            group=group,
+            persist=persist,
+            lazy=lazy,
+            streams=streams,
+            asynchronous=asynchronous,
+            partitions=partitions,
+            cpus=cpus,
+            memory=memory,
         )
         self.function_details[original_name] = function_details
+        self.plan = None
 
     def get_local_artifact_path(self, product_name: str) -> Path:
         """
@@ -215,43 +576,118 @@ class Pipeline:
         product_lineage = self.product_lineages[product_name]
         return Path(self.location, self.current_run_id, product_lineage.group, product_lineage.file_name)
 
+    def read_artifact(self, product_name: str) -> Any:
+        """
+        Reads a product from its local path using the pipeline's unserializer. The products of streaming functions are
+        not read, a `ChunkedArtifact` that iterates over their chunks is returned instead, and neither are the products
+        of mapped functions, a `PartitionedArtifact` that reads each partition when accessed is returned instead.
+
+        :param product_name:
+        :return: The value of the product
+        """
+        path = self.get_local_artifact_path(product_name)
+        if self.function_details[self.product_lineages[product_name].produced_by].streams:
+            return ChunkedArtifact(path)
+        if self.product_lineages[product_name].partitioned:
+            return PartitionedArtifact(path, self.unserializer)
+        return self.unserializer(as_product(path))
+
+    def write_artifact(self, product_name: str, value: Any) -> None:
+        """
+        Writes a product to its local path using the pipeline's serializer, and backs it up if there is a `File` client
+        in `dag_clients`
+
+        :param product_name:
+        :param value: The value of the product
+        """
+        path = self.get_local_artifact_path(product_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            # The existing file may be hard linked from the step cache or memory-mapped, so it can't be overwritten
+            path.unlink()
+        self.serializer(value, as_product(path))
+        self.upload_artifact(path)
+
+    def upload_artifact(self, path: Path) -> None:
+        """
+        Backs up a file written to a run folder if there is a `File` client in `dag_clients`
+
+        :param path: The local path of the file
+        """
+        if not self.dag_clients:
+            # Nothing to back up, and Ploomber does not need to be imported
+            return
+        client = self.dag_clients.get(type(as_product(path)))
+        if client:
+            client.upload(path)
+
+    def get_argument_value(self, argument_name: str) -> Any:
+        """
+        Gets the value of an argument that is not generated by any step, either from an environment variable named
+        `CF_<ARGUMENT NAME>` or from the extra arguments passed on to the pipeline, in that order of precedence
+
+        :param argument_name:
+        :return: The value of the argument
+        """
+        environment_variable = f"CF_{argument_name.upper()}"
+        if environment_variable in os.environ:
+            return os.environ[environment_variable]
+        return self.extra_arguments[argument_name]
+
     def solve_dependencies(self) -> Dict[str, Set[str]]:
         """
-        This method tries to solve the graph dependencies based on what each function needs
+        This method tries to solve the graph dependencies based on what each function needs, see `compile`
 
         :return: A dictionary whose keys are the names of the registered functions and its value is a set of
         the function names it depends upon
         """
-        dependencies = defaultdict(set)
-        for function_name, function_details in self.function_details.items():
-            for needed_product in function_details.needs:
-                try:
-                    product_lineage = self.product_lineages[needed_product]
-                    dependencies[function_name].add(product_lineage.produced_by)
-                except KeyError:
-                    # The argument needed by the function is not available as a product from another function, so
-                    # we need to check in the extra arguments passed by the client.
-                    environment_variable = f"CF_{needed_product.upper()}"
-                    if (needed_product not in self.extra_arguments) and (environment_variable not in os.environ):
-                        raise KeyError(
-                            f"The product {needed_product} requested by {function_name} is not generated by another step, "
-                            "nor does it exist as an environment variable,"
-                            "nor is it passed as an extra argument to the pipeline."
-                        )
-        return dict(dependencies)
+        return {
+            function_name: set(dependencies)
+            for function_name, dependencies in self.compile().dependencies.items()
+            if dependencies
+        }
+
+    def get_required_functions(self, targets: List[str]) -> Set[str]:
+        """
+        Finds the minimal set of functions that need to run to generate the `targets` products: the functions that
+        produce them and all the functions these depend upon
 
-    def create_ploomber_callables(self, dag) -> Dict[str, PythonCallable]:
+        :param targets: The names of the products, with or without their extension
+        :return: The names of the functions
+        """
+        dependencies = self.compile().dependencies
+        pending = []
+        for target in targets:
+            product_name = remove_extension(target)
+            if product_name not in self.product_lineages:
+                raise KeyError(f"The product {target} is not generated by any step in {self.name}")
+            pending.append(self.product_lineages[product_name].produced_by)
+
+        required_functions = set()
+        while pending:
+            function_name = pending.pop()
+            if function_name not in required_functions:
+                required_functions.add(function_name)
+                pending.extend(dependencies[function_name])
+        return required_functions
+
+    def create_ploomber_callables(self, dag, functions: Optional[Set[str]] = None) -> Dict[str, "PythonCallable"]:
         """
         Creates the corresponding `PythonCallables` for each one of the functions in the `Pipeline`
 
         :param dag: The DAG the task should be added to
+        :param functions: When set, only the callables for these functions are created
         :return: A dictionary where the keys are the function names and the values are
         their corresponding `PythonCallables`
         """
+        from ploomber.tasks import PythonCallable
+
         callables = {}
         for function_name, function_details in self.function_details.items():
+            if functions is not None and function_name not in functions:
+                continue
             products = {
-                product_name: File(self.get_local_artifact_path(product_name))
+                product_name: as_product(self.get_local_artifact_path(product_name))
                 for product_name in function_details.produces
             }
 
@@ -264,31 +700,81 @@ class Pipeline:
                 # directly. This value will be then passed on to the function when called via Ploomber but not when
                 # the function is called directly.
                 params={"kwargs": None},
-                serializer=self.serializer,
+                serializer=partial(self.serialize_replacing, [Path(str(product)) for product in products.values()]),
                 unserializer=self.unserializer,
             )
             callables[function_name] = callable_function
         return callables
 
-    def make_dag(self) -> DAG:
+    def serialize_replacing(self, paths: List[Path], value: Any, product: Any) -> None:
+        """
+        Calls the pipeline's serializer for Ploomber, removing the files it writes to first. Ploomber calls the
+        serializer directly, and a serializer may write to an existing file in place, which would also change the blob
+        in the `BlobStore` or the entry in the step cache the file is hard linked to
+
+        :param paths: The paths of the products written by the serializer
+        :param value: The value returned by the function
+        :param product: The Ploomber product to write it to
+        """
+        for path in paths:
+            if path.is_file():
+                path.unlink()
+        self.serializer(value, product)
+
+    def make_dag(self, functions: Optional[Set[str]] = None) -> "DAG":
         """
         Build the Ploomber DAG from the dependencies added vía the `step` decorator.
 
+        :param functions: When set, the DAG only contains these functions, which must include all their dependencies
         :return: A fully generated Ploomber dag
         """
+        from ploomber import DAG
+        from ploomber.executors import Serial
+
         executor = Serial(build_in_subprocess=False)
         dag = DAG(executor=executor, name=self.name, clients=self.dag_clients)
 
         # Create ploomber's `PythonCallables` for the functions in the pipeliene
-        callables = self.create_ploomber_callables(dag)
+        callables = self.create_ploomber_callables(dag, functions)
 
         # Create Ploomber dependencies
-        solved_dependencies = self.solve_dependencies()
-        for function_name, dependencies in solved_dependencies.items():
+        for function_name, dependencies in self.compile().dependencies.items():
+            if function_name not in callables:
+                continue
             for dependency in dependencies:
                 callables[dependency] >> callables[function_name]
         return dag
 
+    def compile(self) -> ExecutionPlan:
+        """
+        Resolves, once, where each function gets its inputs from and the order the functions run in. The plan is kept
+        and reused by every run until a function is registered or removed.
+
+        :return: The compiled plan
+        :raises KeyError: When a function needs a product that is not generated by any step, nor is available as an
+        environment variable or an extra argument
+        :raises ValueError: When some functions depend upon each other in a cycle
+        """
+        if self.plan is None:
+            self.plan = compile_plan(self)
+        return self.plan
+
+    def as_function(self, inputs: List[str], outputs: List[str]) -> CompiledFunction:
+        """
+        Compiles the steps needed to generate some products from some inputs into a function that runs them in-process,
+        e.g. to reuse the feature engineering steps for online scoring. The function is called with the inputs as
+        Python objects and returns the outputs, without reading or writing anything to disk, without building a DAG
+        and without resolving the dependencies between the steps again. Many requests can be run in a single call
+        with `CompiledFunction.call_batch`. The extra arguments and environment variables the steps need are read once,
+        here, and the hooks of the pipeline are not called, see `cf_pipelines.base.serving`
+
+        :param inputs: The names of the values the function is called with: products, whose steps are then not run,
+        or arguments the steps need, such as extra arguments
+        :param outputs: The names of the products the function returns
+        :return:
+        """
+        return compile_function(self, inputs, outputs)
+
     def generate_run_id(self) -> str:
         """
         Generates a new run identifier for a DAG run (and sets it to the value)
@@ -296,12 +782,321 @@ class Pipeline:
         :return: The generated run id
         """
         if self.track_all:
-            self.current_run_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
+            self.current_run_id = datetime.now().strftime(RUN_ID_FORMAT)
         else:
             self.current_run_id = "default"
         return self.current_run_id
 
-    def run(self) -> None:
+    def run(self, parallel: Optional[int] = None, targets: Optional[List[str]] = None) -> None:
+        """
+        Runs the steps in the pipeline
+
+        :param parallel: The maximum number of steps to run at the same time, overrides `max_workers`. When set on a
+        "serial" pipeline, the steps are run using threads
+        :param targets: When set, only the steps needed to generate these products are run. The steps whose products
+        are already up to date on disk for the current run id are not run again
+        """
+        self.compile()
         self.generate_run_id()
-        dag = self.make_dag()
-        dag.build()
+        self.run_metrics = RunMetrics(self.name, self.current_run_id)
+        executor = self.executor
+        max_workers = parallel or self.max_workers
+        uses_special_steps = any(
+            details.lazy or details.writes_own_products or details.asynchronous
+            for details in self.function_details.values()
+        )
+        if self.resources and executor == "serial":
+            # Ploomber doesn't know about the resources each step takes up, the scheduler keeps the steps within them
+            executor = "threads"
+        elif executor == "serial" and (parallel is not None or self.in_memory or self.cache or uses_special_steps):
+            executor = "threads"
+            # Ploomber can't keep products in memory, skip cached steps, read products lazily, stream them, split them
+            # into partitions nor await asynchronous steps, a single thread is used instead to keep running one
+            # synchronous step at a time
+            max_workers = max_workers or 1
+
+        try:
+            if executor == "serial":
+                # Ploomber skips by itself the tasks that are up to date
+                dag = self.make_dag(self.get_required_functions(targets) if targets else None)
+                dag.build()
+                for step_metrics in self.run_metrics.steps.values():
+                    step_metrics.product_sizes = self.get_product_sizes(step_metrics.function_name)
+            else:
+                StepScheduler(self, executor, max_workers).run(targets)
+            if self.blob_store:
+                self.blob_store.add_all(self.get_local_artifact_path(product) for product in self.product_lineages)
+        finally:
+            self.run_metrics.save(self.location)
+            upload_errors = self.flush_uploads()
+            if self.track_all and self.retention:
+                self.collect_garbage()
+        if upload_errors:
+            raise upload_errors[0]
+
+    def list_runs(self) -> List[str]:
+        """
+        Lists the runs tracked with `track_all` stored in the pipeline's location
+
+        :return: The run identifiers, from the oldest to the most recent
+        """
+        return list_runs(self.location)
+
+    def pin_run(self, run_id: Optional[str] = None) -> None:
+        """
+        Pins a run, so it is never removed by `collect_garbage`
+
+        :param run_id: The identifier of the run, defaults to the current run id
+        """
+        run_folder = Path(self.location, run_id or self.current_run_id)
+        if not run_folder.is_dir():
+            raise KeyError(f"There is no run {run_folder.name} in {self.location}")
+        Path(run_folder, PIN_FILE_NAME).touch()
+
+    def unpin_run(self, run_id: str) -> None:
+        Path(self.location, run_id, PIN_FILE_NAME).unlink(missing_ok=True)
+
+    def collect_garbage(self, retention: Optional[RetentionPolicy] = None) -> List[str]:
+        """
+        Removes the runs tracked with `track_all` that do not meet a retention policy, starting with the oldest ones.
+        The current run and the pinned runs are never removed, and the products stored in the step cache are kept
+        even when the runs linking to them are removed, unless the cache entries have to be removed to meet the
+        policy's `max_size`
+
+        :param retention: The policy to meet, defaults to the pipeline's `retention`
+        :return: The identifiers of the removed runs
+        """
+        retention = retention or self.retention
+        if retention is None:
+            raise ValueError("A retention policy is needed to collect garbage")
+        return collect_garbage(self.location, retention, keep={self.current_run_id}, store=self.blob_store)
+
+    def run_sweep(self, param_grid: Dict[str, List[Any]], parallel: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Runs the pipeline once for every combination of the values of some extra arguments, such as hyperparameters.
+        The steps whose products do not depend on these arguments (see `plan.get_dependent_functions`) run only once,
+        for the first combination, and their products are linked into the folders of the other runs, so only the steps
+        that depend on the arguments run for every combination. Each combination gets its own run id, whether runs are
+        tracked with `track_all` or not, and the steps always run on the pipeline's scheduler
+
+        :param param_grid: The names of the extra arguments mapped to the values each one of them takes, e.g.
+        `{"alpha": [0.1, 1.0], "window": [7, 30]}`
+        :param parallel: The number of combinations run at the same time, in forked processes. The `after_function`
+        and the other hooks are then called in those processes, and their steps run on threads
+        :return: The run ids mapped to the combinations of arguments they ran with, in the order they were generated
+        """
+        combinations = sweeps.expand_grid(param_grid)
+        run_ids = sweeps.generate_run_ids(len(combinations))
+        if not combinations:
+            return {}
+
+        extra_arguments = self.extra_arguments
+        self.extra_arguments = {**extra_arguments, **combinations[0]}
+        try:
+            plan = self.compile()
+            dependent = get_dependent_functions(plan, set(param_grid))
+            independent = set(plan.order) - dependent
+            shared_products = {
+                binding.name
+                for function_name in dependent
+                for binding in plan.inputs[function_name]
+                if binding.produced_by in independent
+            }
+
+            self.current_run_id = run_ids[0]
+            # The products the dependent steps need are written to disk, so every run can read them
+            self.run_functions(
+                independent, persist={self.product_lineages[product].produced_by for product in shared_products}
+            )
+            self.link_products(
+                [product for product, lineage in self.product_lineages.items() if lineage.produced_by in independent],
+                run_ids[0],
+                run_ids[1:],
+            )
+
+            if parallel and parallel > 1:
+                sweeps._sweeping_pipeline = self
+                import_ploomber()
+                with ProcessPoolExecutor(parallel, mp_context=multiprocessing.get_context("fork")) as pool:
+                    futures = [
+                        pool.submit(sweeps._run_combination, run_id, combination, dependent, shared_products)
+                        for run_id, combination in zip(run_ids, combinations)
+                    ]
+                for future in futures:
+                    future.result()
+                self.current_run_id = run_ids[-1]
+            else:
+                for run_id, combination in zip(run_ids, combinations):
+                    self.run_combination(run_id, combination, dependent, shared_products)
+        finally:
+            sweeps._sweeping_pipeline = None
+            self.extra_arguments = extra_arguments
+            upload_errors = self.flush_uploads()
+            if self.track_all and self.retention:
+                collect_garbage(self.location, self.retention, keep=set(run_ids), store=self.blob_store)
+        if upload_errors:
+            raise upload_errors[0]
+        return dict(zip(run_ids, combinations))
+
+    def run_combination(
+        self,
+        run_id: str,
+        combination: Dict[str, Any],
+        functions: Set[str],
+        on_disk: AbstractSet[str] = frozenset(),
+        executor: Optional[str] = None,
+    ) -> None:
+        """
+        Runs some of the steps of the pipeline for a combination of extra arguments of a sweep, see `run_sweep`
+
+        :param run_id: The run id the products are stored under
+        :param combination: The extra arguments that take different values in each run of the sweep
+        :param functions: The steps to run
+        :param on_disk: The products generated by other steps, which are read from the run folder
+        :param executor: Overrides the pipeline's `executor`
+        """
+        self.current_run_id = run_id
+        self.extra_arguments = {**self.extra_arguments, **combination}
+        self.run_functions(functions, executor=executor, on_disk=on_disk)
+
+    def run_functions(
+        self,
+        functions: Set[str],
+        executor: Optional[str] = None,
+        on_disk: AbstractSet[str] = frozenset(),
+        persist: AbstractSet[str] = frozenset(),
+    ) -> None:
+        """
+        Runs some of the steps of the pipeline, under the current run id, on the pipeline's scheduler
+
+        :param functions: The steps to run, the products they need from other steps must be on disk already
+        :param executor: Overrides the pipeline's `executor`, "serial" pipelines run on a single thread
+        :param on_disk: When running in memory, the products generated by other steps, read from disk
+        :param persist: When running in memory, the steps whose products are also written to disk
+        """
+        executor = executor or self.executor
+        max_workers = self.max_workers
+        if executor == "serial":
+            # With a `resources` budget, the scheduler decides how many steps run at the same time
+            executor, max_workers = "threads", max_workers or (None if self.resources else 1)
+        if self.run_metrics is None or self.run_metrics.run_id != self.current_run_id:
+            self.run_metrics = RunMetrics(self.name, self.current_run_id)
+        try:
+            StepScheduler(self, executor, max_workers).run(functions=functions, on_disk=on_disk, persist=persist)
+            if self.blob_store:
+                self.blob_store.add_all(
+                    self.get_local_artifact_path(product)
+                    for product, lineage in self.product_lineages.items()
+                    if lineage.produced_by in functions
+                )
+        finally:
+            self.run_metrics.save(self.location)
+
+    def link_products(self, product_names: List[str], source_run_id: str, run_ids: List[str]) -> None:
+        """
+        Links (or copies) products from the folder of a run into the folders of other runs
+
+        :param product_names:
+        :param source_run_id:
+        :param run_ids:
+        """
+        current_run_id = self.current_run_id
+        try:
+            self.current_run_id = source_run_id
+            sources = {product_name: self.get_local_artifact_path(product_name) for product_name in product_names}
+            for run_id in run_ids:
+                self.current_run_id = run_id
+                for product_name, source in sources.items():
+                    destination = self.get_local_artifact_path(product_name)
+                    if source.is_dir():
+                        shutil.copytree(
+                            source,
+                            destination,
+                            copy_function=lambda file, linked_file: link_or_copy(Path(file), Path(linked_file)),
+                            dirs_exist_ok=True,
+                        )
+                    elif source.exists():
+                        link_or_copy(source, destination)
+        finally:
+            self.current_run_id = current_run_id
+
+    def flush_uploads(self) -> List[BaseException]:
+        """
+        Waits for the products being uploaded in the background by the `BackgroundUploader` clients in `dag_clients`
+
+        :return: The errors raised by the uploads that failed
+        """
+        errors = []
+        for client in self.dag_clients.values():
+            if isinstance(client, BackgroundUploader):
+                errors.extend(client.flush())
+        return errors
+
+    def get_product_sizes(self, function_name: str) -> Dict[str, int]:
+        """
+        Gets the size on disk of the products of a function for the current run id
+
+        :param function_name:
+        :return: A mapping of the product names to their size in bytes, the products not on disk are left out. The size
+        of a partitioned product is the size of all its partitions
+        """
+        product_sizes = {}
+        for product_name in self.function_details[function_name].produces:
+            path = self.get_local_artifact_path(product_name)
+            if path.is_dir():
+                product_sizes[product_name] = sum(partition.stat().st_size for partition in path.iterdir())
+            elif path.exists():
+                product_sizes[product_name] = path.stat().st_size
+        return product_sizes
+
+    def load_run_metrics(self, run_id: Optional[str] = None) -> RunMetrics:
+        """
+        Reads the metrics recorded for a run of this pipeline
+
+        :param run_id: The identifier of the run, defaults to the current run id
+        :return:
+        """
+        return RunMetrics.load(self.location, run_id or self.current_run_id)
+
+    def analyse_critical_path(
+        self, run_ids: Optional[List[str]] = None, workers: Iterable[int] = ()
+    ) -> CriticalPathReport:
+        """
+        Finds the steps that bound the run time of the pipeline, how much every other step can be delayed without
+        delaying the run and how long a run is expected to take, from the timings recorded in past runs, see
+        `cf_pipelines.base.critical_path`
+
+        :param run_ids: The runs whose timings are used, defaults to every run of this pipeline in its location
+        :param workers: The numbers of workers the run time is predicted for, on top of running one step at a time and
+        running with as many workers as needed
+        :return:
+        """
+        if run_ids is None:
+            run_ids = [
+                run_id
+                for run_id in ["default", *self.list_runs()]
+                if Path(self.location, run_id, METRICS_FILE_NAME).exists()
+            ]
+        history = [RunMetrics.load(self.location, run_id) for run_id in run_ids]
+        history = [run_metrics for run_metrics in history if run_metrics.pipeline_name == self.name]
+        if not history:
+            raise ValueError(f"There are no timings recorded for {self.name} in {self.location}")
+
+        report = analyse_critical_path(self.compile(), estimate_durations(history), workers)
+        report.run_count = len(history)
+        return report
+
+    def summarise_critical_path(
+        self, run_ids: Optional[List[str]] = None, workers: Iterable[int] = (), html: bool = False
+    ) -> str:
+        """
+        Summarises the critical path analysis of the pipeline, see `analyse_critical_path`
+
+        :param run_ids: The runs whose timings are used, defaults to every run of this pipeline in its location
+        :param workers: The numbers of workers the run time is predicted for
+        :param html: Whether the summary is an HTML fragment instead of plain text
+        :return:
+        """
+        report = self.analyse_critical_path(run_ids, workers)
+        title = f"Critical path of {self.name}"
+        return format_report_html(report, title) if html else format_report(report, title)
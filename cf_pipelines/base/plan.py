@@ -0,0 +1,161 @@
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import TYPE_CHECKING, AbstractSet, Dict, FrozenSet, List, Mapping, Optional, Set, Tuple
+
+from cf_pipelines.base.helper_classes import InputBinding
+
+if TYPE_CHECKING:
+    from cf_pipelines.base.pipeline import Pipeline
+
+
+@dataclass(frozen=True)
+class ExecutionPlan:
+    """
+    The dependencies between the functions of a pipeline, resolved once so running them requires no further lookups.
+    See `Pipeline.compile`.
+
+    Attributes
+    ---------
+    order: tuple
+        The names of all the functions, sorted so every function comes after the functions it depends upon
+    dependencies: Mapping
+        The names of the functions mapped to the names of the functions they depend upon
+    inputs: Mapping
+        The names of the functions mapped to the `InputBinding` of each one of their inputs
+    """
+
+    order: Tuple[str, ...]
+    dependencies: Mapping[str, FrozenSet[str]]
+    inputs: Mapping[str, Tuple[InputBinding, ...]]
+
+
+def compile_plan(pipeline: "Pipeline", provided: AbstractSet[str] = frozenset()) -> ExecutionPlan:
+    """
+    Resolves where each function in `pipeline` gets its inputs from and the order the functions must run in
+
+    :param pipeline:
+    :param provided: The names of arguments that are given some other way than as an environment variable or an extra
+    argument, such as the inputs of a `serving.CompiledFunction`
+    :return:
+    """
+    inputs: Dict[str, Tuple[InputBinding, ...]] = {}
+    dependencies: Dict[str, FrozenSet[str]] = {}
+    for function_name, function_details in pipeline.function_details.items():
+        bindings = []
+        for needed_product in sorted(function_details.needs):
+            product_lineage = pipeline.product_lineages.get(needed_product)
+            if product_lineage is not None:
+                bindings.append(InputBinding(needed_product, produced_by=product_lineage.produced_by))
+                continue
+            environment_variable = f"CF_{needed_product.upper()}"
+            if (
+                needed_product not in pipeline.extra_arguments
+                and environment_variable not in os.environ
+                and needed_product not in provided
+            ):
+                raise KeyError(
+                    f"The product {needed_product} requested by {function_name} is not generated by another step, "
+                    "nor does it exist as an environment variable,"
+                    "nor is it passed as an extra argument to the pipeline."
+                )
+            bindings.append(InputBinding(needed_product, environment_variable=environment_variable))
+        inputs[function_name] = tuple(bindings)
+        dependencies[function_name] = frozenset(
+            binding.produced_by for binding in bindings if binding.produced_by is not None
+        )
+
+    return ExecutionPlan(
+        order=sort_topologically(dependencies),
+        dependencies=MappingProxyType(dependencies),
+        inputs=MappingProxyType(inputs),
+    )
+
+
+def sort_topologically(dependencies: Mapping[str, FrozenSet[str]]) -> Tuple[str, ...]:
+    """
+    Sorts the functions so every function comes after the functions it depends upon, keeping the order they were
+    given in whenever possible
+
+    :param dependencies: The names of the functions mapped to the names of the functions they depend upon
+    :return:
+    :raises ValueError: When some functions depend upon each other in a cycle
+    """
+    waiting_on: Dict[str, Set[str]] = {name: set(depends_on) for name, depends_on in dependencies.items()}
+    dependants: Dict[str, List[str]] = {name: [] for name in dependencies}
+    for name, depends_on in dependencies.items():
+        for dependency in depends_on:
+            dependants[dependency].append(name)
+
+    order: List[str] = []
+    ready = [name for name, depends_on in waiting_on.items() if not depends_on]
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for dependant in dependants[name]:
+            waiting_on[dependant].discard(name)
+            if not waiting_on[dependant]:
+                ready.append(dependant)
+
+    if len(order) < len(dependencies):
+        raise ValueError(f"The functions {' -> '.join(find_cycle(waiting_on))} depend on each other in a cycle")
+    return tuple(order)
+
+
+def find_cycle(waiting_on: Dict[str, Set[str]]) -> List[str]:
+    """
+    Finds a cycle among the functions that could not be sorted
+
+    :param waiting_on: The functions that could not be sorted, mapped to the functions they still wait for
+    :return: The names of the functions in the cycle, starting and ending with the same function
+    """
+    path = [next(name for name, depends_on in waiting_on.items() if depends_on)]
+    while True:
+        # Every function left waits for another function left, so following them eventually reaches a repeated one
+        name = min(waiting_on[path[-1]])
+        if name in path:
+            return path[path.index(name) :] + [name]
+        path.append(name)
+
+
+def get_dependent_functions(plan: ExecutionPlan, arguments: AbstractSet[str]) -> Set[str]:
+    """
+    Finds the functions whose products depend on the value of some arguments: the ones that need them, and the ones
+    that need the products of the former, directly or not
+
+    :param plan:
+    :param arguments: The names of the arguments, which are not generated by any function
+    :return: The names of the functions
+    """
+    dependent: Set[str] = set()
+    for function_name in plan.order:
+        if plan.dependencies[function_name] & dependent or any(
+            binding.produced_by is None and binding.name in arguments for binding in plan.inputs[function_name]
+        ):
+            dependent.add(function_name)
+    return dependent
+
+
+def get_remaining_path_lengths(
+    plan: ExecutionPlan, durations: Optional[Mapping[str, float]] = None
+) -> Dict[str, float]:
+    """
+    Finds, for every function, the length of the longest chain of functions that starts with it: how long it takes
+    at least, from the moment the function starts, to run it and every function that depends upon it. The functions
+    with the longest remaining paths are on the critical path of the pipeline, and delaying them delays the whole run
+
+    :param plan:
+    :param durations: How long each function takes to run, the functions left out take 1
+    :return: The names of the functions mapped to the lengths of their remaining paths
+    """
+    durations = durations or {}
+    dependants: Dict[str, List[str]] = {function_name: [] for function_name in plan.order}
+    for function_name in plan.order:
+        for dependency in plan.dependencies[function_name]:
+            dependants[dependency].append(function_name)
+
+    lengths: Dict[str, float] = {}
+    for function_name in reversed(plan.order):
+        longest_dependant = max((lengths[dependant] for dependant in dependants[function_name]), default=0.0)
+        lengths[function_name] = durations.get(function_name, 1.0) + longest_dependant
+    return lengths
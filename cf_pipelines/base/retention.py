@@ -0,0 +1,205 @@
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import AbstractSet, Dict, Iterable, List, Optional, Tuple
+
+from cf_pipelines.base.helper_classes import RetentionPolicy
+from cf_pipelines.base.store import BlobStore
+
+RUN_ID_FORMAT = "%Y%m%d%H%M%S%f"
+PIN_FILE_NAME = ".pinned"
+CACHE_FOLDER_NAME = ".cache"
+
+
+def parse_run_id(run_id: str) -> Optional[datetime]:
+    """
+    Gets the time a run tracked with `track_all` started from its identifier
+
+    :param run_id:
+    :return: The time, or `None` when the identifier was not generated by `Pipeline.generate_run_id`
+    """
+    try:
+        return datetime.strptime(run_id, RUN_ID_FORMAT)
+    except ValueError:
+        return None
+
+
+def list_runs(location: Path) -> List[str]:
+    """
+    Lists the runs tracked with `track_all` stored in a pipeline's location, leaving out the "default" run and any
+    other folder, such as the step cache
+
+    :param location:
+    :return: The run identifiers, from the oldest to the most recent
+    """
+    if not location.is_dir():
+        return []
+    return sorted(entry.name for entry in os.scandir(location) if entry.is_dir() and parse_run_id(entry.name))
+
+
+def is_pinned(location: Path, run_id: str) -> bool:
+    return Path(location, run_id, PIN_FILE_NAME).exists()
+
+
+def get_freeable_size(path: Path, blob_ids: AbstractSet[Tuple[int, int]] = frozenset()) -> int:
+    """
+    Gets the space freed by removing a folder: the size of the files in it that are not hard linked from elsewhere,
+    such as the products linked from the step cache
+
+    :param path:
+    :param blob_ids: The device and inode numbers of the blobs in the pipeline's `BlobStore`. The files linked to a
+    blob and nowhere else are counted, since the blob is removed along with them
+    :return: The size in bytes
+    """
+    size = 0
+    for directory, _, file_names in os.walk(path):
+        for file_name in file_names:
+            stat = os.lstat(os.path.join(directory, file_name))
+            if stat.st_nlink - ((stat.st_dev, stat.st_ino) in blob_ids) == 1:
+                size += stat.st_size
+    return size
+
+
+def get_disk_usage(paths: Iterable[Path]) -> int:
+    """
+    Gets the space taken up by some folders, counting only once the files hard linked from more than one of them
+
+    :param paths:
+    :return: The size in bytes
+    """
+    sizes: Dict[Tuple[int, int], int] = {}
+    for path in paths:
+        for directory, _, file_names in os.walk(path):
+            for file_name in file_names:
+                stat = os.lstat(os.path.join(directory, file_name))
+                sizes[(stat.st_dev, stat.st_ino)] = stat.st_size
+    return sum(sizes.values())
+
+
+def list_unreferenced_cache_entries(
+    location: Path, blob_ids: AbstractSet[Tuple[int, int]] = frozenset()
+) -> List[Tuple[Path, int]]:
+    """
+    Lists the entries of the step cache (and of the partitions cache) that no run links to, so removing them frees
+    all the space they take up
+
+    :param location: The pipeline's location
+    :param blob_ids: The device and inode numbers of the blobs in the pipeline's `BlobStore`, see `get_freeable_size`
+    :return: The paths of the entries and their sizes, from the least to the most recently used
+    """
+    cache_location = Path(location, CACHE_FOLDER_NAME)
+    if not cache_location.is_dir():
+        return []
+    # The entries still being stored are left out, they are renamed once complete
+    entries = sorted(
+        (entry for entry in os.scandir(cache_location) if entry.is_dir() and not entry.name.endswith(".tmp")),
+        key=lambda entry: entry.stat().st_mtime_ns,
+    )
+    unreferenced = []
+    for entry in entries:
+        size = get_freeable_size(Path(entry.path), blob_ids)
+        if size == get_disk_usage([Path(entry.path)]):
+            unreferenced.append((Path(entry.path), size))
+    return unreferenced
+
+
+def select_expired_runs(
+    location: Path,
+    policy: RetentionPolicy,
+    keep: AbstractSet[str] = frozenset(),
+    now: Optional[datetime] = None,
+    store: Optional[BlobStore] = None,
+) -> List[str]:
+    """
+    Picks the runs to remove to meet a retention policy. Pinned runs and the runs in `keep` are never picked, but
+    count towards the limits. The step cache counts towards `max_size` too, but the runs are only picked when removing
+    the cache entries no run links to, see `evict_cache_entries`, is not enough to meet it
+
+    :param location: The pipeline's location
+    :param policy:
+    :param keep: The identifiers of runs that must be kept, such as the current run
+    :param now: The time the age of the runs is measured from, defaults to the current time
+    :param store: The store the artifacts are deduplicated in, if any
+    :return: The identifiers of the runs to remove, from the oldest to the most recent
+    """
+    runs = list_runs(location)
+    protected = {run_id for run_id in runs if run_id in keep or is_pinned(location, run_id)}
+    expired = set()
+
+    if policy.keep_last is not None:
+        expired.update(runs[: max(len(runs) - policy.keep_last, 0)])
+    if policy.max_age is not None:
+        oldest_kept = (now or datetime.now()) - policy.max_age
+        for run_id in runs:
+            started_at = parse_run_id(run_id)
+            if started_at is not None and started_at < oldest_kept:
+                expired.add(run_id)
+    expired -= protected
+
+    if policy.max_size is not None:
+        blob_ids = store.get_file_ids() if store else frozenset()
+        sizes: Dict[str, int] = {
+            run_id: get_freeable_size(Path(location, run_id), blob_ids) for run_id in runs if run_id not in expired
+        }
+        total_size = get_disk_usage(
+            [Path(location, run_id) for run_id in sizes] + [Path(location, CACHE_FOLDER_NAME)]
+        ) - sum(size for _, size in list_unreferenced_cache_entries(location, blob_ids))
+        for run_id in runs:
+            if total_size <= policy.max_size:
+                break
+            # Removing a run whose files are all linked from elsewhere, such as the step cache, frees no space
+            if sizes.get(run_id) and run_id not in protected:
+                expired.add(run_id)
+                total_size -= sizes[run_id]
+
+    return [run_id for run_id in runs if run_id in expired]
+
+
+def collect_garbage(
+    location: Path,
+    policy: RetentionPolicy,
+    keep: AbstractSet[str] = frozenset(),
+    now: Optional[datetime] = None,
+    store: Optional[BlobStore] = None,
+) -> List[str]:
+    """
+    Removes the runs that do not meet a retention policy, see `select_expired_runs`, then the step cache entries
+    needed to meet its `max_size`, see `evict_cache_entries`, and finally the blobs in `store` that were only linked
+    from them. Removing a run never removes the products stored in the step cache, which keeps its own links to them
+
+    :return: The identifiers of the removed runs
+    """
+    expired = select_expired_runs(location, policy, keep, now, store)
+    for run_id in expired:
+        shutil.rmtree(Path(location, run_id), ignore_errors=True)
+    if policy.max_size is not None:
+        evict_cache_entries(location, policy.max_size, store)
+    if store:
+        store.prune()
+    return expired
+
+
+def evict_cache_entries(location: Path, max_size: int, store: Optional[BlobStore] = None) -> List[Path]:
+    """
+    Removes the step cache entries no run links to, the least recently used first, until the runs tracked with
+    `track_all` and the step cache fit in `max_size` bytes. The entries linked from a run free no space, so they are
+    kept
+
+    :param location: The pipeline's location
+    :param max_size:
+    :param store: The store the artifacts are deduplicated in, if any
+    :return: The paths of the removed entries
+    """
+    blob_ids = store.get_file_ids() if store else frozenset()
+    total_size = get_disk_usage(
+        [Path(location, run_id) for run_id in list_runs(location)] + [Path(location, CACHE_FOLDER_NAME)]
+    )
+    evicted = []
+    for entry, size in list_unreferenced_cache_entries(location, blob_ids):
+        if total_size <= max_size:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        evicted.append(entry)
+        total_size -= size
+    return evicted
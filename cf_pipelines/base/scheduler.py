@@ -0,0 +1,682 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+from pathlib import Path
+from threading import Thread
+from typing import TYPE_CHECKING, AbstractSet, Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from cf_pipelines.base.cache import StepCache
+from cf_pipelines.base.helper_classes import FunctionDetails, ResourceBudget, StepMetrics
+from cf_pipelines.base.lazy import LazyArtifact, is_loaded
+from cf_pipelines.base.memory import InMemoryArtifacts
+from cf_pipelines.base.plan import get_remaining_path_lengths
+from cf_pipelines.base.serializers import import_ploomber
+from cf_pipelines.base.shared import SharedArtifacts
+from cf_pipelines.base.streaming import write_chunks
+from cf_pipelines.base.utils import hash_source, remove_extension
+
+if TYPE_CHECKING:
+    from cf_pipelines.base.pipeline import Pipeline
+
+CONCURRENT_EXECUTORS = {"threads", "processes"}
+
+# The cpus taken up by the steps are counted in thousandths of a cpu, so adding and removing them is exact
+CPU_UNITS = 1000
+
+# The steps registered in a pipeline are closures, so they can't be pickled and sent to a worker process. Instead, the
+# scheduler being run is stored here right before the workers are forked, so they inherit it.
+_forked_scheduler: Optional["StepScheduler"] = None
+
+
+def get_source_hash_path(pipeline: "Pipeline", function_name: str) -> Path:
+    """
+    Gets the path of the file that records the hash of the source code of a step that ran for the current run id, it
+    sits next to the step's products.
+
+    :param pipeline:
+    :param function_name:
+    :return:
+    """
+    group = pipeline.function_details[function_name].group
+    return Path(pipeline.location, pipeline.current_run_id, group, f".{function_name}.source")
+
+
+def read_inputs(
+    pipeline: "Pipeline", function_name: str, artifacts: Optional[InMemoryArtifacts], step_metrics: StepMetrics
+) -> Tuple[Dict[str, Dict], Dict[str, LazyArtifact]]:
+    """
+    Reads the products a step needs, or wraps them in `LazyArtifact` proxies for lazy steps
+
+    :param pipeline: The pipeline the step belongs to
+    :param function_name: The name of the step
+    :param artifacts: When set, the products are read from memory instead of from disk
+    :param step_metrics: The time spent reading, including the time spent reading lazy products later on, is recorded
+    in it
+    :return: The nested "function name" -> "product name" -> value mapping Ploomber passes to the step as `upstream`,
+    and the lazy proxies handed to the step
+    """
+    function_details = pipeline.function_details[function_name]
+    step_metrics.unserialize_time = 0.0
+
+    def read_artifact(product_name: str) -> Any:
+        start = time.monotonic()
+        try:
+            return artifacts.get(product_name) if artifacts else pipeline.read_artifact(product_name)
+        finally:
+            step_metrics.unserialize_time = (step_metrics.unserialize_time or 0.0) + time.monotonic() - start
+
+    upstream: Dict[str, Dict] = defaultdict(dict)
+    lazy_artifacts: Dict[str, LazyArtifact] = {}
+    for binding in pipeline.compile().inputs[function_name]:
+        if binding.produced_by is None:
+            continue
+        if function_details.lazy:
+            lazy_artifacts[binding.name] = LazyArtifact(binding.name, partial(read_artifact, binding.name))
+            upstream[binding.produced_by][binding.name] = lazy_artifacts[binding.name]
+        else:
+            upstream[binding.produced_by][binding.name] = read_artifact(binding.name)
+    return dict(upstream), lazy_artifacts
+
+
+def store_products(
+    pipeline: "Pipeline",
+    function_name: str,
+    returns: Dict[str, Any],
+    artifacts: Optional[InMemoryArtifacts],
+    step_metrics: StepMetrics,
+) -> None:
+    """
+    Stores the products returned by a step, in memory or on disk
+
+    :param pipeline: The pipeline the step belongs to
+    :param function_name: The name of the step
+    :param returns: A mapping of product names (with no extension) to their values
+    :param artifacts: When set, the products are stored in memory instead of on disk
+    :param step_metrics: The time spent writing is recorded in it
+    """
+    start = time.monotonic()
+    if artifacts:
+        artifacts.put(function_name, returns)
+    elif not pipeline.function_details[function_name].writes_own_products:
+        for product_name, value in returns.items():
+            pipeline.write_artifact(product_name, value)
+    step_metrics.serialize_time = time.monotonic() - start
+
+
+def get_untouched_inputs(lazy_artifacts: Dict[str, LazyArtifact]) -> Set[str]:
+    return {
+        needed_artifact for needed_artifact, lazy_artifact in lazy_artifacts.items() if not is_loaded(lazy_artifact)
+    }
+
+
+def run_step(
+    pipeline: "Pipeline",
+    function_name: str,
+    artifacts: Optional[InMemoryArtifacts] = None,
+    step_metrics: Optional[StepMetrics] = None,
+) -> Optional[Set[str]]:
+    """
+    Reads the products a step needs, calls it and stores its products, mimicking what Ploomber does for each one of
+    its tasks.
+
+    :param pipeline: The pipeline the step belongs to
+    :param function_name: The name of the step to run
+    :param artifacts: When set, the products are read from and stored in memory instead of on disk
+    :param step_metrics: When set, the time spent reading, computing and writing is recorded in it
+    :return: For lazy steps, the products the step needed but never used
+    """
+    function_details = pipeline.function_details[function_name]
+    step_metrics = step_metrics or StepMetrics(function_name)
+    upstream, lazy_artifacts = read_inputs(pipeline, function_name, artifacts, step_metrics)
+
+    start = time.monotonic()
+    # Lazy products are read while the step computes
+    unserialize_time = step_metrics.unserialize_time or 0.0
+    returns = function_details.python_function(upstream=upstream, kwargs=None)
+
+    if function_details.streams:
+        # The chunks are always written to disk as they arrive, only the `ChunkedArtifact`s are kept in memory, so the
+        # time spent writing them is part of the time spent computing them
+        returns = write_chunks(pipeline, function_name, returns)
+    lazy_unserialize_time = (step_metrics.unserialize_time or 0.0) - unserialize_time
+    step_metrics.compute_time = time.monotonic() - start - lazy_unserialize_time
+
+    store_products(pipeline, function_name, returns, artifacts, step_metrics)
+    return get_untouched_inputs(lazy_artifacts) if function_details.lazy else None
+
+
+def finish_step(
+    pipeline: "Pipeline", function_name: str, artifacts: Optional[InMemoryArtifacts], step_metrics: StepMetrics
+) -> StepMetrics:
+    """
+    Records that a step was built: the hash of its source code, next to its products on disk, and its final metrics
+
+    :param pipeline: The pipeline the step belongs to
+    :param function_name: The name of the step
+    :param artifacts: Set when the products are stored in memory
+    :param step_metrics: The metrics of the step
+    :return: The metrics of the step
+    """
+    if not artifacts:
+        get_source_hash_path(pipeline, function_name).write_text(
+            hash_source(pipeline.function_details[function_name].python_function)
+        )
+    if not artifacts or (not artifacts.writer and artifacts.is_persisted(function_name)):
+        # The products written in the background may not be on disk yet
+        step_metrics.product_sizes = pipeline.get_product_sizes(function_name)
+    step_metrics.ended_at = time.monotonic()
+    return step_metrics
+
+
+def build_step(
+    pipeline: "Pipeline",
+    function_name: str,
+    artifacts: Optional[InMemoryArtifacts] = None,
+    cache: Optional[StepCache] = None,
+    key: Optional[str] = None,
+) -> StepMetrics:
+    """
+    Builds the products of a single step of `pipeline`, either by running it or by restoring them from the cache
+
+    :param pipeline: The pipeline the step belongs to
+    :param function_name: The name of the step to build
+    :param artifacts: When set, the products are read from and stored in memory instead of on disk
+    :param cache: When set, the step is skipped if its products are found in the cache
+    :param key: The cache key of the step, computed from `cache` when not given
+    :return: The metrics of the step, including, for lazy steps that ran, the products it needed but never used
+    """
+    step_metrics = StepMetrics(function_name, started_at=time.monotonic())
+    if cache and key is None:
+        key = cache.key(function_name)
+    if pipeline.function_details[function_name].partitions:
+        # Mapped steps cache each one of their partitions instead, the key still fingerprints their products
+        key = None
+    if cache and key and cache.restore(function_name, key, artifacts):
+        step_metrics.cache_hit = True
+        pipeline.meta_logger.info(f"Restored the products of {function_name} from the cache")
+    else:
+        if cache:
+            step_metrics.cache_hit = False
+        untouched = run_step(pipeline, function_name, artifacts, step_metrics)
+        if untouched is not None:
+            step_metrics.untouched_inputs = sorted(untouched)
+        if cache and key:
+            cache.store(function_name, key, artifacts)
+    return finish_step(pipeline, function_name, artifacts, step_metrics)
+
+
+async def build_async_step(
+    pipeline: "Pipeline",
+    function_name: str,
+    artifacts: Optional[InMemoryArtifacts] = None,
+    cache: Optional[StepCache] = None,
+    key: Optional[str] = None,
+    executor: Optional[Executor] = None,
+) -> StepMetrics:
+    """
+    Builds the products of a step defined with `async def`, like `build_step` does for the rest of the steps. The step
+    is awaited on the running event loop, while reading the products it needs, writing its products and looking them
+    up in the cache are done by `executor`, so the event loop is never blocked by them.
+
+    :param pipeline: The pipeline the step belongs to
+    :param function_name: The name of the step to build
+    :param artifacts: When set, the products are read from and stored in memory instead of on disk
+    :param cache: When set, the step is skipped if its products are found in the cache
+    :param key: The cache key of the step, computed from `cache` when not given
+    :param executor: Where the blocking work is done, defaults to the event loop's default executor
+    :return: The metrics of the step
+    """
+    loop = asyncio.get_running_loop()
+
+    def run_in_executor(function: Callable, *args: Any) -> Awaitable:
+        return loop.run_in_executor(executor, partial(function, *args))
+
+    step_metrics = StepMetrics(function_name, started_at=time.monotonic())
+    if cache and key is None:
+        key = await run_in_executor(cache.key, function_name)
+    if cache and key and await run_in_executor(cache.restore, function_name, key, artifacts):
+        step_metrics.cache_hit = True
+        pipeline.meta_logger.info(f"Restored the products of {function_name} from the cache")
+    else:
+        if cache:
+            step_metrics.cache_hit = False
+        upstream, lazy_artifacts = await run_in_executor(read_inputs, pipeline, function_name, artifacts, step_metrics)
+        start = time.monotonic()
+        returns = await pipeline.function_details[function_name].python_function(upstream=upstream, kwargs=None)
+        step_metrics.compute_time = time.monotonic() - start
+        await run_in_executor(store_products, pipeline, function_name, returns, artifacts, step_metrics)
+        if pipeline.function_details[function_name].lazy:
+            step_metrics.untouched_inputs = sorted(get_untouched_inputs(lazy_artifacts))
+        if cache and key:
+            await run_in_executor(cache.store, function_name, key, artifacts)
+    await run_in_executor(finish_step, pipeline, function_name, artifacts, step_metrics)
+    return step_metrics
+
+
+async def limit_concurrency(semaphore: Optional[asyncio.Semaphore], coroutine: Awaitable) -> Any:
+    if semaphore is None:
+        return await coroutine
+    async with semaphore:
+        return await coroutine
+
+
+def _get_forked_scheduler() -> "StepScheduler":
+    if _forked_scheduler is None:
+        raise RuntimeError("The worker process was not started by a `StepScheduler`")
+    return _forked_scheduler
+
+
+def _detach_hooks() -> None:
+    # The hooks are called by the scheduler in the parent process instead
+    pipeline = _get_forked_scheduler().pipeline
+    pipeline.before_function = pipeline.after_function = pipeline.exception_handler = None
+
+
+def _build_step_in_subprocess(function_name: str, key: Optional[str] = None) -> StepMetrics:
+    scheduler = _get_forked_scheduler()
+    step_metrics = build_step(scheduler.pipeline, function_name, scheduler.artifacts, scheduler.cache, key)
+    # The products queued for upload by this process have to be uploaded before the step is considered done
+    upload_errors = scheduler.pipeline.flush_uploads()
+    if upload_errors:
+        raise upload_errors[0]
+    return step_metrics
+
+
+async def _make_semaphore(value: int) -> asyncio.Semaphore:
+    return asyncio.Semaphore(value)
+
+
+def to_cpu_units(cpus: float) -> int:
+    return round(cpus * CPU_UNITS)
+
+
+class ResourcePool:
+    """
+    Keeps track of the resources of the machine taken up by the steps that are running, so a step is only started
+    when the cpus and memory it declares are free
+
+    Attributes
+    ---------
+    cpus: int
+        The number of cpus shared by the steps, in `CPU_UNITS`
+    memory: float
+        The memory, in bytes, shared by the steps
+    used_cpus: int
+        The number of cpus taken up by the running steps, in `CPU_UNITS`
+    used_memory: int
+        The memory taken up by the running steps
+    """
+
+    def __init__(self, budget: ResourceBudget):
+        self.cpus = to_cpu_units(budget.cpus if budget.cpus is not None else os.cpu_count() or 1)
+        self.memory = budget.memory if budget.memory is not None else math.inf
+        self.used_cpus = 0
+        self.used_memory = 0
+
+    def exceeds(self, function_details: FunctionDetails) -> bool:
+        return to_cpu_units(function_details.cpus) > self.cpus or function_details.memory > self.memory
+
+    def max_running(self, functions: List[FunctionDetails]) -> int:
+        """
+        The number of workers needed to run as many of the steps at the same time as the cpus allow: as many of the
+        steps declaring the fewest cpus as fit in the budget, but never more than the steps, nor than the machine's
+        cpus unless the budget has more
+
+        :param functions: The steps being run
+        :return:
+        """
+        most_running = max(os.cpu_count() or 1, math.ceil(self.cpus / CPU_UNITS))
+        smallest_cpus = min((to_cpu_units(function_details.cpus) for function_details in functions), default=0)
+        running = math.ceil(self.cpus / smallest_cpus) if smallest_cpus else most_running
+        return max(min(running, most_running, len(functions)), 1)
+
+    def fits(self, function_details: FunctionDetails) -> bool:
+        return (
+            self.used_cpus + to_cpu_units(function_details.cpus) <= self.cpus
+            and self.used_memory + function_details.memory <= self.memory
+        )
+
+    def acquire(self, function_details: FunctionDetails) -> None:
+        self.used_cpus += to_cpu_units(function_details.cpus)
+        self.used_memory += function_details.memory
+
+    def release(self, function_details: FunctionDetails) -> None:
+        self.used_cpus -= to_cpu_units(function_details.cpus)
+        self.used_memory -= function_details.memory
+
+
+class StepScheduler:
+    """
+    Runs the steps of a `Pipeline` concurrently, without going through Ploomber's `Serial` executor.
+    The dependencies between steps are taken from the pipeline's compiled plan, see `Pipeline.compile`, and every step
+    is started as soon as all the steps it depends upon have finished and, when the pipeline has a `resources` budget,
+    as soon as the cpus and memory it declares are free. When more steps are ready than can start, the ones with the
+    longest chain of steps left after them, see `plan.get_remaining_path_lengths`, start first.
+
+    Attributes
+    ---------
+    pipeline: Pipeline
+        The pipeline whose steps are run
+    executor: str
+        Either "threads" or "processes", the kind of workers used to run the steps. When using processes, the workers
+        are forked, so this option is only available on platforms that support the `fork` start method. The
+        `before_function`, `after_function` and `exception_handler` of the pipeline are still called in this process
+    max_workers: int
+        The maximum number of steps that run at the same time, defaults to the `concurrent.futures` default
+    artifacts: InMemoryArtifacts
+        Where the products are kept during the run when the pipeline is set to run `in_memory`. When using processes,
+        they are kept in shared memory, see `SharedArtifacts`
+    cache: StepCache
+        The cache used to skip steps whose inputs have not changed, when the pipeline is set to use a `cache`
+    event_loop: AbstractEventLoop
+        The event loop the steps defined with `async def` are awaited on, concurrently, while the pipeline runs. The
+        blocking work around them (reading and writing products) is done by the thread pool when using threads
+    resource_pool: ResourcePool
+        The resources taken up by the running steps, when the pipeline has a `resources` budget
+    """
+
+    def __init__(self, pipeline: "Pipeline", executor: str = "threads", max_workers: Optional[int] = None):
+        if executor not in CONCURRENT_EXECUTORS:
+            raise ValueError(f"Unknown executor {executor}, it must be one of {sorted(CONCURRENT_EXECUTORS)}")
+        self.pipeline = pipeline
+        self.executor = executor
+        self.max_workers = max_workers
+        self.artifacts: Optional[InMemoryArtifacts] = None
+        self.cache: Optional[StepCache] = StepCache(pipeline) if pipeline.cache else None
+        self.event_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.event_loop_thread: Optional[Thread] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.resource_pool: Optional[ResourcePool] = ResourcePool(pipeline.resources) if pipeline.resources else None
+        self.priorities: Dict[str, Tuple[float, int]] = {}
+
+    def make_pool(self) -> Executor:
+        if self.executor == "processes":
+            global _forked_scheduler
+            _forked_scheduler = self
+            import_ploomber()
+            return ProcessPoolExecutor(
+                self.max_workers, mp_context=multiprocessing.get_context("fork"), initializer=_detach_hooks
+            )
+        return ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.pipeline.name)
+
+    def runs_in_subprocess(self, function_name: str) -> bool:
+        # The steps defined with `async def` are always awaited on the event loop, in this process
+        return self.executor == "processes" and not self.pipeline.function_details[function_name].asynchronous
+
+    def start_event_loop(self) -> None:
+        """
+        Starts the event loop the steps defined with `async def` are awaited on, in a thread of its own
+        """
+        self.event_loop = asyncio.new_event_loop()
+        self.event_loop_thread = Thread(target=self.event_loop.run_forever, name=f"{self.pipeline.name} event loop")
+        self.event_loop_thread.start()
+        if self.pipeline.async_concurrency:
+            # The semaphore has to be created within the event loop it is used in
+            self.semaphore = asyncio.run_coroutine_threadsafe(
+                _make_semaphore(self.pipeline.async_concurrency), self.event_loop
+            ).result()
+
+    def stop_event_loop(self) -> None:
+        if self.event_loop is None or self.event_loop_thread is None:
+            return
+        self.event_loop.call_soon_threadsafe(self.event_loop.stop)
+        self.event_loop_thread.join()
+        self.event_loop.close()
+        self.event_loop = self.event_loop_thread = self.semaphore = None
+
+    def submit(self, pool: Executor, function_name: str) -> Future:
+        if self.pipeline.function_details[function_name].asynchronous:
+            if self.event_loop is None:
+                raise RuntimeError(f"The event loop {function_name} is awaited on was not started")
+            # Processes can't take on the blocking work of the step, the event loop's default executor does it instead
+            executor = pool if self.executor == "threads" else None
+            coroutine = build_async_step(self.pipeline, function_name, self.artifacts, self.cache, executor=executor)
+            return asyncio.run_coroutine_threadsafe(limit_concurrency(self.semaphore, coroutine), self.event_loop)
+        if self.executor == "processes":
+            if self.pipeline.before_function:
+                self.pipeline.before_function(function_name)
+            # The products are fingerprinted by the keys of the steps that generated them when running in memory, so
+            # the keys are computed here, where they are kept across steps
+            key = self.cache.key(function_name) if self.cache and self.pipeline.in_memory else None
+            return pool.submit(_build_step_in_subprocess, function_name, key)
+        return pool.submit(build_step, self.pipeline, function_name, self.artifacts, self.cache)
+
+    def run(
+        self,
+        targets: Optional[List[str]] = None,
+        functions: Optional[Set[str]] = None,
+        on_disk: AbstractSet[str] = frozenset(),
+        persist: AbstractSet[str] = frozenset(),
+    ) -> None:
+        """
+        Runs the steps in the pipeline. Once a step fails no new steps are started, the ones already running are
+        allowed to finish and then a `DAGBuildError` is raised, just like a failing Ploomber DAG would do.
+
+        :param targets: When set, only the steps needed to generate these products are run. The steps that generate
+        the targets always run, while the rest are skipped if their products are up to date on disk
+        :param functions: When set, only these steps are run. The products they need from other steps must be on disk
+        :param on_disk: When running in memory, the products generated by steps that are not run, read from disk
+        :param persist: When running in memory, the steps whose products are also written to disk, on top of the
+        steps that generate the targets
+        """
+        plan = self.pipeline.compile()
+        if functions is None:
+            functions = (
+                self.pipeline.get_required_functions(targets) if targets else set(self.pipeline.function_details)
+            )
+        waiting_on: Dict[str, Set[str]] = {
+            function_name: set(plan.dependencies[function_name] & functions) for function_name in functions
+        }
+        dependants: Dict[str, Set[str]] = defaultdict(set)
+        for function_name, dependencies in waiting_on.items():
+            for dependency in dependencies:
+                dependants[dependency].add(function_name)
+
+        if self.resource_pool:
+            too_big = sorted(
+                function_name
+                for function_name in functions
+                if self.resource_pool.exceeds(self.pipeline.function_details[function_name])
+            )
+            if too_big:
+                raise ValueError(f"The steps {', '.join(too_big)} need more resources than {self.pipeline.name} has")
+            if self.max_workers is None:
+                # The resources limit how many steps run at the same time, there is no point in more workers
+                self.max_workers = self.resource_pool.max_running(
+                    [self.pipeline.function_details[function_name] for function_name in functions]
+                )
+        remaining_path_lengths = get_remaining_path_lengths(plan)
+        self.priorities = {
+            function_name: (-remaining_path_lengths[function_name], position)
+            for position, function_name in enumerate(plan.order)
+        }
+
+        target_functions = {
+            self.pipeline.product_lineages[remove_extension(target)].produced_by for target in targets or []
+        }
+        reusable: Set[str] = set()
+        if targets and not self.pipeline.in_memory:
+            reusable = functions - target_functions
+
+        if self.pipeline.in_memory and self.executor == "processes":
+            self.artifacts = SharedArtifacts(self.pipeline, self.pipeline.background_persist)
+        elif self.pipeline.in_memory:
+            self.artifacts = InMemoryArtifacts(
+                self.pipeline, self.pipeline.background_persist, self.pipeline.memory_budget
+            )
+        if self.artifacts:
+            self.artifacts.count_consumers(functions)
+            self.artifacts.on_disk.update(on_disk)
+            # The targets are what the run is for, so they are written to disk even if nothing else is
+            self.artifacts.persisted_functions.update(persist, target_functions)
+
+        if any(self.pipeline.function_details[function_name].asynchronous for function_name in functions):
+            self.start_event_loop()
+
+        try:
+            failures = self.run_steps(waiting_on, dependants, reusable)
+        finally:
+            if self.event_loop:
+                self.stop_event_loop()
+            if self.artifacts:
+                self.artifacts.close()
+                self.artifacts = None
+
+        if failures:
+            from ploomber.exceptions import DAGBuildError
+
+            failed = ", ".join(sorted(failures))
+            raise DAGBuildError(f"Failed to build the pipeline {self.pipeline.name}, the steps {failed} failed") from (
+                next(iter(failures.values()))
+            )
+
+    def is_up_to_date(self, function_name: str) -> bool:
+        """
+        Checks whether the products of a step on disk for the current run id can be reused: they must all exist, must
+        have been generated by the current source code of the step and must be newer than the products it needs.
+
+        :param function_name: The name of the step
+        :return:
+        """
+        source_hash_path = get_source_hash_path(self.pipeline, function_name)
+        function_details = self.pipeline.function_details[function_name]
+        product_paths = [self.pipeline.get_local_artifact_path(product) for product in function_details.produces]
+        if not all(path.exists() for path in [source_hash_path, *product_paths]):
+            return False
+        if source_hash_path.read_text() != hash_source(function_details.python_function):
+            return False
+
+        needed_paths = [
+            self.pipeline.get_local_artifact_path(product)
+            for product in function_details.needs
+            if product in self.pipeline.product_lineages
+        ]
+        if not needed_paths:
+            return True
+        oldest_product = min(path.stat().st_mtime_ns for path in product_paths)
+        return oldest_product >= max(path.stat().st_mtime_ns for path in needed_paths)
+
+    def call_after_function(self, step_metrics: StepMetrics) -> None:
+        """
+        Calls the pipeline's `after_function` for a step that ran in a worker process, with the products it generated
+        read back from memory or disk
+
+        :param step_metrics: The metrics returned by the worker
+        """
+        after_function = self.pipeline.after_function
+        if after_function is None:
+            return
+        read_artifact = self.artifacts.get if self.artifacts else self.pipeline.read_artifact
+        function_name = step_metrics.function_name
+        returns = {
+            product_name: read_artifact(product_name)
+            for product_name in self.pipeline.function_details[function_name].produces
+        }
+        after_function(function_name, returns, step_metrics.compute_time or 0.0)
+
+    def run_steps(
+        self, waiting_on: Dict[str, Set[str]], dependants: Dict[str, Set[str]], reusable: Set[str]
+    ) -> Dict[str, BaseException]:
+        """
+        Submits the steps to the workers as their dependencies are met
+
+        :param waiting_on: The steps left to run, mapped to the steps they still wait for
+        :param dependants: The steps mapped to the steps that depend upon them
+        :param reusable: The steps that are not run if their products are up to date
+        :return: The steps that failed, mapped to the exception they raised
+        """
+        failures: Dict[str, BaseException] = {}
+        running: Dict[Future, str] = {}
+        queued: List[str] = []
+        queued_at: Dict[str, float] = {}
+        dependencies = {function_name: set(waiting_for) for function_name, waiting_for in waiting_on.items()}
+        built: Set[str] = set()
+
+        def finish(function_name: str) -> None:
+            for dependant in dependants[function_name]:
+                waiting_on[dependant].discard(function_name)
+
+        with self.make_pool() as pool:
+
+            def submit_ready_steps():
+                ready = [function_name for function_name, waiting_for in waiting_on.items() if not waiting_for]
+                while ready:
+                    for function_name in ready:
+                        waiting_on.pop(function_name)
+                        if (
+                            function_name in reusable
+                            and not dependencies[function_name] & built
+                            and self.is_up_to_date(function_name)
+                        ):
+                            self.pipeline.meta_logger.info(f"The products of {function_name} are up to date")
+                            finish(function_name)
+                        else:
+                            queued_at[function_name] = time.monotonic()
+                            queued.append(function_name)
+                    ready = [function_name for function_name, waiting_for in waiting_on.items() if not waiting_for]
+
+                # The steps on the critical path go first, the rest fill in the resources they leave free
+                queued.sort(key=self.priorities.__getitem__)
+                for function_name in list(queued):
+                    function_details = self.pipeline.function_details[function_name]
+                    if self.resource_pool:
+                        if not self.resource_pool.fits(function_details):
+                            continue
+                        self.resource_pool.acquire(function_details)
+                    queued.remove(function_name)
+                    running[self.submit(pool, function_name)] = function_name
+
+            submit_ready_steps()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    function_name = running.pop(future)
+                    if self.resource_pool:
+                        self.resource_pool.release(self.pipeline.function_details[function_name])
+                    exception = future.exception()
+                    if exception is not None:
+                        failures[function_name] = exception
+                        exception_handler = self.pipeline.exception_handler
+                        # Like the steps run by Ploomber, only exceptions are handled, not e.g. `KeyboardInterrupt`
+                        if (
+                            self.runs_in_subprocess(function_name)
+                            and exception_handler
+                            and isinstance(exception, Exception)
+                        ):
+                            elapsed_time = time.monotonic() - queued_at[function_name]
+                            exception_handler(function_name, exception, elapsed_time)
+                        continue
+                    step_metrics = future.result()
+                    if (
+                        self.runs_in_subprocess(function_name)
+                        and self.pipeline.after_function
+                        and not step_metrics.cache_hit
+                    ):
+                        self.call_after_function(step_metrics)
+                    # The monotonic clock is shared by all the processes
+                    step_metrics.queued_at = queued_at[function_name]
+                    step_metrics.queue_wait = step_metrics.started_at - step_metrics.queued_at
+                    if self.pipeline.run_metrics:
+                        self.pipeline.run_metrics.record(step_metrics)
+                    if step_metrics.untouched_inputs is not None:
+                        untouched = set(step_metrics.untouched_inputs)
+                        self.pipeline.untouched_inputs[function_name] = untouched
+                        if untouched:
+                            self.pipeline.meta_logger.info(f"{function_name} never used {', '.join(sorted(untouched))}")
+                    built.add(function_name)
+                    if self.artifacts:
+                        self.artifacts.release(function_name)
+                    finish(function_name)
+                if not failures:
+                    submit_ready_steps()
+
+        if not failures and (queued or waiting_on):
+            # Every step must have run, or been skipped for being up to date, unless a step failed
+            never_run = ", ".join(sorted([*queued, *waiting_on]))
+            raise RuntimeError(f"The steps {never_run} of {self.pipeline.name} were never run")
+        return failures
@@ -0,0 +1,459 @@
+import gzip
+import importlib.util
+import io
+import logging
+import os
+import pickle
+import sys
+import time
+import uuid
+from functools import lru_cache, wraps
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Optional, Tuple, cast
+
+from cf_pipelines.base.helper_classes import ArtifactFormat, Codec
+
+logger = logging.getLogger(__name__)
+
+artifact_formats: Dict[str, ArtifactFormat] = {}
+codecs: Dict[str, Codec] = {}
+
+
+def register_format(
+    extension: str,
+    dump: Callable[[Any, BinaryIO], None],
+    load: Callable[[BinaryIO], Any],
+    accepts: Optional[Callable[[Any], bool]] = None,
+    magic: Optional[bytes] = None,
+    load_mapped: Optional[Callable[[Path], Any]] = None,
+) -> None:
+    """
+    Registers how the artifacts whose file name ends with `extension` are stored on disk, replacing any format
+    previously registered for it. Artifacts with no registered format are pickled.
+
+    :param extension: The file extension, including the leading dot, e.g. ".parquet"
+    :param dump: A function that writes an object to a binary file. When it raises, the object is pickled instead
+    :param load: A function that reads an object back from a binary file
+    :param accepts: A function that tells whether an object can be written in this format, objects that are not
+    accepted are pickled instead. By default, all objects are accepted
+    :param magic: The bytes every file in this format starts with. When set, files that do not start with them (for
+    example, files written by older versions of a pipeline) are unpickled instead
+    :param load_mapped: A function that memory-maps a file, returning a view of its contents, used instead of `load`
+    by `unserialize_memory_mapped`
+    """
+    artifact_formats[extension.lower()] = ArtifactFormat(dump, load, accepts, magic, load_mapped)
+
+
+def register_codec(
+    name: str,
+    extension: str,
+    open_writer: Callable[[BinaryIO, int], BinaryIO],
+    open_reader: Callable[[BinaryIO], BinaryIO],
+    default_level: int,
+    magic: bytes,
+) -> None:
+    """
+    Registers a compression codec, replacing any codec previously registered with the same name
+
+    :param name: The name the codec is picked by, e.g. "zstd"
+    :param extension: The file extension, including the leading dot, of the artifacts always compressed with this
+    codec, e.g. ".zst" for "data.parquet.zst"
+    :param open_writer: A function that wraps a binary file, given the compression level, so everything written to
+    the wrapper is compressed into the file. Closing the wrapper must not close the file
+    :param open_reader: A function that wraps a binary file so everything read from the wrapper is decompressed
+    :param default_level: The compression level used when none is given
+    :param magic: The bytes every compressed file starts with, used to decompress the files transparently
+    """
+    codecs[name] = Codec(extension.lower(), open_writer, open_reader, default_level, magic)
+
+
+def get_format(path: Path) -> Optional[ArtifactFormat]:
+    return artifact_formats.get(path.suffix.lower())
+
+
+def get_codec(path: Path) -> Optional[Codec]:
+    return next((codec for codec in codecs.values() if codec.extension == path.suffix.lower()), None)
+
+
+def split_codec(path: Path) -> Tuple[Optional[Codec], Path]:
+    """
+    Gets the codec picked by the extension of `path`, if any, and the path without that extension, which picks the
+    format of the artifact
+
+    :param path:
+    :return:
+    """
+    codec = get_codec(path)
+    return codec, path.with_suffix("") if codec else path
+
+
+def detect_codec(file: BinaryIO) -> Optional[Codec]:
+    start = file.read(max((len(codec.magic) for codec in codecs.values()), default=0))
+    file.seek(0)
+    return next((codec for codec in codecs.values() if start.startswith(codec.magic)), None)
+
+
+def write_artifact_file(
+    obj: Any, path: Path, compression: Optional[str] = None, compression_level: Optional[int] = None
+) -> None:
+    """
+    Writes an object to `path`, using the format registered for the path's extension when it accepts the object.
+    The object is written to a temporary file that then replaces `path`, so any existing file is never modified in
+    place: memory-mapped views of it and hard links to it (from the step cache) keep their contents.
+
+    :param obj:
+    :param path: When it ends with the extension of a registered codec, e.g. "data.parquet.zst", the file is
+    compressed with that codec and its format is picked by the extension before, e.g. ".parquet"
+    :param compression: The name of the codec the file is compressed with, unless its extension picks one
+    :param compression_level: The compression level, defaults to the codec's default level
+    """
+    codec, format_path = split_codec(path)
+    if codec is None and compression is not None:
+        if compression not in codecs:
+            raise ValueError(f"Unknown compression {compression}, it must be one of {sorted(codecs)}")
+        codec = codecs[compression]
+    artifact_format = get_format(format_path)
+
+    temporary_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+
+    def write_temporary_file(dump: Callable[[Any, BinaryIO], None]) -> None:
+        # Opening the file truncates whatever a failed attempt left in it
+        with open(temporary_path, "wb") as wb:
+            file: BinaryIO = wb
+            if codec:
+                file = codec.open_writer(wb, codec.default_level if compression_level is None else compression_level)
+            try:
+                dump(obj, file)
+            finally:
+                if codec:
+                    file.close()
+
+    try:
+        if artifact_format and (artifact_format.accepts is None or artifact_format.accepts(obj)):
+            try:
+                write_temporary_file(artifact_format.dump)
+            except Exception as error:
+                # e.g. data frames with columns of mixed types can't be converted to Arrow, `read_artifact_file`
+                # reads the pickle back since it doesn't start with the format's magic bytes
+                logger.warning(f"Could not write {path.name} in the {format_path.suffix} format, pickling it: {error}")
+                write_temporary_file(_dump_pickle)
+        else:
+            write_temporary_file(_dump_pickle)
+        os.replace(temporary_path, path)
+    finally:
+        if temporary_path.exists():
+            temporary_path.unlink()
+
+
+def read_artifact_file(path: Path, memory_map: bool = False) -> Any:
+    """
+    Reads an object written by `write_artifact_file`, decompressing it if it was compressed
+
+    :param path:
+    :param memory_map: Whether to memory-map the file when its format supports it, instead of reading it into memory.
+    Compressed files are never memory-mapped
+    :return:
+    """
+    _, format_path = split_codec(path)
+    artifact_format = get_format(format_path)
+    with open(path, "rb") as rb:
+        codec = detect_codec(rb)
+        if codec is None:
+            if artifact_format and (artifact_format.magic is None or is_format(rb, artifact_format.magic)):
+                if memory_map and artifact_format.load_mapped:
+                    return artifact_format.load_mapped(path)
+                return artifact_format.load(rb)
+            return pickle.load(rb)
+
+        with codec.open_reader(rb) as reader:
+            if artifact_format is None:
+                return pickle.load(reader)
+            # The formats may need to seek, which decompressing streams can't do
+            contents = io.BytesIO(reader.read())
+            if artifact_format.magic is None or is_format(contents, artifact_format.magic):
+                return artifact_format.load(contents)
+            return pickle.load(contents)
+
+
+def measure_artifact_file(path: Path) -> Dict[str, Any]:
+    """
+    Measures how well an artifact file is compressed, by decompressing it
+
+    :param path:
+    :return: The name of the codec it is compressed with (or `None`), its size on disk and decompressed, in bytes, and
+    the time taken to decompress it, in seconds
+    """
+    with open(path, "rb") as rb:
+        codec = detect_codec(rb)
+        start = time.perf_counter()
+        uncompressed_size = 0
+        reader = codec.open_reader(rb) if codec else rb
+        for chunk in iter(lambda: reader.read(1024 * 1024), b""):
+            uncompressed_size += len(chunk)
+        decompression_time = time.perf_counter() - start if codec else 0.0
+    codec_name = next((name for name, registered in codecs.items() if registered is codec), None)
+    return {
+        "codec": codec_name,
+        "size": path.stat().st_size,
+        "uncompressed_size": uncompressed_size,
+        "decompression_time": decompression_time,
+    }
+
+
+def is_format(file: BinaryIO, magic: bytes) -> bool:
+    start = file.read(len(magic))
+    file.seek(0)
+    return start == magic
+
+
+def as_product(path: Path) -> Any:
+    """
+    Wraps a path in a Ploomber `File`, the kind of product Ploomber hands to serializers and unserializers. Ploomber is
+    imported here, and not when this module is, so importing `cf_pipelines` stays cheap until products are read or
+    written
+
+    :param path:
+    :return:
+    """
+    from ploomber.products import File
+
+    return File(path)
+
+
+def import_ploomber() -> None:
+    """
+    Imports the parts of Ploomber products are read and written with. Called before forking worker processes: every
+    worker would otherwise pay for the import on its first step, while forked workers inherit the parent's modules
+    """
+    import ploomber.io  # noqa: F401
+    import ploomber.products  # noqa: F401
+
+
+def ploomber_serializer(function: Callable) -> Callable:
+    """
+    Turns a function into a Ploomber serializer, like decorating it with `ploomber.io.serializer()` would, but only
+    imports Ploomber and applies its decorator the first time the function is called
+
+    :param function: A function that takes the object to write and the product to write it to
+    :return:
+    """
+    decorated: Optional[Callable] = None
+
+    @wraps(function)
+    def serialize(obj: Any, product: Any) -> None:
+        nonlocal decorated
+        if decorated is None:
+            from ploomber.io import serializer
+
+            decorated = serializer()(function)
+        decorated(obj, product)
+
+    return serialize
+
+
+def ploomber_unserializer(function: Callable) -> Callable:
+    """
+    Turns a function into a Ploomber unserializer, like decorating it with `ploomber.io.unserializer()` would, but only
+    imports Ploomber and applies its decorator the first time the function is called
+
+    :param function: A function that takes the product to read
+    :return:
+    """
+    decorated: Optional[Callable] = None
+
+    @wraps(function)
+    def unserialize(product: Any) -> Any:
+        nonlocal decorated
+        if decorated is None:
+            from ploomber.io import unserializer
+
+            decorated = unserializer()(function)
+        return decorated(product)
+
+    return unserialize
+
+
+@ploomber_serializer
+def serialize_artifact(obj: Any, product: Any) -> None:
+    """
+    A Ploomber serializer that picks the format of each product from its file extension, see `register_format`
+    """
+    write_artifact_file(obj, Path(product))
+
+
+def compressed_serializer(compression: str, compression_level: Optional[int] = None) -> Callable:
+    """
+    Creates a Ploomber serializer like `serialize_artifact` that compresses every product, see `write_artifact_file`
+
+    :param compression: The name of the codec
+    :param compression_level: The compression level, defaults to the codec's default level
+    :return:
+    """
+    if compression not in codecs:
+        raise ValueError(f"Unknown compression {compression}, it must be one of {sorted(codecs)}")
+
+    @ploomber_serializer
+    def serialize_compressed_artifact(obj: Any, product: Any) -> None:
+        write_artifact_file(obj, Path(product), compression, compression_level)
+
+    return cast(Callable, serialize_compressed_artifact)
+
+
+@ploomber_unserializer
+def unserialize_artifact(product: Any) -> Any:
+    """
+    A Ploomber unserializer that reads the products written by `serialize_artifact`, decompressing them if needed
+    """
+    return read_artifact_file(Path(product))
+
+
+@ploomber_unserializer
+def unserialize_memory_mapped(product: Any) -> Any:
+    """
+    A Ploomber unserializer like `unserialize_artifact`, but memory-maps the products whose format supports it (.npy
+    and .arrow files) and returns read-only, zero-copy views of them
+    """
+    return read_artifact_file(Path(product), memory_map=True)
+
+
+# The types are looked up in the modules already imported, an object can't be a data frame if pandas was never imported
+
+
+def is_data_frame(obj: Any) -> bool:
+    return isinstance(obj, getattr(sys.modules.get("pandas"), "DataFrame", ()))
+
+
+@lru_cache(maxsize=None)
+def is_installed(*modules: str) -> bool:
+    """
+    Tells whether any of the modules can be imported, without importing them
+
+    :param modules: The names of top-level modules
+    :return:
+    """
+    return any(importlib.util.find_spec(module) is not None for module in modules)
+
+
+def is_parquet_data_frame(obj: Any) -> bool:
+    # pandas writes parquet files with either engine
+    return is_data_frame(obj) and is_installed("pyarrow", "fastparquet")
+
+
+def is_feather_data_frame(obj: Any) -> bool:
+    return is_data_frame(obj) and is_installed("pyarrow")
+
+
+def is_array(obj: Any) -> bool:
+    return isinstance(obj, getattr(sys.modules.get("numpy"), "ndarray", ())) and not obj.dtype.hasobject
+
+
+def is_arrow_table(obj: Any) -> bool:
+    return isinstance(obj, getattr(sys.modules.get("pyarrow"), "Table", ()))
+
+
+def _dump_pickle(obj: Any, file: BinaryIO) -> None:
+    pickle.dump(obj, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _dump_parquet(obj: Any, file: BinaryIO) -> None:
+    obj.to_parquet(file)
+
+
+def _load_parquet(file: BinaryIO) -> Any:
+    import pandas
+
+    return pandas.read_parquet(file)
+
+
+def _dump_feather(obj: Any, file: BinaryIO) -> None:
+    obj.to_feather(file)
+
+
+def _load_feather(file: BinaryIO) -> Any:
+    import pandas
+
+    return pandas.read_feather(file)
+
+
+def _dump_npy(obj: Any, file: BinaryIO) -> None:
+    import numpy
+
+    numpy.save(file, obj, allow_pickle=False)
+
+
+def _load_npy(file: BinaryIO) -> Any:
+    import numpy
+
+    return numpy.load(file, allow_pickle=False)
+
+
+def _load_npy_mapped(path: Path) -> Any:
+    import numpy
+
+    return numpy.load(path, mmap_mode="r", allow_pickle=False)
+
+
+def _dump_arrow(obj: Any, file: BinaryIO) -> None:
+    import pyarrow
+
+    with pyarrow.ipc.new_file(file, obj.schema) as writer:
+        writer.write_table(obj)
+
+
+def _load_arrow(file: BinaryIO) -> Any:
+    import pyarrow
+
+    return pyarrow.ipc.open_file(file).read_all()
+
+
+def _load_arrow_mapped(path: Path) -> Any:
+    import pyarrow
+
+    return pyarrow.ipc.open_file(pyarrow.memory_map(str(path), "r")).read_all()
+
+
+register_format(".parquet", _dump_parquet, _load_parquet, accepts=is_parquet_data_frame, magic=b"PAR1")
+register_format(".feather", _dump_feather, _load_feather, accepts=is_feather_data_frame, magic=b"ARROW1")
+register_format(".npy", _dump_npy, _load_npy, accepts=is_array, magic=b"\x93NUMPY", load_mapped=_load_npy_mapped)
+register_format(
+    ".arrow", _dump_arrow, _load_arrow, accepts=is_arrow_table, magic=b"ARROW1", load_mapped=_load_arrow_mapped
+)
+
+
+def _open_gzip_writer(file: BinaryIO, level: int) -> BinaryIO:
+    return cast(BinaryIO, gzip.GzipFile(fileobj=file, mode="wb", compresslevel=level))
+
+
+def _open_gzip_reader(file: BinaryIO) -> BinaryIO:
+    return cast(BinaryIO, gzip.GzipFile(fileobj=file, mode="rb"))
+
+
+def _open_zstd_writer(file: BinaryIO, level: int) -> BinaryIO:
+    import zstandard
+
+    return cast(BinaryIO, zstandard.ZstdCompressor(level=level).stream_writer(file, closefd=False))
+
+
+def _open_zstd_reader(file: BinaryIO) -> BinaryIO:
+    import zstandard
+
+    reader = zstandard.ZstdDecompressor().stream_reader(file, closefd=False)
+    return cast(BinaryIO, io.BufferedReader(cast(io.RawIOBase, reader)))
+
+
+def _open_lz4_writer(file: BinaryIO, level: int) -> BinaryIO:
+    import lz4.frame
+
+    return cast(BinaryIO, lz4.frame.LZ4FrameFile(file, mode="wb", compression_level=level))
+
+
+def _open_lz4_reader(file: BinaryIO) -> BinaryIO:
+    import lz4.frame
+
+    return cast(BinaryIO, lz4.frame.LZ4FrameFile(file, mode="rb"))
+
+
+# zstd and lz4 need the zstandard and lz4 packages, which are only imported when a file is compressed with them
+register_codec("gzip", ".gz", _open_gzip_writer, _open_gzip_reader, default_level=6, magic=b"\x1f\x8b")
+register_codec("zstd", ".zst", _open_zstd_writer, _open_zstd_reader, default_level=3, magic=b"\x28\xb5\x2f\xfd")
+register_codec("lz4", ".lz4", _open_lz4_writer, _open_lz4_reader, default_level=0, magic=b"\x04\x22\x4d\x18")
@@ -0,0 +1,198 @@
+import inspect
+import os
+import sys
+from itertools import accumulate, chain
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from cf_pipelines.base.helper_classes import CompiledStep
+from cf_pipelines.base.plan import compile_plan
+from cf_pipelines.base.utils import remove_extension
+
+if TYPE_CHECKING:
+    from cf_pipelines.base.pipeline import Pipeline
+
+
+class CompiledFunction:
+    """
+    The steps of a `Pipeline` needed to generate some of its products from some given inputs, compiled into a
+    function that runs them in-process, one after the other. The products are handed from one step to the next as
+    Python objects, so nothing is read from or written to disk, and where each step gets its inputs from is resolved
+    once, when the function is compiled, so a call only costs as much as the bodies of the steps. The hooks of the
+    pipeline are not called. See `Pipeline.as_function`.
+
+    Attributes
+    ---------
+    inputs: tuple
+        The names of the values the function is called with, either products of the pipeline, whose steps are then not
+        run, or arguments the steps need
+    outputs: tuple
+        The names of the products the function returns
+    steps: tuple
+        The `CompiledStep` of each step run, in the order they run
+    constants: dict
+        The extra arguments and environment variables the steps need, read when the function was compiled
+    """
+
+    def __init__(
+        self,
+        inputs: Tuple[str, ...],
+        outputs: Tuple[str, ...],
+        steps: Tuple[CompiledStep, ...],
+        constants: Dict[str, Any],
+    ):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.steps = steps
+        self.constants = constants
+        self.input_names = frozenset(inputs)
+
+    def __call__(self, **inputs: Any) -> Dict[str, Any]:
+        """
+        Runs the steps for a single request
+
+        :param inputs: The values of every name in `inputs`
+        :return: The names of the `outputs` mapped to their values
+        """
+        if inputs.keys() != self.input_names:
+            raise TypeError(f"Expected the inputs {sorted(self.input_names)}, got {sorted(inputs)}")
+        values = {**self.constants, **inputs}
+        for step in self.steps:
+            returns = step.python_function(**{argument: values[argument] for argument in step.arguments})
+            for file_name, value in returns.items():
+                values[step.products[file_name]] = value
+        return {output: values[output] for output in self.outputs}
+
+    def call_batch(
+        self, requests: Sequence[Mapping[str, Any]], shared: Optional[Mapping[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Runs the steps once for many requests, instead of once per request. The inputs of every request are
+        concatenated into a single batch, and each output is split back into one value per request, so the steps
+        must generate one row of each output for each row of their inputs. Data frames, series, numpy arrays and lists
+        can be batched
+
+        :param requests: The inputs that take different values in each request, all of the same length within a
+        request
+        :param shared: The inputs that take the same value for every request, such as a model
+        :return: The outputs of each request, in the same order as `requests`
+        """
+        if not requests:
+            return []
+        shared = shared or {}
+        batched = list(requests[0])
+        lengths = [len(request[batched[0]]) if batched else 0 for request in requests]
+        for request, length in zip(requests, lengths):
+            if list(request) != batched:
+                raise ValueError(f"Every request must have the inputs {batched}, got {list(request)}")
+            if any(len(value) != length for value in request.values()):
+                raise ValueError("The inputs of a request must all be of the same length")
+
+        returns = self(**shared, **{name: concatenate([request[name] for request in requests]) for name in batched})
+        batch_length = sum(lengths)
+        for output, value in returns.items():
+            if len(value) != batch_length:
+                raise ValueError(f"The output {output} has {len(value)} rows, one for each of {batch_length} expected")
+        splits = {output: split(value, lengths) for output, value in returns.items()}
+        return [{output: splits[output][position] for output in returns} for position in range(len(requests))]
+
+
+def compile_function(pipeline: "Pipeline", inputs: Sequence[str], outputs: Sequence[str]) -> CompiledFunction:
+    """
+    Compiles the steps needed to generate some products of a pipeline into an in-process function, see
+    `CompiledFunction`
+
+    :param pipeline:
+    :param inputs: The names of the products, with or without their extension, or of the arguments the function is
+    called with
+    :param outputs: The names of the products the function returns, with or without their extension
+    :return:
+    :raises KeyError: When an input is neither a product nor an argument of a step, or an output is not a product
+    :raises ValueError: When one of the steps needed can't be run in-process
+    """
+    input_names = tuple(remove_extension(name) for name in inputs)
+    # The inputs don't have to be available as extra arguments, they are given on every call
+    plan = compile_plan(pipeline, provided=set(input_names))
+    arguments = {binding.name for bindings in plan.inputs.values() for binding in bindings}
+    for name in input_names:
+        if name not in pipeline.product_lineages and name not in arguments:
+            raise KeyError(f"The input {name} is neither a product of {pipeline.name} nor an argument of its steps")
+    output_names = tuple(remove_extension(name) for name in outputs)
+    for name in output_names:
+        if name not in pipeline.product_lineages:
+            raise KeyError(f"The product {name} is not generated by any step in {pipeline.name}")
+
+    required_functions: Set[str] = set()
+    pending = [pipeline.product_lineages[name].produced_by for name in output_names if name not in input_names]
+    while pending:
+        function_name = pending.pop()
+        if function_name in required_functions:
+            continue
+        required_functions.add(function_name)
+        pending.extend(
+            binding.produced_by
+            for binding in plan.inputs[function_name]
+            if binding.produced_by is not None and binding.name not in input_names
+        )
+
+    steps = []
+    constants = {}
+    for function_name in plan.order:
+        if function_name not in required_functions:
+            continue
+        function_details = pipeline.function_details[function_name]
+        if function_details.writes_own_products or function_details.asynchronous:
+            raise ValueError(
+                f"The step {function_name} streams, partitions or awaits its products, so it can't be run in-process"
+            )
+        for binding in plan.inputs[function_name]:
+            if binding.produced_by is not None or binding.name in input_names:
+                continue
+            if binding.environment_variable is not None and binding.environment_variable in os.environ:
+                constants[binding.name] = os.environ[binding.environment_variable]
+            else:
+                constants[binding.name] = pipeline.extra_arguments[binding.name]
+        steps.append(
+            CompiledStep(
+                function_name,
+                # The original function, the wrapper would resolve its inputs again on every call
+                inspect.unwrap(function_details.python_function),
+                tuple(binding.name for binding in plan.inputs[function_name]),
+                {
+                    pipeline.product_lineages[product_name].file_name: product_name
+                    for product_name in function_details.produces
+                },
+            )
+        )
+    return CompiledFunction(input_names, output_names, tuple(steps), constants)
+
+
+def concatenate(values: List[Any]) -> Any:
+    """
+    Concatenates the values of an input of many requests into a single batch
+
+    :param values: Data frames, series, numpy arrays or lists
+    :return:
+    """
+    first = values[0]
+    pandas = sys.modules.get("pandas")
+    if pandas is not None and isinstance(first, (pandas.DataFrame, pandas.Series)):
+        return pandas.concat(values)
+    numpy = sys.modules.get("numpy")
+    if numpy is not None and isinstance(first, numpy.ndarray):
+        return numpy.concatenate(values)
+    if isinstance(first, list):
+        return list(chain.from_iterable(values))
+    raise TypeError(f"Only data frames, series, numpy arrays and lists can be batched, got {type(first)}")
+
+
+def split(value: Any, lengths: List[int]) -> List[Any]:
+    """
+    Splits an output of a batch back into one value for each request
+
+    :param value: A data frame, series, numpy array or list
+    :param lengths: The number of rows of each request
+    :return:
+    """
+    rows = getattr(value, "iloc", value)
+    ends = list(accumulate(lengths))
+    return [rows[end - length : end] for length, end in zip(lengths, ends)]
@@ -0,0 +1,114 @@
+import mmap
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from cf_pipelines.base.memory import InMemoryArtifacts
+
+if TYPE_CHECKING:
+    from cf_pipelines.base.pipeline import Pipeline
+
+# The buffers are aligned so the arrays mapped onto them can be used with vectorised instructions
+_ALIGNMENT = 64
+_HEADER_SIZE = 8
+
+
+class SharedArtifacts(InMemoryArtifacts):
+    """
+    Holds the products generated during a run in shared memory, so they can be handed from one worker process to the
+    next without being serialized to disk or copied through a pipe.
+
+    Each product is pickled into a file in shared memory (in /dev/shm when available), keeping the buffers of the
+    arrays it holds, such as numpy arrays and the columns of pandas data frames, out of the pickle stream. The steps
+    that need the product memory-map the file and get arrays backed by the mapped buffers, so they are never copied.
+    The mapping is private to each process: a step that modifies an array it received only changes its own copy.
+
+    Attributes
+    ---------
+    pipeline: Pipeline
+        The pipeline being run
+    background_persist: bool
+        When true, every product is also written to disk. As the products are generated in different processes,
+        they are written right away by the process that generated them, instead of by a background thread
+    directory: Path
+        The folder holding the products, it is removed when the run is done
+    """
+
+    def __init__(self, pipeline: "Pipeline", background_persist: bool = False):
+        super().__init__(pipeline)
+        self.background_persist = background_persist
+        shared_memory = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        self.directory = Path(tempfile.mkdtemp(prefix=f"{pipeline.name}-", dir=shared_memory))
+
+    def get(self, product_name: str) -> Any:
+        if product_name in self.on_disk:
+            return self.pipeline.read_artifact(product_name)
+        # The products are loaded again every time, so changes made by a step never reach the next step in the process
+        return read_shared_file(Path(self.directory, product_name))
+
+    def put(self, function_name: str, returns: Dict[str, Any]) -> None:
+        """
+        Stores the products returned by a step in shared memory and persists them if needed
+
+        :param function_name: The name of the step that generated the products
+        :param returns: A mapping of product names (with no extension) to their values
+        """
+        for product_name, value in returns.items():
+            write_shared_file(value, Path(self.directory, product_name))
+            if self.is_persisted(function_name):
+                self.pipeline.write_artifact(product_name, value)
+
+    def discard(self, product_name: str) -> None:
+        Path(self.directory, product_name).unlink(missing_ok=True)
+
+    def close(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def write_shared_file(obj: Any, path: Path) -> None:
+    """
+    Pickles an object to `path`, writing the buffers that support it (see PEP 574) after the pickle stream instead of
+    inside it, so they can be memory-mapped by `read_shared_file`
+
+    :param obj:
+    :param path:
+    """
+    buffers: List[pickle.PickleBuffer] = []
+    stream = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raw_buffers = [buffer.raw() for buffer in buffers]
+    metadata = pickle.dumps((stream, [raw_buffer.nbytes for raw_buffer in raw_buffers]), protocol=5)
+
+    temporary_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(temporary_path, "wb") as wb:
+        wb.write(len(metadata).to_bytes(_HEADER_SIZE, "little"))
+        wb.write(metadata)
+        for raw_buffer in raw_buffers:
+            wb.write(bytes(-wb.tell() % _ALIGNMENT))
+            wb.write(raw_buffer)
+    os.replace(temporary_path, path)
+
+
+def read_shared_file(path: Path) -> Any:
+    """
+    Reads an object written by `write_shared_file`, its buffers are mapped copy-on-write onto the file
+
+    :param path:
+    :return:
+    """
+    with open(path, "rb") as rb:
+        mapped = mmap.mmap(rb.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    view = memoryview(mapped)
+    metadata_size = int.from_bytes(view[:_HEADER_SIZE], "little")
+    stream, buffer_sizes = pickle.loads(view[_HEADER_SIZE : _HEADER_SIZE + metadata_size])
+    offset = _HEADER_SIZE + metadata_size
+    buffers = []
+    for buffer_size in buffer_sizes:
+        offset += -offset % _ALIGNMENT
+        buffers.append(view[offset : offset + buffer_size])
+        offset += buffer_size
+    return pickle.loads(stream, buffers=buffers)
@@ -0,0 +1,102 @@
+import os
+import uuid
+from pathlib import Path
+from typing import Iterable, List, Set, Tuple
+
+from cf_pipelines.base.utils import hash_file
+
+
+class BlobStore:
+    """
+    A content-addressed store that keeps a single copy of every distinct artifact written by a pipeline. Each artifact
+    is stored once as a blob named after the hash of its contents, and the run folders hold hard links to the blobs at
+    the paths returned by `Pipeline.get_local_artifact_path`, so byte-identical artifacts written by different runs
+    (or different steps) take up disk space only once.
+
+    The artifacts are never modified in place: the pipeline removes an artifact before writing it again, both when it
+    writes it itself and when Ploomber calls its serializer (see `Pipeline.serialize_replacing`), so writing a product
+    never changes the blob it was linked to.
+
+    Attributes
+    ---------
+    location: Path
+        Where the blobs are stored. It must be in the same file system as the run folders, so they can be linked
+    """
+
+    def __init__(self, location: Path):
+        self.location = Path(location)
+
+    def get_blob_path(self, content_hash: str) -> Path:
+        return Path(self.location, content_hash[:2], content_hash)
+
+    def add(self, path: Path) -> bool:
+        """
+        Stores the file at `path` as a blob, replacing it with a link to the existing blob when its contents are
+        already stored
+
+        :param path:
+        :return: Whether the file was deduplicated, i.e. its contents were already stored
+        """
+        blob_path = self.get_blob_path(hash_file(path))
+        if blob_path.exists():
+            if os.path.samefile(blob_path, path):
+                return False
+            temporary_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+            try:
+                os.link(blob_path, temporary_path)
+                os.replace(temporary_path, path)
+            except OSError:
+                # The file is kept as it is when it can't be linked
+                if temporary_path.exists():
+                    temporary_path.unlink()
+                return False
+            return True
+
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(path, blob_path)
+        except FileExistsError:
+            # Another run stored the same contents in the meantime
+            return self.add(path)
+        except OSError:
+            pass
+        return False
+
+    def add_all(self, paths: Iterable[Path]) -> int:
+        """
+        Stores the files that exist among `paths`, see `add`
+
+        :param paths:
+        :return: The number of files that were deduplicated
+        """
+        return sum(self.add(path) for path in paths if path.is_file())
+
+    def get_file_ids(self) -> Set[Tuple[int, int]]:
+        """
+        Gets the device and inode numbers of every blob, which identify the files linked to them
+
+        :return:
+        """
+        file_ids = set()
+        for blob_path in self.location.glob("*/*"):
+            stat = blob_path.stat()
+            file_ids.add((stat.st_dev, stat.st_ino))
+        return file_ids
+
+    def prune(self) -> List[str]:
+        """
+        Removes the blobs no run folder (nor the step cache) links to anymore
+
+        :return: The hashes of the removed blobs
+        """
+        removed: List[str] = []
+        if not self.location.is_dir():
+            return removed
+        for prefix in os.scandir(self.location):
+            if not prefix.is_dir():
+                continue
+            for blob in os.scandir(prefix.path):
+                if blob.stat().st_nlink == 1:
+                    os.unlink(blob.path)
+                    removed.append(blob.name)
+        return removed
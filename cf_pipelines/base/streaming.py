@@ -0,0 +1,73 @@
+import pickle
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Dict, Iterable, Iterator
+
+if TYPE_CHECKING:
+    from cf_pipelines.base.pipeline import Pipeline
+
+
+class ChunkedArtifact:
+    """
+    A product generated in chunks by a streaming step (a step that yields its products instead of returning them).
+    The chunks are stored one after the other in the product's file, as uncompressed pickles whatever the pipeline's
+    `serializer` and `compression`, and are read back one at a time when iterating over it, so only a single chunk
+    needs to be in memory at once. It can be iterated over any number of times.
+
+    Attributes
+    ---------
+    path: Path
+        The file the chunks are stored in
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def __iter__(self) -> Iterator[Any]:
+        with open(self.path, "rb") as rb:
+            while True:
+                try:
+                    yield pickle.load(rb)
+                except EOFError:
+                    return
+
+    def __repr__(self) -> str:
+        return f"ChunkedArtifact({str(self.path)!r})"
+
+
+def write_chunks(pipeline: "Pipeline", function_name: str, chunks: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Consumes the chunks yielded by a streaming step, appending each one of them to its product's file as it arrives.
+    The files are backed up once the step is done, if there is a `File` client in the pipeline's `dag_clients`
+
+    :param pipeline: The pipeline the step belongs to
+    :param function_name: The name of the step
+    :param chunks: The dictionaries yielded by the step, mapping product names to chunks
+    :return: A mapping of the step's products to their `ChunkedArtifact`
+    """
+    produces = pipeline.function_details[function_name].produces
+    paths = {product_name: pipeline.get_local_artifact_path(product_name) for product_name in produces}
+    for path in paths.values():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            # The existing file may be hard linked from the step cache, so it can't be appended to
+            path.unlink()
+        path.touch()
+
+    files: Dict[str, IO[bytes]] = {}
+    try:
+        for chunk in chunks:
+            for product_name, value in chunk.items():
+                if product_name not in paths:
+                    raise ValueError(f"The product {product_name} yielded by {function_name} was not declared")
+                if product_name not in files:
+                    files[product_name] = open(paths[product_name], "ab")
+                pickle.dump(value, files[product_name], protocol=pickle.HIGHEST_PROTOCOL)
+                # Flushed right away so the chunks are readable as soon as the step is done
+                files[product_name].flush()
+    finally:
+        for file in files.values():
+            file.close()
+
+    for path in paths.values():
+        pipeline.upload_artifact(path)
+    return {product_name: ChunkedArtifact(path) for product_name, path in paths.items()}
@@ -0,0 +1,45 @@
+import itertools
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, AbstractSet, Any, Dict, List, Optional, Set
+
+from cf_pipelines.base.retention import RUN_ID_FORMAT
+
+if TYPE_CHECKING:
+    from cf_pipelines.base.pipeline import Pipeline
+
+# The pipeline running a sweep in parallel, inherited by the forked worker processes
+_sweeping_pipeline: Optional["Pipeline"] = None
+
+
+def expand_grid(param_grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """
+    Lists every combination of the values of the arguments in a grid
+
+    :param param_grid: The names of the arguments mapped to the values each one of them takes
+    :return: The combinations, as mappings of the names of the arguments to their values
+    """
+    return [dict(zip(param_grid, values)) for values in itertools.product(*param_grid.values())]
+
+
+def generate_run_ids(count: int) -> List[str]:
+    """
+    Generates the identifiers of the runs of a sweep, like `Pipeline.generate_run_id` does for a single run, a
+    microsecond apart from each other so they are all different
+
+    :param count:
+    :return:
+    """
+    started_at = datetime.now()
+    return [(started_at + timedelta(microseconds=index)).strftime(RUN_ID_FORMAT) for index in range(count)]
+
+
+def _run_combination(run_id: str, combination: Dict[str, Any], functions: Set[str], on_disk: AbstractSet[str]) -> None:
+    pipeline = _sweeping_pipeline
+    if pipeline is None:
+        raise RuntimeError("The worker process was not started by `Pipeline.run_sweep`")
+    # The worker processes can't start processes of their own
+    pipeline.run_combination(run_id, combination, functions, on_disk, executor="threads")
+    # The uploads started in this process must be done before it is reused or shut down
+    errors = pipeline.flush_uploads()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,96 @@
+import logging
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from threading import Lock
+from typing import Any, List, Optional
+from weakref import WeakSet
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundUploader:
+    """
+    Wraps a Ploomber storage client so the products are uploaded in the background, by a pool of threads, instead of
+    making the next step wait for the upload. Failed uploads are retried with an exponential backoff. Use it in place
+    of the client in `dag_clients`, e.g. `{File: BackgroundUploader(S3Client(...))}`, and `Pipeline.run` waits for all
+    the uploads to finish before returning. Any other attribute is taken from the wrapped client.
+
+    Attributes
+    ---------
+    client: AbstractStorageClient
+        The client that actually uploads the files
+    max_workers: int
+        The maximum number of files uploaded at the same time
+    retries: int
+        The number of times a failed upload is retried before giving up
+    retry_delay: float
+        The seconds to wait before retrying a failed upload for the first time, the wait doubles on every retry
+    """
+
+    def __init__(self, client: Any, max_workers: int = 4, retries: int = 3, retry_delay: float = 1.0):
+        self.client = client
+        self.max_workers = max_workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.reset()
+        uploaders.add(self)
+
+    def reset(self) -> None:
+        self.lock = Lock()
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.pending: List[Future] = []
+
+    def upload(self, local: Any) -> None:
+        """
+        Queues a file to be uploaded
+
+        :param local: The path of the file
+        """
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="uploader")
+            self.pending.append(self.executor.submit(self.upload_with_retries, local))
+
+    def upload_with_retries(self, local: Any) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                self.client.upload(local)
+                return
+            except Exception as exception:
+                if attempt == self.retries:
+                    raise
+                delay = self.retry_delay * 2**attempt
+                logger.warning(f"Failed to upload {local} ({exception!r}), retrying in {delay} seconds")
+                time.sleep(delay)
+
+    def flush(self) -> List[BaseException]:
+        """
+        Waits for all the queued uploads to finish
+
+        :return: The errors raised by the uploads that failed after all the retries
+        """
+        with self.lock:
+            pending, self.pending = self.pending, []
+        wait(pending)
+        errors = [future.exception() for future in pending]
+        return [error for error in errors if error is not None]
+
+    def __getattr__(self, attribute: str) -> Any:
+        if attribute == "client":
+            raise AttributeError(attribute)
+        return getattr(self.client, attribute)
+
+
+# Tracked weakly, so the uploaders are not kept alive by the hook below
+uploaders: "WeakSet[BackgroundUploader]" = WeakSet()
+
+
+def reset_uploaders() -> None:
+    for uploader in list(uploaders):
+        uploader.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    # The threads are not carried over to forked worker processes, which start with empty queues
+    os.register_at_fork(after_in_child=reset_uploaders)
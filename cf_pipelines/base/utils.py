@@ -1,34 +1,103 @@
 import ast
+import hashlib
 import inspect
+import os
+import shutil
 from ast import parse as parse_source
 from functools import update_wrapper
-from typing import Any, Callable, List, no_type_check
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, no_type_check
 
 
 @no_type_check
 def get_return_keys_from_function(function: Callable) -> List[str]:
     """
     Parses the source code of `function` in search for a return dict() statement. Useful to find the names of the
-    products a function returns.
+    products a function returns. For generator functions, the keys of all the dictionaries it yields are returned.
 
     :param function: The function to parse
     :return: A list with the keys of the return dictionary
     """
-    source = inspect.getsource(function)
-    function_source = parse_source(source)
+    function_definition = find_function_definition(function)
+    if function_definition is None:
+        source = inspect.getsource(function)
+        function_definition = parse_source(source).body[0]
 
-    # function_source.body[0].body[-1] refers to the last statement of the function's body, which for our purposes
+    if inspect.isgeneratorfunction(function):
+        return get_yield_keys_from_function_source(function, function_definition)
+
+    # function_definition.body[-1] refers to the last statement of the function's body, which for our purposes
     # should be a dictionary
-    if not isinstance(function_source.body[0].body[-1], ast.Return):
+    if not isinstance(function_definition.body[-1], ast.Return):
         raise ValueError(f"Function {function.__name__} does not have a return clause")
-    if not isinstance(function_source.body[0].body[-1].value, ast.Dict):
+    if not isinstance(function_definition.body[-1].value, ast.Dict):
         raise ValueError(f"Function {function.__name__} does not return a dictionary")
-    return_keys = [key.value for key in function_source.body[0].body[-1].value.keys]
+    return_keys = [key.value for key in function_definition.body[-1].value.keys]
     if not return_keys:
         raise ValueError(f"Function {function.__name__} does not return any value")
     return return_keys
 
 
+FunctionDefinition = Union[ast.FunctionDef, ast.AsyncFunctionDef]
+
+# The function definitions found in each source file, along with the modification time of the file when it was parsed
+_parsed_files: Dict[str, Tuple[int, Dict[int, FunctionDefinition]]] = {}
+
+
+def find_function_definition(function: Callable) -> Optional[ast.AST]:
+    """
+    Finds the definition of a function in the parsed source file it was defined in. Each file is parsed only once
+    (and again whenever it is modified), instead of tokenizing and parsing the source of every function on its own,
+    which makes registering many steps defined in the same file much cheaper.
+
+    :param function:
+    :return: The definition, or `None` when the function was not defined in a file, e.g. in an interactive session
+    """
+    code = getattr(function, "__code__", None)
+    if code is None:
+        return None
+    try:
+        modified_at = os.stat(code.co_filename).st_mtime_ns
+    except OSError:
+        return None
+
+    if code.co_filename not in _parsed_files or _parsed_files[code.co_filename][0] != modified_at:
+        try:
+            module = ast.parse(Path(code.co_filename).read_bytes())
+        except (SyntaxError, ValueError):
+            return None
+        definitions: Dict[int, FunctionDefinition] = {}
+        for node in ast.walk(module):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                # The first line of the code of a decorated function is that of its first decorator
+                definitions[min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])] = node
+        _parsed_files[code.co_filename] = (modified_at, definitions)
+
+    function_definition = _parsed_files[code.co_filename][1].get(code.co_firstlineno)
+    if function_definition is None or function_definition.name != code.co_name:
+        # The file was modified after the function was defined
+        return None
+    return function_definition
+
+
+@no_type_check
+def get_yield_keys_from_function_source(function: Callable, function_definition: ast.FunctionDef) -> List[str]:
+    """
+    Finds the keys of all the dictionaries yielded in the body of a generator function
+
+    :param function: The generator function
+    :param function_definition: The parsed source of `function`
+    :return: A list with the keys, in the order they first appear
+    """
+    yield_keys = []
+    for node in ast.walk(function_definition):
+        if isinstance(node, ast.Yield) and isinstance(node.value, ast.Dict):
+            yield_keys.extend(key.value for key in node.value.keys if key.value not in yield_keys)
+    if not yield_keys:
+        raise ValueError(f"Function {function.__name__} does not yield any dictionary")
+    return yield_keys
+
+
 def wrap_preserving_signature(wrapper_fn: Callable, inner_fn: Any) -> None:
     """
     Copies all the metadata from `inner_fn` to `wrapper_fn`, with the exception of `wrapper_fn`'s signature.
@@ -51,3 +120,46 @@ def remove_extension(file_name: str) -> str:
     :return:
     """
     return file_name.partition(".")[0]
+
+
+def hash_source(function: Callable) -> str:
+    """
+    Computes the SHA-256 hash of the source code of a function, unwrapping it first if it is decorated
+
+    :param function:
+    :return: The hexadecimal digest
+    """
+    source = inspect.getsource(inspect.unwrap(function))
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Computes the SHA-256 hash of the contents of a file, reading it in chunks
+
+    :param path:
+    :param chunk_size: The number of bytes read at a time
+    :return: The hexadecimal digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as rb:
+        for chunk in iter(lambda: rb.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(source: Path, destination: Path) -> None:
+    """
+    Hard links `source` to `destination`, falling back to copying it when links are not supported (for example, when
+    both paths are in different file systems). Any existing file at `destination` is replaced.
+
+    :param source:
+    :param destination:
+    """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    if destination.exists():
+        destination.unlink()
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
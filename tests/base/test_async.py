@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import pytest
+
+from cf_pipelines import Pipeline
+
+
+@pytest.fixture
+def pipeline(parse_indented, tmp_path):
+    pipeline = Pipeline("Async", location=tmp_path)
+
+    @pipeline.step("ingestion")
+    async def download_users():
+        await asyncio.sleep(0.3)
+        return {"users.pkl": ["ada", "grace"]}
+
+    @pipeline.step("ingestion")
+    async def download_orders():
+        await asyncio.sleep(0.3)
+        return {"orders.pkl": [3, 4]}
+
+    @pipeline.step("report")
+    def report(*, users, orders):
+        return {"report.pkl": dict(zip(users, orders))}
+
+    return pipeline
+
+
+@pytest.mark.parametrize("executor", ["serial", "threads", "processes"])
+def test_async_steps_run_concurrently(pipeline, tmp_path, read_pickle, executor):
+    pipeline.executor = executor
+    pipeline.max_workers = 1
+
+    start = time.monotonic()
+    pipeline.run()
+
+    assert time.monotonic() - start < 0.55
+    assert read_pickle(tmp_path / "default" / "report" / "report.pkl") == {"ada": 3, "grace": 4}
+
+
+def test_async_concurrency_limit(pipeline, tmp_path, read_pickle):
+    pipeline.async_concurrency = 1
+
+    start = time.monotonic()
+    pipeline.run()
+
+    assert time.monotonic() - start >= 0.6
+    assert read_pickle(tmp_path / "default" / "report" / "report.pkl") == {"ada": 3, "grace": 4}
+
+
+def test_async_steps_call_the_hooks(pipeline):
+    pipeline.in_memory = True
+    results = {}
+    pipeline.set_after_function(lambda function_name, returns, elapsed_time: results.update(returns))
+
+    pipeline.run()
+
+    assert results == {"users": ["ada", "grace"], "orders": [3, 4], "report": {"ada": 3, "grace": 4}}
+
+
+def test_async_steps_can_be_called_directly(pipeline):
+    assert asyncio.run(pipeline.function_details["download_orders"].python_function()) == {"orders": [3, 4]}
+
+
+def test_async_generators_are_not_supported(parse_indented):
+    pipeline = Pipeline("Async")
+
+    with pytest.raises(ValueError):
+
+        @pipeline.step("ingestion")
+        async def download():
+            yield {"rows.pkl": 1}
@@ -0,0 +1,95 @@
+import os
+from unittest.mock import patch
+
+import pytest
+from ploomber.clients import LocalStorageClient
+from ploomber.products import File
+
+from cf_pipelines import Pipeline
+
+
+@pytest.fixture
+def pipeline(parse_indented, tmp_path, calls):
+    pipeline = Pipeline("Cached", location=tmp_path, extra_args={"size": 4}, cache=True)
+
+    @pipeline.step("ingestion")
+    def ingest(*, size):
+        calls["ingest"] += 1
+        return {"numbers.pkl": list(range(int(size)))}
+
+    @pipeline.step("training")
+    def train(*, numbers):
+        calls["train"] += 1
+        return {"model.pkl": sum(numbers)}
+
+    return pipeline
+
+
+def run_ids(location):
+    return sorted(path.name for path in location.iterdir() if not path.name.startswith("."))
+
+
+def test_unchanged_steps_are_skipped(pipeline, tmp_path, read_pickle, calls):
+    pipeline.track_all = True
+
+    pipeline.run()
+    pipeline.run()
+
+    assert calls == {"ingest": 1, "train": 1}
+    first_run, second_run = run_ids(tmp_path)
+    assert read_pickle(tmp_path / second_run / "ingestion" / "numbers.pkl") == [0, 1, 2, 3]
+    assert read_pickle(tmp_path / second_run / "training" / "model.pkl") == 6
+
+
+def test_restored_products_are_uploaded(pipeline, tmp_path, read_pickle, calls):
+    pipeline.track_all = True
+    pipeline.run()
+    pipeline.dag_clients = {File: LocalStorageClient(tmp_path / "backup", path_to_project_root=tmp_path)}
+
+    pipeline.run()
+
+    assert calls == {"ingest": 1, "train": 1}
+    backup = tmp_path / "backup" / pipeline.current_run_id
+    assert read_pickle(backup / "ingestion" / "numbers.pkl") == [0, 1, 2, 3]
+    assert read_pickle(backup / "training" / "model.pkl") == 6
+
+
+def test_changed_arguments_invalidate_the_cache(pipeline, tmp_path, read_pickle, calls):
+    pipeline.track_all = True
+
+    pipeline.run()
+    with patch.dict(os.environ, {"CF_SIZE": "3"}):
+        pipeline.run()
+
+    assert calls == {"ingest": 2, "train": 2}
+    first_run, second_run = run_ids(tmp_path)
+    assert read_pickle(tmp_path / second_run / "training" / "model.pkl") == 3
+
+
+def test_unchanged_products_skip_downstream_steps(pipeline, calls):
+    pipeline.run()
+
+    @pipeline.step("ingestion")
+    def ingest(*, size):
+        # A different implementation that generates the same products
+        calls["ingest"] += 1
+        return {"numbers.pkl": [0, 1, 2, 3]}
+
+    pipeline.run()
+
+    assert calls == {"ingest": 2, "train": 1}
+
+
+def test_cache_in_memory(pipeline, calls):
+    pipeline.in_memory = True
+    results = {}
+
+    def after_function(function_name, returns, elapsed_time):
+        results.update(returns)
+
+    pipeline.run()
+    pipeline.set_after_function(after_function)
+    pipeline.run()
+
+    assert calls == {"ingest": 1, "train": 1}
+    assert not results
@@ -0,0 +1,141 @@
+import pytest
+
+from cf_pipelines import Pipeline
+from cf_pipelines.base.critical_path import (
+    analyse_critical_path,
+    estimate_durations,
+    format_report,
+    format_report_html,
+    simulate_run,
+)
+from cf_pipelines.base.helper_classes import StepMetrics
+from cf_pipelines.base.metrics import RunMetrics
+
+
+@pytest.fixture
+def pipeline(parse_indented, tmp_path):
+    pipeline = Pipeline("Diamond", location=tmp_path)
+
+    @pipeline.step("start")
+    def start():
+        return {"numbers.pkl": [1, 2, 3]}
+
+    @pipeline.step("branches")
+    def slow_sum(*, numbers):
+        return {"total.pkl": sum(numbers)}
+
+    @pipeline.step("branches")
+    def fast_max(*, numbers):
+        return {"maximum.pkl": max(numbers)}
+
+    @pipeline.step("end")
+    def end(*, total, maximum):
+        return {"report.txt": f"{total} {maximum}"}
+
+    return pipeline
+
+
+DURATIONS = {"start": 1.0, "slow_sum": 3.0, "fast_max": 1.0, "end": 2.0}
+
+
+def test_analyse_critical_path(pipeline):
+    plan = pipeline.compile()
+
+    report = analyse_critical_path(plan, DURATIONS, workers=[1, 2])
+
+    assert report.critical_path == ["start", "slow_sum", "end"]
+    assert report.earliest_starts == {"start": 0.0, "slow_sum": 1.0, "fast_max": 1.0, "end": 4.0}
+    assert report.latest_starts == {"start": 0.0, "slow_sum": 1.0, "fast_max": 3.0, "end": 4.0}
+    assert report.slack == {"start": 0.0, "slow_sum": 0.0, "fast_max": 2.0, "end": 0.0}
+    assert report.serial_time == 7.0
+    assert report.critical_path_time == 6.0
+    assert report.parallel_times == {1: 7.0, 2: 6.0}
+    assert report.unmeasured == []
+
+
+def test_unmeasured_steps_take_no_time(pipeline):
+    plan = pipeline.compile()
+
+    report = analyse_critical_path(plan, {"start": 1.0, "fast_max": 1.0, "end": 2.0})
+
+    assert report.unmeasured == ["slow_sum"]
+    assert report.critical_path == ["start", "fast_max", "end"]
+    assert report.slack["slow_sum"] == 1.0
+    assert report.critical_path_time == 4.0
+
+
+def test_simulate_run(pipeline):
+    plan = pipeline.compile()
+
+    assert simulate_run(plan, {**DURATIONS, "fast_max": 4.0}, 2) == 7.0
+    with pytest.raises(ValueError):
+        simulate_run(plan, DURATIONS, 0)
+
+
+def test_estimate_durations():
+    first_run = RunMetrics(
+        "Diamond",
+        "first",
+        {
+            "start": StepMetrics("start", started_at=0.0, ended_at=2.0, cache_hit=False),
+            "end": StepMetrics("end", started_at=2.0, ended_at=2.1, cache_hit=True),
+        },
+    )
+    second_run = RunMetrics(
+        "Diamond",
+        "second",
+        {
+            "start": StepMetrics("start", started_at=0.0, ended_at=4.0, cache_hit=False),
+            "end": StepMetrics("end", started_at=4.0, ended_at=4.5, cache_hit=True),
+            "never_ended": StepMetrics("never_ended", started_at=4.0),
+        },
+    )
+    third_run = RunMetrics(
+        "Diamond", "third", {"start": StepMetrics("start", started_at=0.0, ended_at=0.1, cache_hit=True)}
+    )
+
+    durations = estimate_durations([first_run, second_run, third_run])
+
+    assert durations == {"start": 3.0, "end": pytest.approx(0.3)}
+
+
+def test_summaries_from_past_runs(pipeline):
+    pipeline.track_all = True
+    pipeline.run()
+    pipeline.run()
+
+    report = pipeline.analyse_critical_path(workers=[2])
+    text = pipeline.summarise_critical_path(workers=[2])
+    html = pipeline.summarise_critical_path(html=True)
+
+    assert report.run_count == 2
+    assert set(report.durations) == {"start", "slow_sum", "fast_max", "end"}
+    assert report.critical_path[0] == "start"
+    assert report.critical_path[-1] == "end"
+    assert text.startswith("Critical path of Diamond (from 2 runs)")
+    assert "2 workers" in text
+    assert "end *" in text
+    assert '<tr class="critical"><td>start</td>' in html
+
+
+def test_no_timings_recorded(pipeline):
+    with pytest.raises(ValueError, match="no timings"):
+        pipeline.analyse_critical_path()
+
+
+def test_format_report(pipeline):
+    plan = pipeline.compile()
+    report = analyse_critical_path(plan, DURATIONS, workers=[2])
+    report.run_count = 3
+
+    text = format_report(report)
+    html = format_report_html(report, "<Diamond>")
+
+    assert text.splitlines()[:3] == [
+        "Critical path (from 3 runs)",
+        "Predicted run time: serial 7.00s, 2 workers 6.00s, unlimited workers 6.00s",
+        "Critical path: start -> slow_sum -> end",
+    ]
+    assert "fast_max        1.00s      1.00s      3.00s      2.00s" in text
+    assert "<h2>&lt;Diamond&gt;</h2>" in html
+    assert "<tr><td>fast_max</td><td>1.00</td><td>1.00</td><td>3.00</td><td>2.00</td></tr>" in html
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+CHECK_PLOOMBER = "print(any(module.split('.')[0] == 'ploomber' for module in sys.modules))"
+
+
+def run_python(code: str) -> str:
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip()
+
+
+def run_script(path: Path) -> str:
+    environment = {**os.environ, "PYTHONPATH": str(Path(__file__).parents[2])}
+    return subprocess.run(
+        [sys.executable, str(path)], capture_output=True, text=True, check=True, env=environment
+    ).stdout.strip()
+
+
+def test_ploomber_is_not_imported_to_register_steps():
+    code = f"""
+import sys
+from cf_pipelines import Pipeline
+
+pipeline = Pipeline("Lazy", extra_args={{"size": 3}})
+
+def ingest(*, size):
+    return {{"numbers.pkl": list(range(size))}}
+
+def train(*, numbers):
+    return {{"model.pkl": sum(numbers)}}
+
+pipeline.step("ingestion", produces=["numbers.pkl"])(ingest)
+pipeline.step("training", produces=["model.pkl"])(train)
+pipeline.compile()
+assert pipeline.as_function(inputs=["size"], outputs=["model"])(size=4) == {{"model": 6}}
+{CHECK_PLOOMBER}
+"""
+
+    assert run_python(code) == "False"
+
+
+def test_ploomber_is_imported_to_build_a_dag():
+    code = f"""
+import sys
+from cf_pipelines import Pipeline
+
+Pipeline("Lazy").make_dag()
+{CHECK_PLOOMBER}
+"""
+
+    assert run_python(code) == "True"
+
+
+def test_ploomber_is_imported_before_forking_workers(tmp_path):
+    # The steps' source is hashed, so they have to be defined in a file
+    script = tmp_path / "forked.py"
+    script.write_text(
+        f"""
+import pickle
+import sys
+from cf_pipelines import Pipeline
+
+pipeline = Pipeline("Forked", location={str(tmp_path)!r}, executor="processes", max_workers=2)
+
+@pipeline.step("ingestion", produces=["imported.pkl"])
+def ingest():
+    return {{"imported.pkl": "ploomber.products" in sys.modules and "ploomber.io" in sys.modules}}
+
+pipeline.run()
+with open({str(tmp_path / "default" / "ingestion" / "imported.pkl")!r}, "rb") as file:
+    print(pickle.load(file))
+"""
+    )
+
+    assert run_script(script) == "True"
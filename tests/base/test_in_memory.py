@@ -0,0 +1,181 @@
+import gc
+import sys
+import time
+import weakref
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+import pytest
+from ploomber.io import serializer_pickle, unserializer_pickle
+
+from cf_pipelines import Pipeline
+from cf_pipelines.base.memory import InMemoryArtifacts, estimate_size
+
+
+@pytest.fixture
+def counting_serializers():
+    return MagicMock(wraps=serializer_pickle), MagicMock(wraps=unserializer_pickle)
+
+
+@pytest.fixture
+def pipeline(parse_indented, tmp_path):
+    pipeline = Pipeline("In memory", location=tmp_path, in_memory=True)
+
+    @pipeline.step("step_1")
+    def hello():
+        return {"artifact_1.txt": "Hello"}
+
+    @pipeline.step("step_2")
+    def world():
+        return {"artifact_2.txt": "World"}
+
+    @pipeline.step("step_3", persist=True)
+    def mix(*, artifact_1, artifact_2):
+        return {"end.txt": artifact_1 + " " + artifact_2 + "!"}
+
+    return pipeline
+
+
+def test_only_persisted_products_are_written(pipeline, tmp_path, read_pickle, counting_serializers):
+    serializer, unserializer = counting_serializers
+    pipeline.serializer = serializer
+    pipeline.unserializer = unserializer
+
+    pipeline.run()
+
+    assert read_pickle(tmp_path / "default" / "step_3" / "end.txt") == "Hello World!"
+    assert not (tmp_path / "default" / "step_1" / "artifact_1.txt").exists()
+    assert not (tmp_path / "default" / "step_2" / "artifact_2.txt").exists()
+    assert serializer.call_count == 1
+    assert unserializer.call_count == 0
+
+
+def test_products_are_handed_in_memory(pipeline):
+    pipeline.executor = "threads"
+    results = {}
+
+    def after_function(function_name, returns, elapsed_time):
+        results.update(returns)
+
+    pipeline.set_after_function(after_function)
+    pipeline.run()
+
+    assert results == {"artifact_1": "Hello", "artifact_2": "World", "end": "Hello World!"}
+
+
+def test_background_persist_writes_every_product(pipeline, tmp_path, read_pickle, counting_serializers):
+    serializer, unserializer = counting_serializers
+    pipeline.background_persist = True
+    pipeline.serializer = serializer
+    pipeline.unserializer = unserializer
+
+    pipeline.run()
+
+    assert read_pickle(tmp_path / "default" / "step_1" / "artifact_1.txt") == "Hello"
+    assert read_pickle(tmp_path / "default" / "step_2" / "artifact_2.txt") == "World"
+    assert read_pickle(tmp_path / "default" / "step_3" / "end.txt") == "Hello World!"
+    assert unserializer.call_count == 0
+
+
+def test_background_persist_writes_products_before_they_are_modified(parse_indented, tmp_path, read_pickle):
+    pipeline = Pipeline("In memory", location=tmp_path, in_memory=True, background_persist=True)
+
+    def slow_serializer(obj, product):
+        time.sleep(0.2)
+        serializer_pickle(obj, product)
+
+    pipeline.serializer = slow_serializer
+
+    @pipeline.step("ingestion")
+    def ingest():
+        return {"numbers.pkl": [1, 2, 3]}
+
+    @pipeline.step("training")
+    def train(*, numbers):
+        numbers.append(4)
+        return {"model.pkl": sum(numbers)}
+
+    pipeline.run()
+
+    assert read_pickle(tmp_path / "default" / "ingestion" / "numbers.pkl") == [1, 2, 3]
+    assert read_pickle(tmp_path / "default" / "training" / "model.pkl") == 10
+
+
+def test_in_memory_with_processes(pipeline, tmp_path, read_pickle):
+    pipeline.executor = "processes"
+
+    pipeline.run()
+
+    assert read_pickle(tmp_path / "default" / "step_3" / "end.txt") == "Hello World!"
+    assert not (tmp_path / "default" / "step_1" / "artifact_1.txt").exists()
+
+
+class Product:
+    pass
+
+
+def test_products_are_released_after_their_last_consumer(parse_indented, tmp_path):
+    pipeline = Pipeline("Released", location=tmp_path, in_memory=True, executor="threads", max_workers=1)
+    references = {}
+    alive_in_last_step = {}
+
+    @pipeline.step("step_1")
+    def first():
+        product = Product()
+        references["first"] = weakref.ref(product)
+        return {"first.pkl": product}
+
+    @pipeline.step("step_2")
+    def second(*, first):
+        return {"second.pkl": [first]}
+
+    @pipeline.step("step_3")
+    def third(*, second):
+        second.clear()
+        gc.collect()
+        alive_in_last_step["first"] = references["first"]() is not None
+        return {"third.pkl": 3}
+
+    pipeline.run()
+
+    assert alive_in_last_step == {"first": False}
+
+
+def test_release_counts_consumers(pipeline):
+    artifacts = InMemoryArtifacts(pipeline)
+    artifacts.count_consumers(pipeline.function_details)
+    artifacts.put("hello", {"artifact_1": "Hello"})
+    artifacts.put("world", {"artifact_2": "World"})
+
+    assert artifacts.release("hello") == []
+    assert artifacts.release("world") == []
+    assert sorted(artifacts.release("mix")) == ["artifact_1", "artifact_2", "end"]
+    assert artifacts.values == {}
+
+
+def test_memory_budget_spills_products_to_disk(parse_indented, tmp_path, read_pickle):
+    pipeline = Pipeline("Budget", location=tmp_path, in_memory=True, executor="threads", memory_budget=1500)
+
+    @pipeline.step("step_1")
+    def produce():
+        return {"first.pkl": np.zeros(1000, dtype=np.uint8), "second.pkl": np.ones(1000, dtype=np.uint8)}
+
+    @pipeline.step("step_2", persist=True)
+    def total(*, first, second):
+        return {"total.pkl": int(first.sum() + second.sum())}
+
+    pipeline.run()
+
+    assert read_pickle(tmp_path / "default" / "step_2" / "total.pkl") == 1000
+    assert (tmp_path / "default" / "step_1" / "first.pkl").exists()
+    assert not (tmp_path / "default" / "step_1" / "second.pkl").exists()
+
+
+def test_estimate_size():
+    data_frame = pd.DataFrame({"a": np.zeros(100, dtype=np.int64), "b": ["text"] * 100})
+
+    assert estimate_size(np.zeros(100, dtype=np.int64)) == 800
+    assert estimate_size(data_frame) == data_frame.memory_usage(deep=True).sum()
+    assert estimate_size(data_frame["a"]) == data_frame["a"].memory_usage(deep=True)
+    assert estimate_size(b"bytes") == sys.getsizeof(b"bytes")
@@ -0,0 +1,46 @@
+import pytest
+
+from cf_pipelines import Pipeline
+from cf_pipelines.base.lazy import LazyArtifact, is_loaded, unwrap_artifact
+
+
+def test_artifact_is_loaded_on_first_use():
+    loads = []
+    artifact = LazyArtifact("numbers", lambda: loads.append(1) or [3, 1, 2])
+
+    assert not is_loaded(artifact)
+    assert sorted(artifact) == [1, 2, 3]
+    assert artifact.count(1) == 1
+    assert artifact + [4] == [3, 1, 2, 4]
+    assert is_loaded(artifact)
+    assert loads == [1]
+
+
+def test_unwrap_artifact():
+    artifact = LazyArtifact("text", lambda: "hello")
+
+    assert unwrap_artifact(artifact) == "hello"
+    assert type(unwrap_artifact(artifact)) is str
+    assert unwrap_artifact("not lazy") == "not lazy"
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_lazy_step_reports_untouched_inputs(parse_indented, tmp_path, in_memory):
+    pipeline = Pipeline("Lazy", location=tmp_path, in_memory=in_memory)
+    received = {}
+
+    @pipeline.step("ingestion")
+    def ingest():
+        return {"small.pkl": [1, 2], "large.pkl": list(range(1000))}
+
+    @pipeline.step("training", lazy=True)
+    def train(*, small, large):
+        received["small"] = small
+        received["large"] = large
+        return {"model.pkl": sum(small)}
+
+    pipeline.run()
+
+    assert isinstance(received["large"], LazyArtifact)
+    assert not is_loaded(received["large"])
+    assert pipeline.untouched_inputs == {"train": {"large"}}
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from cf_pipelines import Pipeline
+from cf_pipelines.base.metrics import RunMetrics, compare_runs
+
+
+@pytest.fixture
+def pipeline(parse_indented, tmp_path):
+    pipeline = Pipeline("Metrics", location=tmp_path)
+
+    @pipeline.step("ingestion")
+    def ingest():
+        return {"numbers.pkl": list(range(10))}
+
+    @pipeline.step("training")
+    def train(*, numbers):
+        return {"model.pkl": sum(numbers)}
+
+    return pipeline
+
+
+@pytest.mark.parametrize("executor", ["serial", "threads", "processes"])
+def test_metrics_are_saved_for_each_run(pipeline, tmp_path, executor):
+    pipeline.executor = executor
+
+    pipeline.run()
+
+    content = json.loads((tmp_path / "default" / "metrics.json").read_text())
+    assert content["pipeline_name"] == "Metrics"
+    metrics = pipeline.load_run_metrics()
+    assert set(metrics.steps) == {"ingest", "train"}
+    for step_metrics in metrics.steps.values():
+        assert step_metrics.compute_time >= 0
+        assert step_metrics.ended_at >= step_metrics.started_at
+    assert (
+        metrics.steps["train"].product_sizes["model"]
+        == (tmp_path / "default" / "training" / "model.pkl").stat().st_size
+    )
+    if executor != "serial":
+        assert metrics.steps["train"].queue_wait >= 0
+        assert metrics.steps["train"].unserialize_time >= 0
+        assert metrics.steps["train"].serialize_time >= 0
+
+
+def test_cache_hits_are_recorded(pipeline):
+    pipeline.cache = True
+
+    pipeline.run()
+    assert pipeline.load_run_metrics().steps["ingest"].cache_hit is False
+    pipeline.run()
+    assert pipeline.load_run_metrics().steps["ingest"].cache_hit is True
+
+
+def test_compare_runs(pipeline, tmp_path):
+    pipeline.track_all = True
+
+    pipeline.run()
+    first_run = pipeline.current_run_id
+    pipeline.run()
+
+    differences = compare_runs(RunMetrics.load(tmp_path, first_run), pipeline.load_run_metrics())
+
+    assert set(differences) == {"ingest", "train"}
+    assert differences["train"]["product_bytes"] == 0
+    assert differences["train"]["serialize_time"] is None
+    assert isinstance(differences["train"]["compute_time"], float)
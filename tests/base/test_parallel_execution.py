@@ -0,0 +1,131 @@
+import time
+from collections import Counter
+
+import pytest
+from ploomber.exceptions import DAGBuildError
+
+from cf_pipelines import Pipeline
+
+
+@pytest.fixture
+def pipeline(parse_indented, tmp_path):
+    pipeline = Pipeline("Fan out", location=tmp_path)
+
+    @pipeline.step("start")
+    def start():
+        return {"numbers.pkl": [1, 2, 3]}
+
+    @pipeline.step("branches")
+    def slow_sum(*, numbers):
+        time.sleep(0.5)
+        return {"total.pkl": sum(numbers)}
+
+    @pipeline.step("branches")
+    def slow_max(*, numbers):
+        time.sleep(0.5)
+        return {"maximum.pkl": max(numbers)}
+
+    @pipeline.step("end")
+    def end(*, total, maximum):
+        return {"report.txt": f"{total} {maximum}"}
+
+    return pipeline
+
+
+@pytest.mark.parametrize("executor", ["threads", "processes"])
+def test_concurrent_execution(pipeline, tmp_path, read_pickle, executor):
+    pipeline.executor = executor
+    pipeline.max_workers = 2
+
+    start_time = time.monotonic()
+    pipeline.run()
+    elapsed_time = time.monotonic() - start_time
+
+    assert read_pickle(tmp_path / "default" / "branches" / "total.pkl") == 6
+    assert read_pickle(tmp_path / "default" / "branches" / "maximum.pkl") == 3
+    assert read_pickle(tmp_path / "default" / "end" / "report.txt") == "6 3"
+    assert elapsed_time < 0.9
+
+
+def test_run_parallel_argument(pipeline, tmp_path, read_pickle):
+    start_time = time.monotonic()
+    pipeline.run(parallel=2)
+    elapsed_time = time.monotonic() - start_time
+
+    assert read_pickle(tmp_path / "default" / "end" / "report.txt") == "6 3"
+    assert elapsed_time < 0.9
+
+
+def test_hooks_fire_for_every_step(pipeline):
+    pipeline.executor = "threads"
+    counter = Counter()
+
+    def before_function(function_name):
+        counter[function_name] += 1
+
+    def after_function(function_name, results, run_time):
+        counter[function_name] += 1
+
+    pipeline.set_before_step(before_function)
+    pipeline.set_after_function(after_function)
+    pipeline.run()
+
+    assert counter == {"start": 2, "slow_sum": 2, "slow_max": 2, "end": 2}
+
+
+def test_failing_step_stops_the_run(parse_indented, tmp_path):
+    pipeline = Pipeline("Failing", location=tmp_path, executor="threads")
+    failed_function = ""
+
+    @pipeline.step("step_1")
+    def i_throw_an_exception():
+        raise ValueError(":)")
+        return {"artifact_1.txt": "Hello"}
+
+    @pipeline.step("step_2")
+    def never_runs(*, artifact_1):
+        return {"artifact_2.txt": artifact_1}
+
+    def error_handler(function_name, exception, elapsed_time):
+        nonlocal failed_function
+        failed_function = function_name
+
+    pipeline.set_exception_handler(error_handler)
+    with pytest.raises(DAGBuildError):
+        pipeline.run()
+
+    assert failed_function == "i_throw_an_exception"
+    assert not (tmp_path / "default" / "step_2" / "artifact_2.txt").exists()
+
+
+def test_unknown_executor():
+    with pytest.raises(ValueError):
+        Pipeline("Unknown", executor="carrier pigeons")
+
+
+def test_hooks_run_in_the_parent_process_with_processes(parse_indented, tmp_path):
+    pipeline = Pipeline("Hooks", location=tmp_path, executor="processes", in_memory=True)
+    calls = []
+
+    @pipeline.step("ingestion")
+    def ingest():
+        return {"numbers.pkl": [1, 2, 3]}
+
+    @pipeline.step("training")
+    def train(*, numbers):
+        raise ValueError("Failed to train")
+        return {"model.pkl": sum(numbers)}
+
+    pipeline.set_before_step(lambda function_name: calls.append(("before", function_name)))
+    pipeline.set_after_function(lambda function_name, returns, elapsed: calls.append(("after", function_name, returns)))
+    pipeline.set_exception_handler(lambda function_name, exception, elapsed: calls.append(("failed", function_name)))
+
+    with pytest.raises(DAGBuildError):
+        pipeline.run()
+
+    assert calls == [
+        ("before", "ingest"),
+        ("after", "ingest", {"numbers": [1, 2, 3]}),
+        ("before", "train"),
+        ("failed", "train"),
+    ]
@@ -0,0 +1,141 @@
+import pandas as pd
+import pytest
+from ploomber.clients import LocalStorageClient
+from ploomber.products import File
+
+from cf_pipelines import Pipeline
+from cf_pipelines.base.partitions import PartitionedArtifact, split_partitions
+
+
+@pytest.fixture
+def pipeline(parse_indented, tmp_path, calls):
+    pipeline = Pipeline("Mapped", location=tmp_path)
+
+    @pipeline.step("ingestion")
+    def ingest(*, raw_sales):
+        return {"sales.pkl": dict(raw_sales)}
+
+    @pipeline.map_step("features", over="sales")
+    def double(*, sales, factor):
+        calls[tuple(sales)] += 1
+        return {"doubled.pkl": [value * factor for value in sales]}
+
+    @pipeline.step("report", persist=True)
+    def total(*, doubled):
+        return {"total.pkl": {region: sum(values) for region, values in doubled.items()}}
+
+    return pipeline
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_mapped_step(pipeline, tmp_path, read_pickle, calls, in_memory):
+    extra_args = {"factor": 2, "raw_sales": {"north": [1, 2], "south": [3]}}
+    pipeline.extra_arguments = extra_args
+    pipeline.in_memory = in_memory
+
+    pipeline.run()
+
+    assert pipeline.product_lineages["doubled"].partitioned
+    assert read_pickle(tmp_path / "default" / "report" / "total.pkl") == {"north": 6, "south": 6}
+    assert read_pickle(tmp_path / "default" / "features" / "doubled.pkl" / "north.pkl") == [2, 4]
+    doubled = pipeline.read_artifact("doubled")
+    assert isinstance(doubled, PartitionedArtifact)
+    assert dict(doubled) == {"north": [2, 4], "south": [6]}
+    assert calls == {(1, 2): 1, (3,): 1}
+    assert not (tmp_path / ".cache").exists()
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_partitions_are_uploaded(pipeline, tmp_path, cache):
+    pipeline.extra_arguments = {"factor": 2, "raw_sales": {"north": [1, 2], "south": [3]}}
+    pipeline.cache = cache
+    pipeline.run()
+    pipeline.dag_clients = {File: LocalStorageClient(tmp_path / "backup", path_to_project_root=tmp_path)}
+
+    pipeline.run()
+
+    backup = PartitionedArtifact(tmp_path / "backup" / "default" / "features" / "doubled.pkl")
+    assert dict(backup) == {"north": [2, 4], "south": [6]}
+
+
+def test_only_changed_partitions_are_computed_again(pipeline, read_pickle, calls):
+    extra_args = {"factor": 2, "raw_sales": {"north": [1, 2], "south": [3]}}
+    pipeline.extra_arguments = extra_args
+    pipeline.track_all = True
+    pipeline.cache = True
+    pipeline.run()
+
+    pipeline.extra_arguments["raw_sales"] = {"north": [1, 2], "south": [4], "east": [5]}
+    pipeline.run()
+
+    assert calls == {(1, 2): 1, (3,): 1, (4,): 1, (5,): 1}
+    assert dict(pipeline.read_artifact("doubled")) == {"north": [2, 4], "south": [8], "east": [10]}
+
+    pipeline.extra_arguments["factor"] = 3
+    pipeline.run()
+
+    assert sum(calls.values()) == 7
+
+
+def test_partitions_are_computed_again_without_cache(pipeline, tmp_path, calls):
+    extra_args = {"factor": 2, "raw_sales": {"north": [1, 2], "south": [3]}}
+    pipeline.extra_arguments = extra_args
+
+    pipeline.run()
+    pipeline.run()
+
+    assert sum(calls.values()) == 4
+    assert dict(pipeline.read_artifact("doubled")) == {"north": [2, 4], "south": [6]}
+    assert not (tmp_path / ".cache").exists()
+
+
+def test_mapped_step_can_be_called_directly(pipeline, tmp_path):
+    pipeline.cache = True
+
+    returns = pipeline.function_details["double"].python_function(sales={"north": [1, 2], "south": [3]}, factor=2)
+
+    assert returns == {"doubled": {"north": [2, 4], "south": [6]}}
+    assert not any(tmp_path.iterdir())
+
+
+def test_mapped_step_over_a_data_frame(parse_indented, tmp_path):
+    pipeline = Pipeline("Mapped", location=tmp_path)
+
+    @pipeline.step("ingestion")
+    def ingest():
+        return {"sales.parquet": pd.DataFrame({"region": ["north", "south", "north"], "amount": [1, 2, 3]})}
+
+    @pipeline.map_step("features", over="sales", partition_by="region")
+    def summarise(*, sales):
+        return {"summary.parquet": sales.groupby("region", as_index=False).sum()}
+
+    @pipeline.map_step("features", over="summary")
+    def describe(*, summary):
+        return {"description.pkl": f"{summary['region'][0]}: {summary['amount'][0]}"}
+
+    pipeline.run()
+
+    assert (tmp_path / "default" / "features" / "summary.parquet" / "north.parquet").exists()
+    assert dict(pipeline.read_artifact("description")) == {"north": "north: 4", "south": "south: 2"}
+
+
+def test_mapped_step_needs_the_artifact_it_is_mapped_over(tmp_path):
+    pipeline = Pipeline("Mapped", location=tmp_path)
+
+    with pytest.raises(ValueError):
+
+        @pipeline.map_step("features", over="sales")
+        def double(*, other):
+            return {"doubled.pkl": other}
+
+
+def test_split_partitions():
+    data_frame = pd.DataFrame({"region": ["b", "a", "b"], "amount": [1, 2, 3]})
+
+    partitions = split_partitions(data_frame, partition_by="region")
+
+    assert list(partitions) == ["a", "b"]
+    assert partitions["b"]["amount"].tolist() == [1, 3]
+    assert split_partitions({"a": 1}) == {"a": 1}
+    with pytest.raises(TypeError):
+        split_partitions([1, 2])
@@ -75,3 +75,17 @@ def test_function_can_be_called_directly(parse_indented):
     assert sum_results["result"] == 3
     assert generate_numbers_results["a"] == 1
     assert generate_numbers_results["b"] == 2
+
+
+def test_step_with_explicit_products():
+    pipeline = Pipeline("test")
+
+    def build_products():
+        products = {"model.pkl": 1}
+        return products
+
+    pipeline.step("training", produces=["model.pkl"])(build_products)
+
+    assert pipeline.product_lineages == {
+        "model": ProductLineage(group="training", file_name="model.pkl", produced_by="build_products")
+    }
@@ -0,0 +1,84 @@
+import pytest
+
+from cf_pipelines.base.helper_classes import InputBinding
+from cf_pipelines.base.pipeline import Pipeline
+from cf_pipelines.base.plan import get_dependent_functions, get_remaining_path_lengths, sort_topologically
+
+
+@pytest.fixture
+def pipeline(parse_indented):
+    pipeline = Pipeline("Planned", extra_args={"size": 3})
+
+    @pipeline.step("training")
+    def train(*, numbers):
+        return {"model.pkl": sum(numbers)}
+
+    @pipeline.step("ingestion")
+    def ingest(*, size):
+        return {"numbers.pkl": list(range(size))}
+
+    return pipeline
+
+
+def test_compile(pipeline):
+    plan = pipeline.compile()
+
+    assert plan.order == ("ingest", "train")
+    assert plan.dependencies == {"ingest": frozenset(), "train": frozenset({"ingest"})}
+    assert plan.inputs == {
+        "ingest": (InputBinding("size", environment_variable="CF_SIZE"),),
+        "train": (InputBinding("numbers", produced_by="ingest"),),
+    }
+    with pytest.raises(TypeError):
+        plan.inputs["train"] = ()
+
+
+def test_plan_is_reused_until_a_function_is_registered(pipeline):
+    plan = pipeline.compile()
+
+    assert pipeline.compile() is plan
+
+    @pipeline.step("evaluation")
+    def evaluate(*, model):
+        return {"score.pkl": model}
+
+    assert pipeline.compile().order == ("ingest", "train", "evaluate")
+
+
+def test_compile_fails_when_an_input_is_not_available(pipeline):
+    @pipeline.step("evaluation")
+    def evaluate(*, model, threshold):
+        return {"score.pkl": model > threshold}
+
+    with pytest.raises(KeyError):
+        pipeline.compile()
+
+
+def test_sort_topologically_detects_cycles():
+    with pytest.raises(ValueError, match="b -> c -> b"):
+        sort_topologically({"a": frozenset({"b"}), "b": frozenset({"c"}), "c": frozenset({"b"})})
+
+
+def test_get_dependent_functions(pipeline):
+    pipeline.extra_arguments["learning_rate"] = 0.1
+
+    @pipeline.step("evaluation")
+    def evaluate(*, model, learning_rate):
+        return {"score.pkl": model * learning_rate}
+
+    @pipeline.step("reporting")
+    def report(*, score):
+        return {"report.pkl": score}
+
+    plan = pipeline.compile()
+
+    assert get_dependent_functions(plan, {"learning_rate"}) == {"evaluate", "report"}
+    assert get_dependent_functions(plan, {"size"}) == {"ingest", "train", "evaluate", "report"}
+    assert get_dependent_functions(plan, set()) == set()
+
+
+def test_get_remaining_path_lengths(pipeline):
+    plan = pipeline.compile()
+
+    assert get_remaining_path_lengths(plan) == {"ingest": 2.0, "train": 1.0}
+    assert get_remaining_path_lengths(plan, {"ingest": 3.0, "train": 0.5}) == {"ingest": 3.5, "train": 0.5}
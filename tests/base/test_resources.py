@@ -0,0 +1,216 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from unittest.mock import patch
+
+import pytest
+
+from cf_pipelines import Pipeline
+from cf_pipelines.base.helper_classes import ResourceBudget
+from cf_pipelines.base.scheduler import ResourcePool
+
+
+class ConcurrencyTracker:
+    def __init__(self):
+        self.lock = Lock()
+        self.running = 0
+        self.most_running = 0
+        self.started = []
+
+    def __enter__(self):
+        with self.lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+
+    def __exit__(self, *args):
+        with self.lock:
+            self.running -= 1
+
+
+def test_memory_hungry_steps_do_not_run_together(parse_indented, tmp_path, read_pickle):
+    pipeline = Pipeline("Hungry", location=tmp_path, executor="threads", resources=ResourceBudget(memory=10))
+    tracker = ConcurrencyTracker()
+
+    @pipeline.step("branches", memory=6)
+    def first():
+        with tracker:
+            time.sleep(0.2)
+        return {"first.pkl": 1}
+
+    @pipeline.step("branches", memory=6)
+    def second():
+        with tracker:
+            time.sleep(0.2)
+        return {"second.pkl": 2}
+
+    @pipeline.step("end")
+    def end(*, first, second):
+        return {"total.pkl": first + second}
+
+    pipeline.run()
+
+    assert read_pickle(tmp_path / "default" / "end" / "total.pkl") == 3
+    assert tracker.most_running == 1
+
+
+def test_steps_that_fit_run_together(parse_indented, tmp_path):
+    pipeline = Pipeline("Packed", location=tmp_path, resources=ResourceBudget(cpus=2, memory=10))
+    tracker = ConcurrencyTracker()
+
+    @pipeline.step("branches", cpus=1, memory=5)
+    def first():
+        with tracker:
+            time.sleep(0.3)
+        return {"first.pkl": 1}
+
+    @pipeline.step("branches", cpus=1, memory=5)
+    def second():
+        with tracker:
+            time.sleep(0.3)
+        return {"second.pkl": 2}
+
+    @pipeline.step("branches", cpus=0.5)
+    def third():
+        with tracker:
+            time.sleep(0.3)
+        return {"third.pkl": 3}
+
+    pipeline.run()
+
+    assert tracker.most_running == 2
+    assert set(pipeline.run_metrics.steps) == {"first", "second", "third"}
+
+
+def test_critical_path_starts_first(parse_indented, tmp_path):
+    pipeline = Pipeline("Critical", location=tmp_path, resources=ResourceBudget(cpus=1))
+    started = []
+
+    @pipeline.step("side")
+    def side():
+        started.append("side")
+        return {"side.pkl": 0}
+
+    @pipeline.step("chain")
+    def head():
+        started.append("head")
+        return {"head.pkl": 1}
+
+    @pipeline.step("chain")
+    def body(*, head):
+        started.append("body")
+        return {"body.pkl": head + 1}
+
+    @pipeline.step("chain")
+    def tail(*, body):
+        started.append("tail")
+        return {"tail.pkl": body + 1}
+
+    pipeline.run()
+
+    assert started == ["head", "body", "side", "tail"]
+
+
+def test_step_bigger_than_the_budget(parse_indented, tmp_path):
+    pipeline = Pipeline("Too big", location=tmp_path, resources=ResourceBudget(cpus=2, memory=100))
+
+    @pipeline.step("big", cpus=4)
+    def big():
+        return {"big.pkl": 1}
+
+    with pytest.raises(ValueError, match="big"):
+        pipeline.run()
+
+
+def test_negative_resources(parse_indented, tmp_path):
+    pipeline = Pipeline("Negative", location=tmp_path)
+
+    with pytest.raises(ValueError, match="negative"):
+
+        @pipeline.step("negative", memory=-1)
+        def negative():
+            return {"negative.pkl": 1}
+
+
+def test_fractional_cpus_are_released_exactly(parse_indented, tmp_path, read_pickle):
+    pipeline = Pipeline("Fractional", location=tmp_path, resources=ResourceBudget(cpus=0.4))
+
+    @pipeline.step("branches", cpus=0.1)
+    def first():
+        return {"first.pkl": 1}
+
+    @pipeline.step("branches", cpus=0.3)
+    def second():
+        return {"second.pkl": 2}
+
+    @pipeline.step("end", cpus=0.4)
+    def end(*, first, second):
+        return {"total.pkl": first + second}
+
+    pool = ResourcePool(pipeline.resources)
+    for function_name in ["first", "second"]:
+        pool.acquire(pipeline.function_details[function_name])
+    for function_name in ["second", "first"]:
+        pool.release(pipeline.function_details[function_name])
+    assert pool.fits(pipeline.function_details["end"])
+
+    pipeline.run()
+
+    assert read_pickle(tmp_path / "default" / "end" / "total.pkl") == 3
+
+
+def test_steps_left_unscheduled_are_an_error(parse_indented, tmp_path):
+    pipeline = Pipeline("Unscheduled", location=tmp_path, resources=ResourceBudget(cpus=1))
+
+    @pipeline.step("never")
+    def never():
+        return {"never.pkl": 1}
+
+    with patch.object(ResourcePool, "fits", return_value=False):
+        with pytest.raises(RuntimeError, match="never"):
+            pipeline.run()
+
+
+@pytest.mark.parametrize(
+    "budget, step_cpus, max_workers",
+    [
+        (ResourceBudget(cpus=2), [1, 1, 1, 1, 1, 1], 2),
+        (ResourceBudget(cpus=2), [1, 0.5, 2, 1, 1, 1], 4),
+        (ResourceBudget(cpus=2), [0.1, 0.1, 0.1, 0.1, 0.1, 0.1], 4),
+        (ResourceBudget(memory=10), [0, 0, 0, 0, 0, 0], 4),
+        (ResourceBudget(cpus=8), [1, 1, 1, 1, 1, 1], 6),
+    ],
+)
+def test_workers_are_capped_by_the_budget(parse_indented, tmp_path, budget, step_cpus, max_workers):
+    pipeline = Pipeline("Capped", location=tmp_path, resources=budget)
+    for index, cpus in enumerate(step_cpus):
+
+        def step():
+            return {}
+
+        step.__name__ = f"step_{index}"
+        pipeline.step("steps", cpus=cpus, produces=[f"product_{index}.pkl"])(step)
+
+    with patch("os.cpu_count", return_value=4):
+        pool = ResourcePool(budget)
+        assert pool.max_running(list(pipeline.function_details.values())) == max_workers
+
+
+def test_only_the_workers_the_budget_can_use_are_started(parse_indented, tmp_path):
+    pipeline = Pipeline("Capped", location=tmp_path, executor="processes", resources=ResourceBudget(cpus=2))
+
+    @pipeline.step("branches")
+    def first():
+        return {"first.pkl": 1}
+
+    @pipeline.step("branches")
+    def second():
+        return {"second.pkl": 2}
+
+    @pipeline.step("branches")
+    def third():
+        return {"third.pkl": 3}
+
+    with patch("cf_pipelines.base.scheduler.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as pool:
+        pipeline.run()
+
+    assert pool.call_args.args[0] == 2
@@ -0,0 +1,128 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from cf_pipelines import Pipeline
+from cf_pipelines.base.helper_classes import RetentionPolicy
+from cf_pipelines.base.retention import collect_garbage, list_runs, select_expired_runs
+
+
+def make_run(location, started_at, size=0):
+    run_folder = location / started_at.strftime("%Y%m%d%H%M%S%f")
+    (run_folder / "group").mkdir(parents=True)
+    (run_folder / "group" / "data.pkl").write_bytes(bytes(size))
+    return run_folder.name
+
+
+@pytest.fixture
+def runs(tmp_path):
+    (tmp_path / "default").mkdir()
+    (tmp_path / ".cache").mkdir()
+    return [make_run(tmp_path, datetime(2022, 1, day), size=100) for day in range(1, 6)]
+
+
+def test_list_runs(tmp_path, runs):
+    assert list_runs(tmp_path) == runs
+    assert list_runs(tmp_path / "missing") == []
+
+
+@pytest.mark.parametrize(
+    ["policy", "expired_count"],
+    [
+        (RetentionPolicy(keep_last=2), 3),
+        (RetentionPolicy(max_age=timedelta(days=2)), 3),
+        (RetentionPolicy(max_size=250), 3),
+        (RetentionPolicy(keep_last=4, max_age=timedelta(days=10)), 1),
+        (RetentionPolicy(), 0),
+    ],
+)
+def test_select_expired_runs(tmp_path, runs, policy, expired_count):
+    expired = select_expired_runs(tmp_path, policy, now=datetime(2022, 1, 5, 12))
+
+    assert expired == runs[:expired_count]
+
+
+def test_kept_and_pinned_runs_are_never_removed(tmp_path, runs):
+    (tmp_path / runs[1] / ".pinned").touch()
+
+    removed = collect_garbage(tmp_path, RetentionPolicy(keep_last=1), keep={runs[0]})
+
+    assert removed == runs[2:4]
+    assert list_runs(tmp_path) == [runs[0], runs[1], runs[4]]
+    assert (tmp_path / "default").is_dir() and (tmp_path / ".cache").is_dir()
+
+
+def test_products_linked_from_the_cache_free_no_space(tmp_path, runs):
+    cached_file = tmp_path / ".cache" / "data.pkl"
+    cached_file.write_bytes(bytes(100))
+    for run_id in runs:
+        run_file = tmp_path / run_id / "group" / "data.pkl"
+        run_file.unlink()
+        os.link(cached_file, run_file)
+
+    assert select_expired_runs(tmp_path, RetentionPolicy(max_size=0)) == []
+
+    collect_garbage(tmp_path, RetentionPolicy(keep_last=0))
+
+    assert cached_file.read_bytes() == bytes(100)
+
+
+def make_cache_entry(location, key, used_at, size=0, linked_to=None):
+    entry = location / ".cache" / key
+    entry.mkdir(parents=True)
+    if linked_to:
+        os.link(linked_to, entry / "data.pkl")
+    else:
+        (entry / "data.pkl").write_bytes(bytes(size))
+    os.utime(entry, (used_at, used_at))
+    return entry
+
+
+def test_unused_cache_entries_are_removed_before_runs(tmp_path, runs):
+    least_recently_used = make_cache_entry(tmp_path, "least", used_at=1, size=100)
+    most_recently_used = make_cache_entry(tmp_path, "most", used_at=2, size=100)
+
+    assert select_expired_runs(tmp_path, RetentionPolicy(max_size=600)) == []
+
+    assert collect_garbage(tmp_path, RetentionPolicy(max_size=600)) == []
+    assert not least_recently_used.exists()
+    assert most_recently_used.exists()
+
+
+def test_cache_entries_linked_from_runs_are_kept(tmp_path, runs):
+    entry = make_cache_entry(tmp_path, "linked", used_at=1, linked_to=tmp_path / runs[-1] / "group" / "data.pkl")
+
+    assert collect_garbage(tmp_path, RetentionPolicy(max_size=400)) == runs[:1]
+    assert (entry / "data.pkl").read_bytes() == bytes(100)
+
+
+def test_pipeline_collects_garbage_after_each_run(tmp_path):
+    pipeline = Pipeline("Retention", location=tmp_path, track_all=True, retention=RetentionPolicy(keep_last=2))
+
+    @pipeline.step("ingestion")
+    def ingest():
+        return {"data.pkl": 1}
+
+    pipeline.run()
+    pipeline.pin_run()
+    pinned_run = pipeline.current_run_id
+    for _ in range(3):
+        pipeline.run()
+
+    runs = pipeline.list_runs()
+    assert len(runs) == 3
+    assert runs[0] == pinned_run and runs[-1] == pipeline.current_run_id
+
+    pipeline.unpin_run(pinned_run)
+    assert pipeline.collect_garbage() == [pinned_run]
+
+
+def test_collect_garbage_needs_a_policy(tmp_path):
+    with pytest.raises(ValueError):
+        Pipeline("Retention", location=tmp_path, track_all=True).collect_garbage()
+
+
+def test_pin_missing_run(tmp_path):
+    with pytest.raises(KeyError):
+        Pipeline("Retention", location=tmp_path, track_all=True).pin_run("20220101000000000000")
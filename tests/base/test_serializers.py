@@ -0,0 +1,238 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from ploomber.products import File
+
+from cf_pipelines import Pipeline
+from cf_pipelines.base import serializers
+from cf_pipelines.base.serializers import (
+    compressed_serializer,
+    measure_artifact_file,
+    register_format,
+    serialize_artifact,
+    unserialize_artifact,
+    unserialize_memory_mapped,
+)
+
+
+@pytest.fixture
+def restore_formats():
+    formats = dict(serializers.artifact_formats)
+    yield
+    serializers.artifact_formats.clear()
+    serializers.artifact_formats.update(formats)
+
+
+@pytest.mark.parametrize(
+    ["file_name", "value", "magic"],
+    [
+        ("data.parquet", pd.DataFrame({"a": [1, 2], "b": ["x", "y"]}), b"PAR1"),
+        ("data.feather", pd.DataFrame({"a": [1, 2], "b": ["x", "y"]}), b"ARROW1"),
+        ("data.npy", np.arange(10), b"\x93NUMPY"),
+        ("data.csv", pd.DataFrame({"a": [1, 2]}), b"\x80"),
+    ],
+)
+def test_format_is_picked_by_extension(tmp_path, file_name, value, magic):
+    if file_name.endswith(".feather"):
+        pytest.importorskip("pyarrow")
+    product = File(tmp_path / file_name)
+
+    serialize_artifact(value, product)
+
+    assert (tmp_path / file_name).read_bytes().startswith(magic)
+    read_value = unserialize_artifact(product)
+    if isinstance(value, pd.DataFrame):
+        pd.testing.assert_frame_equal(read_value, value)
+    else:
+        np.testing.assert_array_equal(read_value, value)
+
+
+def test_objects_not_accepted_are_pickled(tmp_path):
+    product = File(tmp_path / "data.parquet")
+
+    serialize_artifact({"not": "a data frame"}, product)
+
+    assert unserialize_artifact(product) == {"not": "a data frame"}
+
+
+@pytest.mark.parametrize("file_name", ["data.parquet", "data.feather", "data.parquet.gz"])
+def test_data_frames_arrow_cant_convert_are_pickled(tmp_path, file_name):
+    pytest.importorskip("pyarrow")
+    value = pd.DataFrame({"x": [1, "a"]})
+    product = File(tmp_path / file_name)
+
+    serialize_artifact(value, product)
+
+    pd.testing.assert_frame_equal(unserialize_artifact(product), value)
+    assert [path.name for path in tmp_path.iterdir()] == [file_name]
+
+
+def test_data_frames_are_pickled_without_arrow(monkeypatch, tmp_path):
+    monkeypatch.setattr(serializers, "is_installed", lambda *modules: False)
+    value = pd.DataFrame({"a": [1, 2]})
+    product = File(tmp_path / "data.feather")
+
+    serialize_artifact(value, product)
+
+    assert (tmp_path / "data.feather").read_bytes().startswith(b"\x80")
+    pd.testing.assert_frame_equal(unserialize_artifact(product), value)
+
+
+def test_pickled_files_are_still_read(tmp_path):
+    path = tmp_path / "data.npy"
+    with open(path, "wb") as wb:
+        pickle.dump([1, 2, 3], wb)
+
+    assert unserialize_artifact(File(path)) == [1, 2, 3]
+
+
+def test_register_format(restore_formats, tmp_path):
+    register_format(".upper", lambda obj, wb: wb.write(obj.upper().encode()), lambda rb: rb.read().decode())
+    product = File(tmp_path / "text.upper")
+
+    serialize_artifact("hello", product)
+
+    assert (tmp_path / "text.upper").read_text() == "HELLO"
+    assert unserialize_artifact(product) == "HELLO"
+
+
+def test_pipeline_stores_data_frames_as_parquet(parse_indented, tmp_path):
+    pipeline = Pipeline("Formats", location=tmp_path)
+
+    @pipeline.step("ingestion")
+    def ingest():
+        return {"raw_data.parquet": pd.DataFrame({"a": [1, 2, 3]})}
+
+    @pipeline.step("features")
+    def double(*, raw_data):
+        return {"features.parquet": raw_data * 2}
+
+    pipeline.run()
+
+    features = pd.read_parquet(tmp_path / "default" / "features" / "features.parquet")
+    pd.testing.assert_frame_equal(features, pd.DataFrame({"a": [2, 4, 6]}))
+
+
+def test_arrow_tables(tmp_path):
+    pyarrow = pytest.importorskip("pyarrow")
+    table = pyarrow.table({"a": [1, 2, 3]})
+    product = File(tmp_path / "table.arrow")
+
+    serialize_artifact(table, product)
+
+    assert unserialize_artifact(product).equals(table)
+    assert unserialize_memory_mapped(product).equals(table)
+
+
+def test_memory_mapped_arrays(tmp_path):
+    product = File(tmp_path / "array.npy")
+    serialize_artifact(np.arange(10), product)
+
+    array = unserialize_memory_mapped(product)
+
+    assert isinstance(array, np.memmap)
+    np.testing.assert_array_equal(array, np.arange(10))
+    with pytest.raises(ValueError):
+        array[0] = 1
+
+
+def test_overwriting_keeps_mapped_views(tmp_path):
+    product = File(tmp_path / "array.npy")
+    serialize_artifact(np.arange(10), product)
+    array = unserialize_memory_mapped(product)
+
+    serialize_artifact(np.zeros(10), product)
+
+    np.testing.assert_array_equal(array, np.arange(10))
+
+
+def test_pipeline_memory_maps_arrays(parse_indented, tmp_path):
+    pipeline = Pipeline("Mapped", location=tmp_path, memory_map=True)
+    received_types = []
+
+    @pipeline.step("ingestion")
+    def ingest():
+        return {"array.npy": np.arange(10)}
+
+    @pipeline.step("features")
+    def total(*, array):
+        received_types.append(type(array))
+        return {"total.pkl": int(array.sum())}
+
+    pipeline.run()
+
+    assert received_types == [np.memmap]
+
+
+@pytest.mark.parametrize(
+    ["codec", "module", "magic"],
+    [("gzip", None, b"\x1f\x8b"), ("zstd", "zstandard", b"\x28\xb5\x2f\xfd"), ("lz4", "lz4", b"\x04\x22\x4d\x18")],
+)
+@pytest.mark.parametrize(
+    ["file_name", "value"],
+    [("data.parquet", pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})), ("data.npy", np.arange(10)), ("data.pkl", [1])],
+)
+def test_compressed_serializer(tmp_path, codec, module, magic, file_name, value):
+    if module:
+        pytest.importorskip(module)
+    product = File(tmp_path / file_name)
+
+    compressed_serializer(codec, compression_level=1)(value, product)
+
+    assert (tmp_path / file_name).read_bytes().startswith(magic)
+    read_value = unserialize_artifact(product)
+    if isinstance(value, pd.DataFrame):
+        pd.testing.assert_frame_equal(read_value, value)
+    elif isinstance(value, np.ndarray):
+        np.testing.assert_array_equal(read_value, value)
+    else:
+        assert read_value == value
+
+
+def test_compressed_serializer_needs_a_known_codec():
+    with pytest.raises(ValueError):
+        compressed_serializer("unknown")
+
+
+def test_compressed_files_are_not_memory_mapped(tmp_path):
+    product = File(tmp_path / "array.npy.gz")
+    serialize_artifact(np.arange(10), product)
+
+    array = unserialize_memory_mapped(product)
+
+    assert not isinstance(array, np.memmap)
+    np.testing.assert_array_equal(array, np.arange(10))
+
+
+def test_measure_artifact_file(tmp_path):
+    product = File(tmp_path / "data.pkl.gz")
+    serialize_artifact(bytes(100_000), product)
+
+    measurements = measure_artifact_file(tmp_path / "data.pkl.gz")
+
+    assert measurements["codec"] == "gzip"
+    assert measurements["size"] < 1_000
+    assert measurements["uncompressed_size"] == len(pickle.dumps(bytes(100_000), protocol=pickle.HIGHEST_PROTOCOL))
+    assert measurements["decompression_time"] >= 0
+
+
+def test_pipeline_compression(parse_indented, tmp_path):
+    pipeline = Pipeline("Compressed", location=tmp_path, compression="gzip")
+
+    @pipeline.step("ingestion")
+    def ingest():
+        return {"raw_data.parquet": pd.DataFrame({"a": [1, 2, 3]}), "sample.pkl.gz": [1, 2]}
+
+    @pipeline.step("features")
+    def double(*, raw_data, sample):
+        return {"features.parquet": raw_data * 2, "total.pkl": sum(sample)}
+
+    pipeline.run()
+
+    features_path = tmp_path / "default" / "features" / "features.parquet"
+    assert features_path.read_bytes().startswith(b"\x1f\x8b")
+    assert (tmp_path / "default" / "ingestion" / "sample.pkl.gz").read_bytes().startswith(b"\x1f\x8b")
+    pd.testing.assert_frame_equal(pipeline.read_artifact("features"), pd.DataFrame({"a": [2, 4, 6]}))
+    assert pipeline.read_artifact("total") == 3
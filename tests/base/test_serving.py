@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cf_pipelines import Pipeline
+
+
+@pytest.fixture
+def pipeline(parse_indented, tmp_path):
+    pipeline = Pipeline("Scoring", location=tmp_path, extra_args={"offset": 10})
+
+    @pipeline.step("ingestion")
+    def ingest():
+        return {"raw.parquet": pd.DataFrame({"x": [1.0, 2.0, 3.0]})}
+
+    @pipeline.step("features")
+    def featurise(*, raw, offset):
+        return {"features.parquet": raw.assign(x_plus_offset=raw.x + offset)}
+
+    @pipeline.step("training")
+    def train(*, features):
+        return {"weight.pkl": 2.0}
+
+    @pipeline.step("scoring")
+    def score(*, features, weight):
+        return {"scores.npy": features.x_plus_offset.to_numpy() * weight}
+
+    return pipeline
+
+
+def test_as_function(pipeline, tmp_path):
+    score = pipeline.as_function(inputs=["raw", "weight"], outputs=["features.parquet", "scores"])
+
+    outputs = score(raw=pd.DataFrame({"x": [0.0, 5.0]}), weight=3.0)
+
+    assert [step.name for step in score.steps] == ["featurise", "score"]
+    assert outputs["features"].x_plus_offset.tolist() == [10.0, 15.0]
+    assert outputs["scores"].tolist() == [30.0, 45.0]
+    assert not any(tmp_path.iterdir())
+
+
+def test_inputs_override_extra_arguments(pipeline):
+    featurise = pipeline.as_function(inputs=["raw", "offset"], outputs=["features"])
+
+    outputs = featurise(raw=pd.DataFrame({"x": [1.0]}), offset=0)
+
+    assert outputs["features"].x_plus_offset.tolist() == [1.0]
+
+
+def test_compiled_once(pipeline):
+    score = pipeline.as_function(inputs=["raw", "weight"], outputs=["scores"])
+    pipeline.extra_arguments["offset"] = 100
+
+    assert score(raw=pd.DataFrame({"x": [1.0]}), weight=1.0)["scores"].tolist() == [11.0]
+
+
+def test_missing_inputs(pipeline):
+    score = pipeline.as_function(inputs=["raw", "weight"], outputs=["scores"])
+
+    with pytest.raises(TypeError):
+        score(raw=pd.DataFrame({"x": [1.0]}))
+
+
+def test_unknown_names(pipeline):
+    with pytest.raises(KeyError):
+        pipeline.as_function(inputs=["unknown"], outputs=["scores"])
+    with pytest.raises(KeyError):
+        pipeline.as_function(inputs=["raw"], outputs=["unknown"])
+
+
+def test_streaming_steps_are_rejected(parse_indented, tmp_path):
+    pipeline = Pipeline("Streaming", location=tmp_path)
+
+    @pipeline.step("streaming")
+    def stream():
+        for number in range(3):
+            yield {"numbers.pkl": number}
+
+    with pytest.raises(ValueError, match="stream"):
+        pipeline.as_function(inputs=[], outputs=["numbers"])
+
+
+def test_call_batch(pipeline):
+    score = pipeline.as_function(inputs=["raw", "weight"], outputs=["features", "scores"])
+    requests = [{"raw": pd.DataFrame({"x": [0.0, 1.0]})}, {"raw": pd.DataFrame({"x": [2.0]})}]
+
+    outputs = score.call_batch(requests, shared={"weight": 1.0})
+
+    assert len(outputs) == 2
+    assert outputs[0]["scores"].tolist() == [10.0, 11.0]
+    assert outputs[1]["scores"].tolist() == [12.0]
+    assert outputs[1]["features"].x.tolist() == [2.0]
+    assert score.call_batch([]) == []
+
+
+def test_call_batch_with_arrays_and_lists(parse_indented, tmp_path):
+    pipeline = Pipeline("Batched", location=tmp_path)
+
+    @pipeline.step("doubling")
+    def double(*, numbers, names):
+        return {"doubled.npy": numbers * 2, "greetings.pkl": [f"hi {name}" for name in names]}
+
+    double_function = pipeline.as_function(inputs=["numbers", "names"], outputs=["doubled", "greetings"])
+    outputs = double_function.call_batch(
+        [{"numbers": np.array([1, 2]), "names": ["a", "b"]}, {"numbers": np.array([3]), "names": ["c"]}]
+    )
+
+    assert outputs[0]["doubled"].tolist() == [2, 4]
+    assert outputs[1] == {"doubled": np.array([6]), "greetings": ["hi c"]}
+    with pytest.raises(ValueError):
+        double_function.call_batch([{"numbers": np.array([1, 2]), "names": ["a"]}])
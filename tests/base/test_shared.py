@@ -0,0 +1,28 @@
+import pytest
+
+from cf_pipelines.base.shared import read_shared_file, write_shared_file
+
+numpy = pytest.importorskip("numpy")
+
+
+def test_arrays_are_mapped_from_shared_files(tmp_path):
+    array = numpy.arange(1000, dtype=numpy.float64)
+    write_shared_file({"array": array, "name": "numbers"}, tmp_path / "product")
+
+    loaded = read_shared_file(tmp_path / "product")
+
+    assert loaded["name"] == "numbers"
+    numpy.testing.assert_array_equal(loaded["array"], array)
+    assert not loaded["array"].flags.owndata
+    assert loaded["array"].ctypes.data % 64 == 0
+    # The mapping is copy-on-write, changes never reach the file
+    loaded["array"][0] = -1
+    assert read_shared_file(tmp_path / "product")["array"][0] == 0
+
+
+def test_data_frames_are_mapped_from_shared_files(tmp_path):
+    pandas = pytest.importorskip("pandas")
+    data_frame = pandas.DataFrame({"a": numpy.arange(100), "b": numpy.linspace(0, 1, 100)})
+    write_shared_file(data_frame, tmp_path / "product")
+
+    pandas.testing.assert_frame_equal(read_shared_file(tmp_path / "product"), data_frame)
@@ -0,0 +1,101 @@
+import os
+
+from ploomber.io import serializer_pickle
+
+from cf_pipelines import Pipeline
+from cf_pipelines.base.helper_classes import RetentionPolicy
+from cf_pipelines.base.store import BlobStore
+from cf_pipelines.base.utils import hash_file
+
+
+def test_identical_files_are_stored_once(tmp_path):
+    store = BlobStore(tmp_path / ".blobs")
+    first, second, different = tmp_path / "first.pkl", tmp_path / "second.pkl", tmp_path / "different.pkl"
+    first.write_bytes(b"same")
+    second.write_bytes(b"same")
+    different.write_bytes(b"other")
+
+    assert store.add_all([first, second, different, tmp_path / "missing.pkl"]) == 1
+
+    assert os.path.samefile(first, second)
+    assert not os.path.samefile(first, different)
+    assert second.read_bytes() == b"same"
+    assert len(list((tmp_path / ".blobs").glob("*/*"))) == 2
+    assert not store.add(first)
+
+
+def test_prune_removes_unlinked_blobs(tmp_path):
+    store = BlobStore(tmp_path / ".blobs")
+    kept, removed = tmp_path / "kept.pkl", tmp_path / "removed.pkl"
+    kept.write_bytes(b"kept")
+    removed.write_bytes(b"removed")
+    store.add_all([kept, removed])
+
+    removed.unlink()
+
+    assert len(store.prune()) == 1
+    assert [blob.read_bytes() for blob in (tmp_path / ".blobs").glob("*/*")] == [b"kept"]
+
+
+def test_pipeline_deduplicates_tracked_runs(tmp_path):
+    pipeline = Pipeline("Deduplicated", location=tmp_path, track_all=True, deduplicate=True)
+    runs = []
+
+    @pipeline.step("ingestion")
+    def ingest():
+        return {"reference.pkl": list(range(1000)), "run.pkl": len(runs)}
+
+    for _ in range(3):
+        pipeline.run()
+        runs.append(pipeline.current_run_id)
+
+    references = [tmp_path / run_id / "ingestion" / "reference.pkl" for run_id in runs]
+    assert all(os.path.samefile(references[0], reference) for reference in references)
+    assert os.stat(references[0]).st_nlink == 4
+    assert pipeline.read_artifact("reference") == list(range(1000))
+    assert pipeline.read_artifact("run") == 2
+
+    pipeline.collect_garbage(RetentionPolicy(keep_last=1))
+
+    assert len(list((tmp_path / ".blobs").glob("*/*"))) == 2
+    assert os.stat(references[-1]).st_nlink == 2
+
+
+def test_deduplicated_runs_count_towards_the_size_cap(tmp_path):
+    pipeline = Pipeline("Deduplicated", location=tmp_path, track_all=True, deduplicate=True)
+    values = iter([bytes(1000), bytes(2000)])
+
+    @pipeline.step("ingestion")
+    def ingest():
+        return {"data.pkl": next(values)}
+
+    pipeline.run()
+    first_run = pipeline.current_run_id
+    pipeline.run()
+
+    assert pipeline.collect_garbage(RetentionPolicy(max_size=2500)) == [first_run]
+
+
+def test_serial_runs_do_not_write_through_links(tmp_path):
+    pipeline = Pipeline("Linked", location=tmp_path, deduplicate=True, serializer=serializer_pickle)
+
+    def first():
+        return {"first.pkl": 1}
+
+    @pipeline.step("second", produces=["second.pkl"])
+    def second():
+        return {"second.pkl": 1}
+
+    pipeline.step("first", produces=["first.pkl"])(first)
+    pipeline.run()
+
+    def first():
+        return {"first.pkl": 2}
+
+    pipeline.step("first", produces=["first.pkl"])(first)
+    pipeline.run()
+
+    assert pipeline.read_artifact("first") == 2
+    assert pipeline.read_artifact("second") == 1
+    for blob in (tmp_path / ".blobs").glob("*/*"):
+        assert blob.name == hash_file(blob)
@@ -0,0 +1,91 @@
+import pytest
+from ploomber.clients import LocalStorageClient
+from ploomber.exceptions import DAGBuildError
+from ploomber.products import File
+
+from cf_pipelines import Pipeline
+from cf_pipelines.base.streaming import ChunkedArtifact
+
+
+@pytest.fixture
+def pipeline(parse_indented, tmp_path):
+    pipeline = Pipeline("Streaming", location=tmp_path, extra_args={"n_chunks": 4})
+
+    @pipeline.step("ingestion")
+    def ingest(*, n_chunks):
+        for chunk in range(n_chunks):
+            yield {"rows.pkl": list(range(chunk * 3, chunk * 3 + 3))}
+
+    @pipeline.step("aggregation")
+    def aggregate(*, rows):
+        total = 0
+        for chunk in rows:
+            total += sum(chunk)
+        return {"total.pkl": total}
+
+    return pipeline
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_streaming_step(pipeline, tmp_path, read_pickle, in_memory):
+    pipeline.in_memory = in_memory
+
+    pipeline.run()
+
+    rows = ChunkedArtifact(tmp_path / "default" / "ingestion" / "rows.pkl")
+    assert list(rows) == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9, 10, 11]]
+    assert pipeline.read_artifact("rows").path == rows.path
+
+
+def test_downstream_steps_receive_chunks(pipeline, tmp_path, read_pickle):
+    results = {}
+
+    def after_function(function_name, returns, elapsed_time):
+        results[function_name] = returns
+
+    pipeline.set_after_function(after_function)
+    pipeline.run()
+
+    assert read_pickle(tmp_path / "default" / "aggregation" / "total.pkl") == 66
+    assert isinstance(results["ingest"]["rows"], ChunkedArtifact)
+    assert len(list(results["ingest"]["rows"])) == 4
+
+
+def test_failing_streaming_step(parse_indented, tmp_path):
+    pipeline = Pipeline("Streaming", location=tmp_path)
+    failed_function = ""
+
+    @pipeline.step("ingestion")
+    def ingest():
+        yield {"rows.pkl": [1, 2, 3]}
+        raise ValueError(":)")
+
+    def error_handler(function_name, exception, elapsed_time):
+        nonlocal failed_function
+        failed_function = function_name
+
+    pipeline.set_exception_handler(error_handler)
+    with pytest.raises(DAGBuildError):
+        pipeline.run()
+
+    assert failed_function == "ingest"
+
+
+def test_streamed_products_are_uploaded(pipeline, tmp_path):
+    pipeline.dag_clients = {File: LocalStorageClient(tmp_path / "backup", path_to_project_root=tmp_path)}
+
+    pipeline.run()
+
+    rows = ChunkedArtifact(tmp_path / "backup" / "default" / "ingestion" / "rows.pkl")
+    assert list(rows) == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9, 10, 11]]
+
+
+@pytest.mark.parametrize("file_name", ["rows.parquet", "rows.pkl.gz"])
+def test_streamed_products_are_pickles(parse_indented, tmp_path, file_name):
+    pipeline = Pipeline("Streaming", location=tmp_path)
+
+    def ingest():
+        yield {file_name: [1, 2, 3]}
+
+    with pytest.raises(ValueError, match=f"can't produce {file_name}"):
+        pipeline.step("ingestion", produces=[file_name])(ingest)
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from cf_pipelines import Pipeline
+from cf_pipelines.base.sweeps import expand_grid
+
+
+@pytest.fixture
+def pipeline(parse_indented, tmp_path, calls):
+    pipeline = Pipeline("Sweep", location=tmp_path, extra_args={"size": 4, "offset": 1})
+
+    @pipeline.step("ingestion")
+    def ingest(*, size):
+        calls["ingest"] += 1
+        return {"numbers.pkl": list(range(size))}
+
+    @pipeline.step("training")
+    def train(*, numbers, factor):
+        calls["train"] += 1
+        return {"model.pkl": sum(numbers) * factor}
+
+    @pipeline.step("evaluation", persist=True)
+    def evaluate(*, model, offset):
+        calls["evaluate"] += 1
+        return {"score.pkl": model + offset}
+
+    return pipeline
+
+
+def test_expand_grid():
+    assert expand_grid({"a": [1, 2], "b": ["x"]}) == [{"a": 1, "b": "x"}, {"a": 2, "b": "x"}]
+    assert expand_grid({}) == [{}]
+    assert expand_grid({"a": []}) == []
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_run_sweep_runs_the_independent_steps_once(pipeline, tmp_path, read_pickle, calls, in_memory):
+    pipeline.in_memory = in_memory
+
+    runs = pipeline.run_sweep({"factor": [1, 2], "offset": [0, 10]})
+
+    assert list(runs.values()) == [
+        {"factor": 1, "offset": 0},
+        {"factor": 1, "offset": 10},
+        {"factor": 2, "offset": 0},
+        {"factor": 2, "offset": 10},
+    ]
+    assert calls == {"ingest": 1, "train": 4, "evaluate": 4}
+    scores = {run_id: read_pickle(tmp_path / run_id / "evaluation" / "score.pkl") for run_id in runs}
+    assert list(scores.values()) == [6, 16, 12, 22]
+    assert pipeline.extra_arguments == {"size": 4, "offset": 1}
+    assert pipeline.current_run_id == list(runs)[-1]
+
+    first_run, *other_runs = runs
+    for run_id in other_runs:
+        assert os.path.samefile(
+            tmp_path / first_run / "ingestion" / "numbers.pkl", tmp_path / run_id / "ingestion" / "numbers.pkl"
+        )
+        assert pipeline.load_run_metrics(run_id).steps.keys() == {"train", "evaluate"}
+    assert pipeline.load_run_metrics(first_run).steps.keys() == {"ingest", "train", "evaluate"}
+
+
+def test_run_sweep_in_parallel(pipeline, tmp_path, read_pickle):
+    runs = pipeline.run_sweep({"factor": [1, 2, 3]}, parallel=2)
+
+    scores = [read_pickle(tmp_path / run_id / "evaluation" / "score.pkl") for run_id in runs]
+    assert scores == [7, 13, 19]
@@ -0,0 +1,81 @@
+import pytest
+
+from cf_pipelines import Pipeline
+
+
+@pytest.fixture
+def pipeline(parse_indented, tmp_path, calls):
+    pipeline = Pipeline("Targets", location=tmp_path)
+
+    @pipeline.step("ingestion")
+    def ingest():
+        calls["ingest"] += 1
+        return {"raw_data.pkl": [3, 1, 2]}
+
+    @pipeline.step("evaluation")
+    def evaluate(*, raw_data):
+        calls["evaluate"] += 1
+        return {"evaluation_report.txt": f"max: {max(raw_data)}"}
+
+    @pipeline.step("plots")
+    def plot(*, raw_data):
+        calls["plot"] += 1
+        return {"plot.png": sorted(raw_data)}
+
+    return pipeline
+
+
+def test_get_required_functions(pipeline):
+    assert pipeline.get_required_functions(["evaluation_report.txt"]) == {"ingest", "evaluate"}
+    assert pipeline.get_required_functions(["raw_data", "plot"]) == {"ingest", "plot"}
+
+
+def test_get_required_functions_for_unknown_product(pipeline):
+    with pytest.raises(KeyError):
+        pipeline.get_required_functions(["accuracy"])
+
+
+@pytest.mark.parametrize("executor", ["serial", "threads"])
+def test_only_the_ancestors_of_targets_run(pipeline, tmp_path, read_pickle, calls, executor):
+    pipeline.executor = executor
+
+    pipeline.run(targets=["evaluation_report"])
+
+    assert calls == {"ingest": 1, "evaluate": 1}
+    assert read_pickle(tmp_path / "default" / "evaluation" / "evaluation_report.txt") == "max: 3"
+    assert not (tmp_path / "default" / "plots" / "plot.png").exists()
+
+
+def test_up_to_date_products_are_reused(pipeline, calls):
+    pipeline.executor = "threads"
+
+    pipeline.run()
+    pipeline.run(targets=["evaluation_report"])
+
+    assert calls == {"ingest": 1, "evaluate": 2, "plot": 1}
+
+
+def test_changed_ancestors_run_again(pipeline, tmp_path, read_pickle, calls):
+    pipeline.executor = "threads"
+    pipeline.run()
+
+    @pipeline.step("ingestion")
+    def ingest():
+        calls["ingest"] += 1
+        return {"raw_data.pkl": [3, 1, 4]}
+
+    pipeline.run(targets=["evaluation_report"])
+
+    assert calls == {"ingest": 2, "evaluate": 2, "plot": 1}
+    assert read_pickle(tmp_path / "default" / "evaluation" / "evaluation_report.txt") == "max: 4"
+
+
+@pytest.mark.parametrize("executor", ["threads", "processes"])
+def test_targets_are_persisted_in_memory(pipeline, tmp_path, read_pickle, executor):
+    pipeline.executor = executor
+    pipeline.in_memory = True
+
+    pipeline.run(targets=["evaluation_report"])
+
+    assert read_pickle(tmp_path / "default" / "evaluation" / "evaluation_report.txt") == "max: 3"
+    assert not (tmp_path / "default" / "ingestion" / "raw_data.pkl").exists()
@@ -0,0 +1,111 @@
+import gc
+import os
+import time
+import weakref
+
+import pytest
+from ploomber.clients import LocalStorageClient
+from ploomber.products import File
+
+from cf_pipelines import Pipeline
+from cf_pipelines.base.uploads import BackgroundUploader
+
+
+class SlowClient(LocalStorageClient):
+    def __init__(self, *args, failures=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failures = failures
+
+    def upload(self, local):
+        time.sleep(0.2)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("The connection was reset")
+        super().upload(local)
+
+
+@pytest.fixture
+def pipeline(parse_indented, tmp_path):
+    pipeline = Pipeline("Uploaded", location=tmp_path / "pipelines")
+
+    @pipeline.step("ingestion")
+    def ingest():
+        return {"numbers.pkl": [1, 2, 3]}
+
+    @pipeline.step("training")
+    def train(*, numbers):
+        return {"model.pkl": sum(numbers)}
+
+    return pipeline
+
+
+@pytest.mark.parametrize("executor", ["serial", "threads", "processes"])
+def test_products_are_uploaded_before_run_returns(pipeline, tmp_path, read_pickle, executor):
+    client = BackgroundUploader(SlowClient(tmp_path / "backup", path_to_project_root=tmp_path))
+    pipeline.dag_clients = {File: client}
+    pipeline.executor = executor
+
+    pipeline.run()
+
+    assert read_pickle(tmp_path / "backup" / "pipelines" / "default" / "ingestion" / "numbers.pkl") == [1, 2, 3]
+    assert read_pickle(tmp_path / "backup" / "pipelines" / "default" / "training" / "model.pkl") == 6
+
+
+def test_uploads_do_not_block_the_steps(pipeline, tmp_path):
+    uploader = BackgroundUploader(SlowClient(tmp_path / "backup", path_to_project_root=tmp_path))
+    started_at = {}
+    pipeline.dag_clients = {File: uploader}
+    pipeline.executor = "threads"
+    pipeline.set_before_step(lambda function_name: started_at.setdefault(function_name, time.monotonic()))
+
+    pipeline.run()
+
+    assert started_at["train"] - started_at["ingest"] < 0.2
+
+
+def test_failed_uploads_are_retried(pipeline, tmp_path, read_pickle):
+    client = SlowClient(tmp_path / "backup", path_to_project_root=tmp_path, failures=1)
+    uploader = BackgroundUploader(client, max_workers=1, retry_delay=0)
+    pipeline.dag_clients = {File: uploader}
+    pipeline.executor = "threads"
+
+    pipeline.run()
+
+    assert read_pickle(tmp_path / "backup" / "pipelines" / "default" / "training" / "model.pkl") == 6
+
+
+def test_run_fails_when_uploads_fail(pipeline, tmp_path):
+    client = SlowClient(tmp_path / "backup", path_to_project_root=tmp_path, failures=10)
+    uploader = BackgroundUploader(client, retries=1, retry_delay=0)
+    pipeline.dag_clients = {File: uploader}
+    pipeline.executor = "threads"
+
+    with pytest.raises(ConnectionError):
+        pipeline.run()
+
+
+def test_uploaders_are_not_kept_alive(tmp_path):
+    uploader = BackgroundUploader(SlowClient(tmp_path / "backup", path_to_project_root=tmp_path))
+    reference = weakref.ref(uploader)
+
+    del uploader
+    gc.collect()
+
+    assert reference() is None
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Needs fork")
+def test_uploaders_are_reset_in_forked_processes(tmp_path):
+    uploader = BackgroundUploader(SlowClient(tmp_path / "backup", path_to_project_root=tmp_path))
+    (tmp_path / "numbers.pkl").write_bytes(b"")
+    uploader.upload(tmp_path / "numbers.pkl")
+    read_end, write_end = os.pipe()
+
+    pid = os.fork()
+    if pid == 0:
+        os.write(write_end, b"1" if uploader.executor is None and not uploader.pending else b"0")
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    assert os.read(read_end, 1) == b"1"
+    assert uploader.flush() == []
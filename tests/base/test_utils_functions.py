@@ -1,6 +1,6 @@
 import pytest
 
-from cf_pipelines.base.utils import get_return_keys_from_function
+from cf_pipelines.base.utils import find_function_definition, get_return_keys_from_function
 
 
 def no_return_statement():
@@ -48,3 +48,37 @@ def return_multiple_keys():
 def test_get_return_keys_from_function_succeeds(function, expected_keys):
     actual = get_return_keys_from_function(function)
     assert expected_keys == actual
+
+
+def yields_chunks():
+    for chunk in range(3):
+        yield {"rows.pkl": chunk}
+    yield {"rows.pkl": 3, "summary.txt": "done"}
+
+
+def yields_nothing():
+    yield 1
+
+
+def test_get_return_keys_from_generator_function():
+    assert get_return_keys_from_function(yields_chunks) == ["rows.pkl", "summary.txt"]
+
+
+def test_get_return_keys_from_generator_function_fails():
+    with pytest.raises(ValueError):
+        get_return_keys_from_function(yields_nothing)
+
+
+def decorated(function):
+    return function
+
+
+@decorated
+def decorated_with_keys():
+    return {"decorated.txt": "world"}
+
+
+def test_find_function_definition():
+    assert find_function_definition(decorated_with_keys).name == "decorated_with_keys"
+    assert find_function_definition(eval("lambda: None")) is None
+    assert get_return_keys_from_function(decorated_with_keys) == ["decorated.txt"]
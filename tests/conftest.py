@@ -1,5 +1,6 @@
 import ast
 import pickle
+from collections import Counter
 from unittest.mock import patch
 
 import pytest
@@ -14,6 +15,15 @@ def read_pickle():
     return _read
 
 
+@pytest.fixture
+def calls():
+    """
+    Counts the calls made to the steps of a pipeline. Only the calls made in the test's process are counted, not the
+    ones made by worker processes
+    """
+    return Counter()
+
+
 @pytest.fixture
 def parse_indented():
     """